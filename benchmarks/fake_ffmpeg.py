@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# ./benchmarks/fake_ffmpeg.py
+"""
+Stand-in for the `ffmpeg` binary used by the benchmark harness.
+
+Accepts the same command line the transcoding worker builds, "encodes" by
+copying the input to the output path, and sleeps to emulate encoder speed.
+The input may be a URL (the audio fast path passes a presigned S3 URL).
+Point the worker at it with FFMPEG_BINARY=/bench/fake_ffmpeg.py.
+
+Configuration (environment variables):
+    FAKE_FFMPEG_BYTES_PER_SEC  Emulated encode throughput (default 5 MB/s).
+                               0 disables the sleep entirely.
+    FAKE_FFMPEG_MIN_SECONDS    Minimum emulated run time (default 0.1).
+    FAKE_FFMPEG_FAIL_RATE      Fraction of runs that exit with an error (default 0).
+"""
+
+import os
+import random
+import shutil
+import sys
+import time
+import urllib.request
+
+BYTES_PER_SEC = float(os.environ.get("FAKE_FFMPEG_BYTES_PER_SEC", 5 * 1024 * 1024))
+MIN_SECONDS = float(os.environ.get("FAKE_FFMPEG_MIN_SECONDS", 0.1))
+FAIL_RATE = float(os.environ.get("FAKE_FFMPEG_FAIL_RATE", 0))
+
+
+def parse_args(argv):
+    """Returns (input_path, output_path) from an ffmpeg-style argument list."""
+    input_path = None
+    for index, arg in enumerate(argv):
+        if arg == "-i" and index + 1 < len(argv):
+            input_path = argv[index + 1]
+    output_path = argv[-1] if argv and argv[-1] != input_path else None
+    return input_path, output_path
+
+
+def main(argv):
+    input_path, output_path = parse_args(argv)
+    if not input_path or not output_path:
+        sys.stderr.write("fake_ffmpeg: expected '-i <input> ... <output>'\n")
+        return 1
+    if "://" in input_path:
+        try:
+            with urllib.request.urlopen(input_path) as source, open(output_path, "wb") as target:
+                shutil.copyfileobj(source, target)
+        except OSError as e:
+            sys.stderr.write(f"{input_path}: {e}\n")
+            return 1
+        size = os.path.getsize(output_path)
+    elif not os.path.exists(input_path):
+        sys.stderr.write(f"{input_path}: No such file or directory\n")
+        return 1
+    else:
+        size = os.path.getsize(input_path)
+    duration = size / BYTES_PER_SEC if BYTES_PER_SEC > 0 else 0
+    time.sleep(max(duration, MIN_SECONDS))
+
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        sys.stderr.write("fake_ffmpeg: simulated encoder failure\n")
+        return 1
+
+    if "://" not in input_path:
+        shutil.copyfile(input_path, output_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
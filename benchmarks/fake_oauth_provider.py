@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# ./benchmarks/fake_oauth_provider.py
+"""
+Local stand-in for the Google and GitHub OAuth endpoints the auth-service calls.
+
+Serves the token exchange and user-info endpoints of both providers over
+HTTP/1.1 with keep-alive, so login latency can be measured without real
+accounts. Any authorization code is accepted; the user is derived from it
+(code "alice" -> alice@example.com).
+
+Point the auth-service at it with:
+    GOOGLE_TOKEN_URL=http://fake-oauth:8080/token
+    GOOGLE_USERINFO_URL=http://fake-oauth:8080/userinfo
+    GITHUB_TOKEN_URL=http://fake-oauth:8080/login/oauth/access_token
+    GITHUB_USERAPI_URL=http://fake-oauth:8080/user
+    GITHUB_USER_EMAILS_URL=http://fake-oauth:8080/user/emails
+
+Configuration (environment variables):
+    FAKE_OAUTH_PORT          Listen port (default 8080).
+    FAKE_OAUTH_LATENCY_MS    Added to every response (default 50).
+    FAKE_OAUTH_CONNECT_MS    Added once per new connection, emulating the
+                             TCP + TLS handshake a real provider costs (default 100).
+"""
+
+import json
+import os
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+PORT = int(os.environ.get("FAKE_OAUTH_PORT", 8080))
+LATENCY_SECONDS = float(os.environ.get("FAKE_OAUTH_LATENCY_MS", 50)) / 1000
+CONNECT_SECONDS = float(os.environ.get("FAKE_OAUTH_CONNECT_MS", 100)) / 1000
+TOKEN_PREFIX = "fake-"
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real providers
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    def setup(self):
+        # One handler instance per connection: charge the handshake once
+        super().setup()
+        time.sleep(CONNECT_SECONDS)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _user(self):
+        auth = self.headers.get("Authorization", "")
+        token = auth.split(" ", 1)[-1]
+        if not token.startswith(TOKEN_PREFIX):
+            return None
+        return token[len(TOKEN_PREFIX):]
+
+    def _send(self, status, body):
+        time.sleep(LATENCY_SECONDS)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        code = (form.get("code") or [""])[0]
+        if self.path not in ("/token", "/login/oauth/access_token"):
+            return self._send(404, {"error": "not_found"})
+        if not code:
+            return self._send(400, {"error": "invalid_grant", "error_description": "Missing code"})
+        self._send(200, {"access_token": f"{TOKEN_PREFIX}{code}", "token_type": "bearer"})
+
+    def do_GET(self):
+        user = self._user()
+        if user is None:
+            return self._send(401, {"error": "invalid_token"})
+        email = f"{user}@example.com"
+        if self.path == "/userinfo":
+            return self._send(200, {"sub": f"google-{user}", "email": email, "name": user})
+        if self.path == "/user":
+            return self._send(200, {"id": zlib.crc32(user.encode("utf-8")), "login": user, "name": user})
+        if self.path == "/user/emails":
+            return self._send(200, [{"email": email, "primary": True, "verified": True}])
+        self._send(404, {"error": "not_found"})
+
+
+def main():
+    server = ThreadingHTTPServer(("0.0.0.0", PORT), FakeProviderHandler)
+    server.daemon_threads = True
+    print(f"Fake OAuth provider listening on :{PORT}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
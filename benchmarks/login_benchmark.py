@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# ./benchmarks/login_benchmark.py
+"""
+Login latency benchmark for the auth-service against the fake OAuth provider.
+
+Posts authorization codes to POST /auth/token (the call the client makes in
+its OAuth callback) from concurrent simulated users and reports throughput
+and p50/p99 latency per provider. Run with the benchmark overlay, which wires
+the auth-service to fake_oauth_provider.py and exposes it on :5002.
+
+Typical before/after run:
+    python benchmarks/login_benchmark.py --logins 500 --concurrency 20 --json-out before.json
+    # ... apply the change, rebuild ...
+    python benchmarks/login_benchmark.py --logins 500 --concurrency 20 --compare before.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from run_benchmark import Recorder, _delta, _fmt, summarize
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("login-benchmark")
+
+
+def login(args, session, recorder, index):
+    """Performs one code-for-token exchange and records its latency."""
+    provider = args.provider[index % len(args.provider)]
+    payload = {"provider": provider, "code": f"user{index % args.users}"}
+    if provider == "google":
+        payload["redirect_uri"] = "http://localhost:5000/callback/google"
+    name = f"login.{provider}"
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{args.auth_url}/auth/token", json=payload, timeout=args.request_timeout)
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200 and response.json().get("access_token"):
+            recorder.add(name, elapsed)
+        else:
+            logger.warning(f"{name} -> {response.status_code}: {response.text[:200]}")
+            recorder.error(name)
+    except requests.RequestException as e:
+        logger.warning(f"{name} failed: {e}")
+        recorder.error(name)
+
+
+def print_report(result, baseline=None):
+    print(f"\nLogins: {result['logins']} in {result['wall_seconds']:.1f}s")
+    header = f"{'metric':<16}{'count':>7}{'errors':>8}{'per_sec':>10}{'p50_ms':>10}{'p99_ms':>10}{'max_ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in result["metrics"].items():
+        print(f"{name:<16}{row['count']:>7}{row['errors']:>8}{_fmt(row['per_sec']):>10}"
+              f"{_fmt(row['p50_ms']):>10}{_fmt(row['p99_ms']):>10}{_fmt(row['max_ms']):>10}")
+    if baseline:
+        print(f"\nChange vs baseline ({baseline.get('label') or 'previous run'}):")
+        for name, row in result["metrics"].items():
+            old = baseline["metrics"].get(name)
+            if old:
+                print(f"  {name:<16} p50 {_delta(old['p50_ms'], row['p50_ms'])}   p99 {_delta(old['p99_ms'], row['p99_ms'])}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--auth-url", default=os.environ.get("BENCH_AUTH_URL", "http://localhost:5002"))
+    parser.add_argument("--provider", action="append", choices=["google", "github"],
+                        help="Provider(s) to log in with, alternating (default: both)")
+    parser.add_argument("--logins", type=int, default=200, help="Number of logins")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users to spread logins over")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--label", default=None, help="Free-form label stored in the JSON output")
+    parser.add_argument("--json-out", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    args.provider = args.provider or ["github", "google"]
+    recorder = Recorder()
+    session = requests.Session()  # The benchmark client itself reuses connections
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for future in [executor.submit(login, args, session, recorder, i) for i in range(args.logins)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    result = {
+        "label": args.label,
+        "logins": args.logins,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "metrics": summarize(recorder, wall),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Report written to {args.json_out}")
+    return 0 if recorder.samples else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# ./benchmarks/measure_startup.py
+"""
+Measures cold-start time and memory of each service process.
+
+For every target, a fresh interpreter imports the service's entry module (what
+gunicorn or a Celery worker does before serving anything) and reports:
+
+    import_ms    wall time of the import
+    import_rss   peak RSS after the import (MiB)
+    ready_ms     import + first S3 client use (storage.get_s3_client())
+    ready_rss    peak RSS after the first S3 client use (MiB)
+
+Each target runs --repeat times and the median is reported, so the numbers
+include neither warm module caches nor one-off disk hiccups. Needs the
+services' Python dependencies installed, but no running Redis or S3: nothing
+here connects to them.
+
+Typical before/after run:
+    python benchmarks/measure_startup.py --json-out before.json
+    # ... apply the change ...
+    python benchmarks/measure_startup.py --compare before.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVICES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services")
+
+# name -> (service directory, module to import)
+TARGETS = {
+    "api-gateway": ("api-gateway", "app"),
+    "upload-service": ("upload-service", "app"),
+    "transcoding-worker": ("transcoding-service", "tasks"),
+    "notification-worker": ("notification-service", "tasks"),
+}
+
+# Runs inside the child interpreter; prints one JSON line
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+from common import storage
+try:
+    storage.get_s3_client()
+except storage.S3Error:
+    pass
+ready = time.perf_counter()
+ready_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "import_rss": import_rss / 1024,
+    "ready_ms": (ready - start) * 1000,
+    "ready_rss": ready_rss / 1024,
+}))
+"""
+
+METRICS = ("import_ms", "import_rss", "ready_ms", "ready_rss")
+
+
+def probe(service_dir, module):
+    """Imports `module` in a fresh interpreter and returns its measurements."""
+    cwd = os.path.join(SERVICES_DIR, service_dir)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([cwd, SERVICES_DIR, env.get("PYTHONPATH", "")])
+    # Placeholder credentials so client construction never reaches for IMDS
+    env.setdefault("AWS_ACCESS_KEY_ID", "startup-probe")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "startup-probe")
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE, module],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(names, repeat):
+    """Returns {target: {metric: median}} over `repeat` fresh interpreters."""
+    report = {}
+    for name in names:
+        service_dir, module = TARGETS[name]
+        try:
+            samples = [probe(service_dir, module) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            continue
+        report[name] = {metric: statistics.median(s[metric] for s in samples) for metric in METRICS}
+    return report
+
+
+def print_report(report, baseline=None):
+    header = f"{'target':<22}" + "".join(f"{metric:>22}" for metric in METRICS)
+    print(header)
+    print("-" * len(header))
+    for name, values in report.items():
+        row = f"{name:<22}"
+        for metric in METRICS:
+            cell = f"{values[metric]:.1f}"
+            old = (baseline or {}).get(name, {}).get(metric)
+            if old:
+                cell += f" ({(values[metric] - old) / old * 100:+.0f}%)"
+            row += f"{cell:>22}"
+        print(row)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS),
+                        help="Target(s) to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--json-out", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = measure(args.target or list(TARGETS), max(1, args.repeat))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# ./benchmarks/run_benchmark.py
+"""
+Load-test and benchmark harness for the transcoding pipeline.
+
+Drives the real API Gateway endpoints (/upload, /status, /jobs) against the
+docker-compose stack (MinIO, Redis, MailHog), with the transcoding worker
+running the fake FFmpeg from this directory. Reports throughput and p50/p99
+latency per endpoint and per pipeline stage:
+
+    upload       POST /upload round-trip (gateway + upload-service + S3)
+    queue_wait   upload accepted -> job seen PROCESSING
+    transcode    PROCESSING -> COMPLETED/FAILED
+    notify       COMPLETED -> email visible in MailHog
+    end_to_end   upload started -> COMPLETED/FAILED
+
+Stage timestamps are observed by polling the job store in Redis, so their
+resolution is --monitor-interval.
+
+Typical before/after run:
+    docker compose -f docker-compose.yml -f benchmarks/docker-compose.bench.yml up -d --build
+    python benchmarks/run_benchmark.py --jobs 100 --concurrency 10 --json-out before.json
+    # ... apply the change, rebuild ...
+    python benchmarks/run_benchmark.py --jobs 100 --concurrency 10 --compare before.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt  # PyJWT
+import redis
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services"))
+from common import job_store  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("benchmark")
+
+# Minimal MP4 'ftyp' box so the payload looks like real media to upload-time checks
+MP4_HEADER = b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2"
+TERMINAL_STATUSES = set(job_store.TERMINAL_STATUSES)
+
+
+# --- Measurement ---
+class Recorder:
+    """Thread-safe collection of latency samples (seconds) and error counts per metric."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(recorder, wall_seconds):
+    """Builds the JSON-serializable report from recorded samples."""
+    report = {}
+    for name in sorted(set(recorder.samples) | set(recorder.errors)):
+        values = recorder.samples.get(name, [])
+        report[name] = {
+            "count": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "per_sec": round(len(values) / wall_seconds, 3) if wall_seconds else None,
+            "p50_ms": _ms(percentile(values, 50)),
+            "p99_ms": _ms(percentile(values, 99)),
+            "max_ms": _ms(max(values) if values else None),
+        }
+    return report
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+# --- Pipeline Observation ---
+class StageMonitor(threading.Thread):
+    """
+    Polls the job store (and MailHog) to timestamp each job's pipeline stages.
+    """
+
+    def __init__(self, redis_client, mailhog_url, recorder, interval):
+        super().__init__(daemon=True)
+        self.redis_client = redis_client
+        self.mailhog_url = mailhog_url
+        self.recorder = recorder
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> {"accepted": t, "processing": t, "finished": t, ...}
+        self._stop_event = threading.Event()
+        self._last_mail_check = 0.0
+
+    def track(self, job_id, accepted_at):
+        with self._lock:
+            self._jobs[job_id] = {"accepted": accepted_at}
+
+    def pending_notifications(self):
+        with self._lock:
+            return [
+                job_id
+                for job_id, stages in self._jobs.items()
+                if stages.get("status") == job_store.STATUS_COMPLETED and "notified" not in stages
+            ]
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.warning(f"Stage monitor poll failed: {e}")
+            self._stop_event.wait(self.interval)
+
+    def poll_once(self):
+        now = time.time()
+        with self._lock:
+            unfinished = [job_id for job_id, stages in self._jobs.items() if "finished" not in stages]
+        if unfinished:
+            for job_id, metadata in zip(unfinished, job_store.get_jobs(self.redis_client, unfinished)):
+                self._observe(job_id, metadata.get("status") if metadata else None, now)
+        if self.mailhog_url and now - self._last_mail_check >= max(self.interval, 0.5):
+            self._last_mail_check = now
+            self._check_mail(now)
+
+    def _observe(self, job_id, status, now):
+        with self._lock:
+            stages = self._jobs[job_id]
+            if status == job_store.STATUS_PROCESSING and "processing" not in stages:
+                stages["processing"] = now
+                self.recorder.add("stage.queue_wait", now - stages["accepted"])
+            elif status in TERMINAL_STATUSES:
+                stages.setdefault("processing", now)  # Finished between two polls
+                stages["finished"] = now
+                stages["status"] = status
+                self.recorder.add("stage.transcode", now - stages["processing"])
+                if status == job_store.STATUS_FAILED:
+                    self.recorder.error("stage.transcode")
+
+    def _check_mail(self, now):
+        waiting = self.pending_notifications()
+        if not waiting:
+            return
+        response = requests.get(
+            f"{self.mailhog_url}/api/v2/messages", params={"limit": 1000}, timeout=10
+        )
+        response.raise_for_status()
+        bodies = "\n".join(
+            item.get("Content", {}).get("Body", "") for item in response.json().get("items", [])
+        )
+        with self._lock:
+            for job_id in waiting:
+                if job_id in bodies:
+                    stages = self._jobs[job_id]
+                    stages["notified"] = now
+                    self.recorder.add("stage.notify", now - stages["finished"])
+
+
+# --- Load Generation ---
+def login_tokens(auth_url, users, timeout):
+    """
+    Logs each synthetic user in through the auth-service and returns their access tokens.
+
+    Needs the benchmark overlay, whose fake OAuth provider accepts any code and
+    derives the user from it, and a signing key in secrets/jwt-keys.
+    """
+    tokens = []
+    for index in range(users):
+        payload = {"provider": "github", "code": f"bench-user-{index}"}
+        try:
+            response = requests.post(f"{auth_url}/auth/token", json=payload, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            sys.exit(f"Login against {auth_url} failed: {e}")
+        if response.status_code != 200 or not response.json().get("access_token"):
+            sys.exit(f"Login against {auth_url} failed: {response.status_code} {response.text[:200]}")
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+def make_tokens(secret, algorithm, users):
+    """
+    Mints one shared-secret gateway JWT per synthetic user.
+
+    The gateway only accepts these with JWT_ACCEPT_SHARED_SECRET=true and a
+    non-default JWT_SECRET_KEY.
+    """
+    tokens = []
+    for index in range(users):
+        payload = {
+            "email": f"bench-user-{index}@example.com",
+            "name": f"Bench User {index}",
+            "provider": "benchmark",
+            "iat": int(time.time()),
+            "exp": int(time.time()) + 6 * 3600,
+        }
+        tokens.append(jwt.encode(payload, secret, algorithm=algorithm))
+    return tokens
+
+
+def make_payload(size):
+    return MP4_HEADER + os.urandom(max(0, size - len(MP4_HEADER)))
+
+
+def timed_request(recorder, name, session, method, url, **kwargs):
+    """Issues one request, recording its latency under `name`. Returns the response or None."""
+    start = time.perf_counter()
+    try:
+        response = session.request(method, url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        recorder.error(name)
+        logger.warning(f"{name} failed: {e}")
+        return None
+    recorder.add(name, time.perf_counter() - start)
+    if response.status_code >= 400:
+        recorder.error(name)
+    return response
+
+
+def run_job(args, token, payload, recorder, monitor):
+    """Submits one job and polls it to completion, like a browser client would."""
+    session = requests.Session()
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.time()
+
+    response = timed_request(
+        recorder,
+        "endpoint./upload",
+        session,
+        "POST",
+        f"{args.gateway_url}/upload",
+        headers=headers,
+        data={"output_format": args.output_format, "priority": args.priority},
+        files={"media_file": ("bench.mp4", payload, "video/mp4")},
+        timeout=args.request_timeout,
+    )
+    if response is None or response.status_code != 202:
+        return None
+    job_id = response.json().get("job_id")
+    monitor.track(job_id, time.time())
+
+    deadline = started + args.job_timeout
+    polls = 0
+    while time.time() < deadline:
+        time.sleep(args.status_interval)
+        polls += 1
+        response = timed_request(
+            recorder,
+            "endpoint./status",
+            session,
+            "GET",
+            f"{args.gateway_url}/status/{job_id}",
+            headers=headers,
+            timeout=args.request_timeout,
+        )
+        if args.jobs_every and polls % args.jobs_every == 0:
+            timed_request(
+                recorder,
+                "endpoint./jobs",
+                session,
+                "GET",
+                f"{args.gateway_url}/jobs",
+                headers=headers,
+                timeout=args.request_timeout,
+            )
+        if response is not None and response.status_code == 200:
+            status = response.json().get("status")
+            if status in TERMINAL_STATUSES:
+                recorder.add("stage.end_to_end", time.time() - started)
+                return status
+    recorder.error("stage.end_to_end")
+    logger.warning(f"Job {job_id} did not finish within {args.job_timeout}s")
+    return None
+
+
+# --- Reporting ---
+def print_report(result, baseline=None):
+    print(f"\nJobs: {result['jobs_completed']} completed, {result['jobs_failed']} failed, "
+          f"{result['jobs_lost']} unfinished in {result['wall_seconds']:.1f}s "
+          f"-> {result['throughput_jobs_per_sec']:.3f} jobs/s")
+    header = f"{'metric':<22}{'count':>7}{'errors':>8}{'per_sec':>10}{'p50_ms':>10}{'p99_ms':>10}{'max_ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in result["metrics"].items():
+        print(f"{name:<22}{row['count']:>7}{row['errors']:>8}{_fmt(row['per_sec']):>10}"
+              f"{_fmt(row['p50_ms']):>10}{_fmt(row['p99_ms']):>10}{_fmt(row['max_ms']):>10}")
+    if baseline:
+        print(f"\nChange vs baseline ({baseline.get('label') or 'previous run'}):")
+        print(f"  throughput_jobs_per_sec: {_delta(baseline['throughput_jobs_per_sec'], result['throughput_jobs_per_sec'])}")
+        for name, row in result["metrics"].items():
+            old = baseline["metrics"].get(name)
+            if old:
+                print(f"  {name:<22} p50 {_delta(old['p50_ms'], row['p50_ms'])}   p99 {_delta(old['p99_ms'], row['p99_ms'])}")
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value}"
+
+
+def _delta(old, new):
+    if old in (None, 0) or new is None:
+        return f"{old} -> {new}"
+    return f"{old} -> {new} ({(new - old) / old * 100:+.1f}%)"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gateway-url", default=os.environ.get("BENCH_GATEWAY_URL", "http://localhost:5001"))
+    parser.add_argument("--redis-url", default=os.environ.get("BENCH_REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--mailhog-url", default=os.environ.get("BENCH_MAILHOG_URL", "http://localhost:8025"),
+                        help="MailHog web/API URL; empty string skips the notify stage")
+    parser.add_argument("--auth-url", default=os.environ.get("BENCH_AUTH_URL", "http://localhost:5002"),
+                        help="Auth-service the synthetic users log in through (benchmark overlay)")
+    parser.add_argument("--jwt-secret",
+                        help="Mint legacy HS256 tokens with this secret instead of logging in "
+                             "(needs JWT_ACCEPT_SHARED_SECRET=true on the gateway)")
+    parser.add_argument("--jwt-algorithm", default=os.environ.get("JWT_ALGORITHM", "HS256"))
+    parser.add_argument("--token", action="append", help="Use pre-issued bearer token(s) instead of minting")
+    parser.add_argument("--jobs", type=int, default=20, help="Number of jobs to submit")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent simulated clients")
+    parser.add_argument("--users", type=int, default=1, help="Distinct users to spread jobs over")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024, help="Upload size in bytes")
+    parser.add_argument("--output-format", default="mp4")
+    parser.add_argument("--priority", default="normal", choices=["interactive", "normal", "bulk"])
+    parser.add_argument("--status-interval", type=float, default=0.5, help="Seconds between /status polls")
+    parser.add_argument("--jobs-every", type=int, default=4, help="Call /jobs every N status polls (0 = never)")
+    parser.add_argument("--monitor-interval", type=float, default=0.05, help="Job store polling interval")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--notify-timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--label", default=None, help="Free-form label stored in the JSON output")
+    parser.add_argument("--json-out", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.token:
+        tokens = args.token
+    elif args.jwt_secret:
+        tokens = make_tokens(args.jwt_secret, args.jwt_algorithm, args.users)
+    else:
+        tokens = login_tokens(args.auth_url, args.users, args.request_timeout)
+
+    recorder = Recorder()
+    redis_client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    monitor = StageMonitor(redis_client, args.mailhog_url, recorder, args.monitor_interval)
+    monitor.start()
+    payload = make_payload(args.file_size)
+
+    logger.info(f"Submitting {args.jobs} jobs with {args.concurrency} concurrent clients "
+                f"({len(tokens)} user(s), {args.file_size} bytes each)")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(run_job, args, tokens[index % len(tokens)], payload, recorder, monitor)
+            for index in range(args.jobs)
+        ]
+        outcomes = [future.result() for future in futures]
+    wall_seconds = time.time() - started
+
+    # Give the notification worker a chance to deliver the last emails
+    notify_deadline = time.time() + (args.notify_timeout if args.mailhog_url else 0)
+    while monitor.pending_notifications() and time.time() < notify_deadline:
+        time.sleep(0.5)
+    monitor.stop()
+    monitor.join(timeout=5)
+
+    completed = outcomes.count(job_store.STATUS_COMPLETED)
+    failed = outcomes.count(job_store.STATUS_FAILED)
+    result = {
+        "label": args.label,
+        "params": {k: v for k, v in vars(args).items() if k not in ("jwt_secret", "token")},
+        "wall_seconds": wall_seconds,
+        "jobs_completed": completed,
+        "jobs_failed": failed,
+        "jobs_lost": len(outcomes) - completed - failed,
+        "throughput_jobs_per_sec": round(completed / wall_seconds, 4) if wall_seconds else 0,
+        "metrics": summarize(recorder, wall_seconds),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Report written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
 # ./client/app.py
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime  # Needed for timestamp formatting
 from functools import wraps
 from urllib.parse import urlencode
 
 import jwt  # PyJWT
 import requests
+from markupsafe import Markup
+from requests.adapters import HTTPAdapter
 from flask import (
     Flask,
     flash,
@@ -37,6 +43,24 @@ API_GATEWAY_URL_FOR_BROWSER = os.environ.get(
     "API_GATEWAY_URL_FOR_BROWSER", "http://localhost:5001"
 )
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
+# Public keys of the auth-service; cached, refetched when a token has an unknown kid
+JWKS_URL = os.environ.get("JWKS_URL", f"{AUTH_SERVICE_URL}/.well-known/jwks.json")
+JWKS_CACHE_SECONDS = int(os.environ.get("JWKS_CACHE_SECONDS", 300))
+ASYMMETRIC_ALGORITHMS = ["RS256", "EdDSA"]
+jwks_client = jwt.PyJWKClient(JWKS_URL, cache_jwk_set=True, lifespan=JWKS_CACHE_SECONDS)
+
+# Keep-alive connections to the API Gateway, shared by all requests of a
+# worker (gunicorn imports the app in each worker, so nothing crosses a fork)
+GATEWAY_POOL_MAXSIZE = int(os.environ.get("GATEWAY_POOL_MAXSIZE", 10))
+gateway_session = requests.Session()
+gateway_session.mount("http://", HTTPAdapter(pool_maxsize=GATEWAY_POOL_MAXSIZE))
+gateway_session.mount("https://", HTTPAdapter(pool_maxsize=GATEWAY_POOL_MAXSIZE))
+
+# Rendered job history rows per user (see job_history_fragment), per process
+HISTORY_CACHE_TTL_SECONDS = int(os.environ.get("HISTORY_CACHE_TTL_SECONDS", 15))
+HISTORY_CACHE_MAX_USERS = int(os.environ.get("HISTORY_CACHE_MAX_USERS", 1000))
+_history_cache = OrderedDict()  # (email, generation) -> (fresh_until, etag, html)
+_history_cache_lock = threading.Lock()
 
 
 # --- Custom Jinja Filter for Timestamps ---
@@ -63,21 +87,86 @@ def format_datetime(value, format="%Y-%m-%d %H:%M:%S UTC"):
 
 
 # --- Helper Functions ---
-def get_user_info_from_jwt(token):
-    """Safely decodes JWT to get user info without verifying signature."""
-    if not token:
+def decode_session_token(token):
+    """
+    Decodes the session JWT.
+
+    Asymmetric tokens are verified against the auth-service JWKS. Legacy
+    shared-secret tokens are decoded without verification (the client holds
+    no secret); the API Gateway verifies them on every call.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        return jwt.decode(token, signing_key.key, algorithms=ASYMMETRIC_ALGORITHMS)
+    return jwt.decode(
+        token,
+        options={"verify_signature": False, "verify_exp": True},
+        algorithms=[JWT_ALGORITHM],
+    )
+
+
+def store_session_tokens(data):
+    """Keeps the access token (and rotated refresh token) from the auth-service in the session."""
+    session["jwt"] = data["access_token"]
+    if data.get("refresh_token"):
+        session["refresh_token"] = data["refresh_token"]
+
+
+def refresh_session_token():
+    """
+    Trades the session's refresh token for a new access token.
+
+    Returns:
+        str: The new access token (also stored in the session), or None.
+    """
+    refresh_token = session.get("refresh_token")
+    if not refresh_token:
         return None
     try:
-        # Signature verification happens at API Gateway
-        decoded = jwt.decode(
-            token, options={"verify_signature": False}, algorithms=[JWT_ALGORITHM]
+        response = requests.post(
+            f"{AUTH_SERVICE_URL}/auth/refresh",
+            json={"refresh_token": refresh_token},
+            timeout=10,
         )
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error contacting auth service to refresh the session: {e}")
+        return None
+    if response.status_code != 200:
+        app.logger.info(f"Session refresh rejected ({response.status_code}).")
+        return None
+    data = response.json()
+    if not data.get("access_token"):
+        return None
+    store_session_tokens(data)
+    app.logger.info("Session access token refreshed.")
+    return data["access_token"]
+
+
+def get_user_info_from_jwt(token, allow_refresh=True):
+    """
+    Safely decodes the session JWT to get user info (see decode_session_token).
+
+    An expired token is renewed with the session's refresh token; callers
+    that need the token itself should re-read session["jwt"] afterwards.
+    """
+    if not token:
+        return None
+    try:
+        decoded = decode_session_token(token)
         # Ensure email is present, as it's used as an identifier
         if not decoded.get("email"):
             app.logger.warning("JWT decoded but missing 'email' claim.")
             return None
-        return {"name": decoded.get("name"), "email": decoded.get("email")}
+        return {
+            "name": decoded.get("name"),
+            "email": decoded.get("email"),
+            "expires_at": decoded.get("exp"),
+        }
     except jwt.ExpiredSignatureError:
+        new_token = refresh_session_token() if allow_refresh else None
+        if new_token:
+            return get_user_info_from_jwt(new_token, allow_refresh=False)
         app.logger.info("Attempted to use expired JWT.")
         session.pop("jwt", None)  # Clear expired token
         return None
@@ -85,6 +174,10 @@ def get_user_info_from_jwt(token):
         app.logger.warning(f"Attempted to use invalid JWT: {e}")
         session.pop("jwt", None)  # Clear invalid token
         return None
+    except jwt.PyJWKClientError as e:
+        # Key set unreachable or key unknown; keep the session, the user can retry
+        app.logger.error(f"Could not fetch a key to verify the session JWT: {e}")
+        return None
     except Exception as e:
         app.logger.error(f"Unexpected error decoding JWT: {e}", exc_info=True)
         session.pop("jwt", None)
@@ -115,12 +208,110 @@ def login_required(f):
     return decorated_function
 
 
+# --- Job History Fragment Cache ---
+def _history_generation():
+    """Per-user counter kept in the session cookie, bumped when the user submits a job."""
+    return session.get("history_generation", 0)
+
+
+def invalidate_job_history():
+    """Drops the cached history rows of the current user (in every worker process)."""
+    session["history_generation"] = _history_generation() + 1
+
+
+def _cache_history(key, entry):
+    with _history_cache_lock:
+        _history_cache[key] = entry
+        _history_cache.move_to_end(key)
+        while len(_history_cache) > HISTORY_CACHE_MAX_USERS:
+            _history_cache.popitem(last=False)
+
+
+def job_history_fragment(user_email, jwt_token):
+    """
+    Returns the rendered job history rows (_job_history.html) of a user.
+
+    Fresh cache hits return at once, with no gateway call. Once an entry is
+    older than HISTORY_CACHE_TTL_SECONDS it is revalidated with the gateway's
+    ETag, and a 304 reuses the rendered rows. Cache keys include the user's
+    history generation, so a submit through this backend invalidates them in
+    every worker.
+
+    Returns:
+        str: The rendered rows (a "history unavailable" row on gateway errors),
+             or None if the gateway rejected the token.
+    """
+    key = (user_email, _history_generation())
+    with _history_cache_lock:
+        cached = _history_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[2]
+
+    api_url = f"{API_GATEWAY_URL_INTERNAL}/jobs"
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+    if cached and cached[1]:
+        headers["If-None-Match"] = cached[1]
+    job_history = []  # Default to empty list
+    try:
+        app.logger.info(f"Initial history fetch for {user_email} from {api_url}")
+        response = gateway_session.get(api_url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            _cache_history(key, (time.monotonic() + HISTORY_CACHE_TTL_SECONDS, cached[1], cached[2]))
+            return cached[2]
+        response.raise_for_status()  # Raise HTTPError for bad responses (4xx/5xx)
+
+        # Ensure response is valid JSON before parsing
+        if "application/json" in response.headers.get("Content-Type", ""):
+            job_history = response.json()  # Expecting a list of job dicts
+            if not isinstance(job_history, list):
+                app.logger.error(f"API Gateway /jobs did not return a list: {job_history}")
+                job_history = []  # Reset to empty on invalid format
+            else:
+                app.logger.info(f"Initial fetch received {len(job_history)} jobs.")
+                html = render_template("_job_history.html", job_history=job_history)
+                _cache_history(
+                    key,
+                    (time.monotonic() + HISTORY_CACHE_TTL_SECONDS, response.headers.get("ETag"), html),
+                )
+                return html
+        else:
+            app.logger.error(
+                f"API Gateway /jobs did not return JSON. Content-Type: {response.headers.get('Content-Type')}"
+            )
+
+    except requests.exceptions.HTTPError as e:
+        # Handle specific errors (e.g., 401, 403 from gateway)
+        status_code = e.response.status_code if e.response is not None else None
+        if status_code in [401, 403]:
+            # This might happen if JWT expired between get_user_info and API call
+            app.logger.warning(f"Auth error ({status_code}) during initial history fetch.")
+            return None
+        error_msg = f"Error fetching job history: {status_code or 'Unknown Status'}"
+        try:  # Try to get detail from gateway response
+            error_details = e.response.json().get("error", e.response.text)
+            error_msg += f" - {error_details}"
+        except Exception:
+            pass  # Ignore if response isn't JSON
+        app.logger.error(f"HTTPError fetching job history: {error_msg}", exc_info=False)
+        flash(error_msg, "danger")  # Show error on initial load
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Network error fetching job history: {e}")
+        flash("Could not connect to history service.", "warning")
+    except Exception as e:
+        app.logger.error(f"Unexpected error fetching job history: {e}", exc_info=True)
+        flash("An unexpected error occurred while fetching job history.", "danger")
+
+    if cached:
+        return cached[2]  # Stale rows beat an error row; the JS poll refreshes them
+    return render_template("_job_history.html", job_history=job_history)
+
+
 # --- Routes ---
 @app.route("/")
 def index():
     """Renders the main page and fetches job history if logged in for initial display."""
     user_info = None
-    job_history = []  # Default to empty list
+    job_history_html = None
     jwt_token = session.get("jwt")
     is_logged_in = False  # Flag for JS
 
@@ -128,71 +319,16 @@ def index():
         user_info = get_user_info_from_jwt(jwt_token)  # Validate token
         if user_info:
             is_logged_in = True  # User is considered logged in for this request
-            # --- Fetch Job History (Initial Load Only) ---
-            api_url = f"{API_GATEWAY_URL_INTERNAL}/jobs"
-            headers = {"Authorization": f"Bearer {jwt_token}"}
-            try:
-                app.logger.info(
-                    f"Initial history fetch for {user_info.get('email')} from {api_url}"
-                )
-                response = requests.get(api_url, headers=headers, timeout=10)
-                response.raise_for_status()  # Raise HTTPError for bad responses (4xx/5xx)
-
-                # Ensure response is valid JSON before parsing
-                if "application/json" in response.headers.get("Content-Type", ""):
-                    job_history = response.json()  # Expecting a list of job dicts
-                    if not isinstance(job_history, list):
-                        app.logger.error(
-                            f"API Gateway /jobs did not return a list: {job_history}"
-                        )
-                        job_history = []  # Reset to empty on invalid format
-                    else:
-                        app.logger.info(
-                            f"Initial fetch received {len(job_history)} jobs."
-                        )
-                else:
-                    app.logger.error(
-                        f"API Gateway /jobs did not return JSON. Content-Type: {response.headers.get('Content-Type')}"
-                    )
-                    job_history = []
-
-            except requests.exceptions.HTTPError as e:
-                # Handle specific errors (e.g., 401, 403 from gateway)
-                status_code = e.response.status_code if e.response else None
-                if status_code in [401, 403]:
-                    # This might happen if JWT expired between get_user_info and API call
-                    app.logger.warning(
-                        f"Auth error ({status_code}) during initial history fetch. Clearing session."
-                    )
-                    session.pop("jwt", None)
-                    is_logged_in = False  # Update flag
-                    user_info = None
-                    flash("Your session expired. Please log in again.", "warning")
-                    # Don't redirect here, just render logged-out state
-                else:
-                    error_msg = (
-                        f"Error fetching job history: {status_code or 'Unknown Status'}"
-                    )
-                    try:  # Try to get detail from gateway response
-                        error_details = e.response.json().get("error", e.response.text)
-                        error_msg += f" - {error_details}"
-                    except Exception:
-                        pass  # Ignore if response isn't JSON
-                    app.logger.error(
-                        f"HTTPError fetching job history: {error_msg}", exc_info=False
-                    )
-                    flash(error_msg, "danger")  # Show error on initial load
-
-            except requests.exceptions.RequestException as e:
-                app.logger.error(f"Network error fetching job history: {e}")
-                flash("Could not connect to history service.", "warning")
-            except Exception as e:
-                app.logger.error(
-                    f"Unexpected error fetching job history: {e}", exc_info=True
-                )
-                flash(
-                    "An unexpected error occurred while fetching job history.", "danger"
-                )
+            jwt_token = session.get("jwt")  # May have been refreshed
+            job_history_html = job_history_fragment(user_info["email"], jwt_token)
+            if job_history_html is None:
+                # The gateway rejected the token (expired/revoked in between)
+                session.pop("jwt", None)
+                session.pop("refresh_token", None)  # e.g. the session was revoked
+                is_logged_in = False  # Update flag
+                user_info = None
+                flash("Your session expired. Please log in again.", "warning")
+                # Don't redirect here, just render logged-out state
         # else: user_info is None, user is effectively logged out
 
     # Pass config needed by JavaScript
@@ -200,9 +336,18 @@ def index():
         "api_gateway_url": API_GATEWAY_URL_FOR_BROWSER,
         "is_logged_in": is_logged_in,  # Tell JS if user is logged in for this page load
     }
-    # Pass user_info and initial job_history to the template
+    if is_logged_in:
+        # Seed the JS token cache so its first poll skips /get-token
+        js_config["token"] = token_payload(jwt_token, user_info)
+    # Pass user_info and the rendered job history rows to the template
     return render_template(
-        "index.html", user_info=user_info, js_config=js_config, job_history=job_history
+        "index.html",
+        user_info=user_info,
+        js_config=js_config,
+        job_history_html=Markup(job_history_html or ""),
+        # One key per rendered form: a resubmitted form (double click, browser
+        # retry) is answered by the gateway with the job it already queued
+        idempotency_key=uuid.uuid4().hex,
     )
 
 
@@ -217,6 +362,7 @@ def submit_job():
     if not user_info:  # Should not happen if @login_required worked, but safety check
         flash("Authentication error. Please log in again.", "danger")
         return redirect(url_for("logout"))
+    token = session.get("jwt")  # May have been refreshed
 
     if "media_file" not in request.files or not request.files["media_file"].filename:
         flash("No file selected for upload.", "warning")
@@ -239,19 +385,24 @@ def submit_job():
     # --- Forward request to API Gateway ---
     api_url = f"{API_GATEWAY_URL_INTERNAL}/upload"
     headers = {"Authorization": f"Bearer {token}"}
+    if request.form.get("idempotency_key"):
+        headers["Idempotency-Key"] = request.form.get("idempotency_key")
     payload = {"output_format": output_format}
     if email:
         payload["email"] = email
+    if request.form.get("priority"):
+        payload["priority"] = request.form.get("priority")
     files_to_send = {"media_file": (file.filename, file.stream, file.mimetype)}
 
     try:
-        response = requests.post(
+        response = gateway_session.post(
             api_url, headers=headers, data=payload, files=files_to_send, timeout=60
         )
         response.raise_for_status()
 
         data = response.json()
         job_id = data.get("job_id")
+        invalidate_job_history()  # Show the new job on the next page load
         if job_id:
             flash(
                 f"Transcoding job submitted successfully! Job ID: {job_id}. History will update shortly.",
@@ -346,7 +497,7 @@ def callback_google():
         data = response.json()
         jwt_token = data.get("access_token")
         if jwt_token:
-            session["jwt"] = jwt_token
+            store_session_tokens(data)
             flash("Successfully logged in with Google!", "success")
             return redirect(url_for("index"))
         else:
@@ -382,7 +533,7 @@ def callback_github():
         data = response.json()
         jwt_token = data.get("access_token")
         if jwt_token:
-            session["jwt"] = jwt_token
+            store_session_tokens(data)
             flash("Successfully logged in with GitHub!", "success")
             return redirect(url_for("index"))
         else:
@@ -402,11 +553,34 @@ def callback_github():
 @app.route("/logout")
 def logout():
     session.pop("jwt", None)
+    refresh_token = session.pop("refresh_token", None)
+    if refresh_token:
+        # End the session server-side too, so its tokens stop working everywhere
+        try:
+            requests.post(
+                f"{AUTH_SERVICE_URL}/auth/revoke",
+                json={"refresh_token": refresh_token},
+                timeout=5,
+            )
+        except requests.exceptions.RequestException as e:
+            app.logger.error(f"Could not revoke session at logout: {e}")
     flash("You have been logged out.", "info")
     return redirect(url_for("index"))
 
 
 # --- API for JavaScript (Token needed for periodic refresh) ---
+def token_payload(token, user_info):
+    """
+    The token handed to the frontend JS, with its remaining lifetime.
+
+    `expires_in` is relative so the browser's clock does not matter; the JS
+    reuses the token until shortly before it runs out.
+    """
+    expires_at = user_info.get("expires_at")
+    expires_in = max(0, int(expires_at - time.time())) if expires_at else None
+    return {"access_token": token, "expires_in": expires_in}
+
+
 @app.route("/get-token")
 def get_token():
     """Securely provides the JWT stored in the session to the frontend JS."""
@@ -414,7 +588,8 @@ def get_token():
     if token:
         user_info = get_user_info_from_jwt(token)  # Re-check validity before sending
         if user_info:
-            return jsonify({"access_token": token})
+            # May have been refreshed
+            return jsonify(token_payload(session.get("jwt"), user_info))
         else:
             return jsonify(
                 {"error": "Invalid session token"}
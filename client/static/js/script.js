@@ -1,4 +1,4 @@
-// ./client/static/js/app.js
+// ./client/static/js/script.js
 
 // --- Wait for the DOM to be fully loaded ---
 document.addEventListener('DOMContentLoaded', function() {
@@ -11,21 +11,51 @@ document.addEventListener('DOMContentLoaded', function() {
     const IS_LOGGED_IN = window.APP_CONFIG?.is_logged_in;
     const CLIENT_TOKEN_ENDPOINT = '/get-token'; // Client backend endpoint to get JWT
     const REFRESH_INTERVAL_MS = 30000; // 30 seconds
+    const TOKEN_RENEW_MARGIN_MS = 60000; // Fetch a new token this long before the cached one expires
+    const UPLOAD_CONCURRENCY = 3; // Parts sent to the gateway at the same time
+    const PART_MAX_ATTEMPTS = 4; // Per part, with exponential backoff between attempts
 
     // --- DOM Elements ---
     const jobHistoryList = document.getElementById('job-history-list');
     const jobHistorySection = document.getElementById('job-history-section'); // Check if section exists
+    const uploadForm = document.getElementById('upload-form');
+    const uploadStatus = document.getElementById('job-status-section');
 
     // --- State ---
     let historyIntervalId = null; // ID for the setInterval timer
+    let cachedToken = null; // { value, renewAt } - reused across polls until close to expiry
+    let renderedHistoryEtag = null; // ETag of the job list currently on screen
 
     // --- Helper Functions ---
 
     /**
-     * Fetches the JWT from the client's backend Flask session securely.
+     * Caches a token response ({access_token, expires_in}) from the client backend.
+     * @param {object|null} data - Token payload from /get-token or APP_CONFIG.
+     */
+    function cacheToken(data) {
+        if (!data || !data.access_token) {
+            cachedToken = null;
+            return;
+        }
+        // Without a lifetime, reuse for one poll only
+        const lifetimeMs = data.expires_in != null ? data.expires_in * 1000 : 0;
+        cachedToken = {
+            value: data.access_token,
+            renewAt: Date.now() + Math.max(0, lifetimeMs - TOKEN_RENEW_MARGIN_MS),
+        };
+    }
+
+    /**
+     * Returns the cached JWT, or fetches one from the client's backend Flask
+     * session once the cached one is close to expiry (the backend refreshes it).
+     * @param {boolean} forceRenew - Skip the cache (e.g. after a 401 from the gateway).
      * @returns {Promise<string|null>} JWT token or null if failed/not logged in.
      */
-    async function getJwtToken() {
+    async function getJwtToken(forceRenew = false) {
+        if (!forceRenew && cachedToken && Date.now() < cachedToken.renewAt) {
+            return cachedToken.value;
+        }
+        cachedToken = null;
         try {
             const response = await fetch(CLIENT_TOKEN_ENDPOINT);
             if (response.status === 401) {
@@ -42,6 +72,7 @@ document.addEventListener('DOMContentLoaded', function() {
                  console.error('Token endpoint response did not contain access_token.');
                  return null;
             }
+            cacheToken(data);
             return data.access_token;
         } catch (error) {
             console.error('Network or other error fetching token:', error);
@@ -128,6 +159,16 @@ document.addEventListener('DOMContentLoaded', function() {
                      li.appendChild(downloadSpan);
                 }
 
+                // Thumbnail sprite sheet (video) or waveform (audio), once generated
+                if (job.preview_url) {
+                    const previewImg = document.createElement('img');
+                    previewImg.className = 'job-preview';
+                    previewImg.src = job.preview_url;
+                    previewImg.alt = `Preview of ${displayName}`;
+                    previewImg.loading = 'lazy';
+                    li.appendChild(previewImg);
+                }
+
                 if (job.status === 'FAILED' && job.error) {
                     const errorSpan = document.createElement('span');
                     errorSpan.className = 'job-error-message';
@@ -154,7 +195,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         console.log("Fetching job history via JS...");
-        const token = await getJwtToken();
+        let token = await getJwtToken();
         if (!token) {
             // Stop refreshing if token is invalid/missing
             console.log("No valid token found, stopping history refresh.");
@@ -165,11 +206,23 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         try {
-            const response = await fetch(`${API_GATEWAY_URL}/jobs`, {
-                headers: { 'Authorization': `Bearer ${token}` },
-                cache: 'no-store' // Prevent browser caching of the API response
+            const requestJobs = (bearer) => fetch(`${API_GATEWAY_URL}/jobs`, {
+                headers: { 'Authorization': `Bearer ${bearer}` },
+                // Revalidate every time: the browser sends If-None-Match and the
+                // gateway answers 304 (one Redis GET) while nothing changed
+                cache: 'no-cache'
             });
+            let response = await requestJobs(token);
 
+            if (response.status === 401) {
+                // The cached token may have been rejected early (clock skew,
+                // revocation): get a fresh one from the backend and retry once
+                token = await getJwtToken(true);
+                if (!token) {
+                    return;
+                }
+                response = await requestJobs(token);
+            }
             if (response.status === 401 || response.status === 403) {
                  console.warn('Auth error fetching history. Stopping refresh.');
                  stopHistoryRefresh();
@@ -180,11 +233,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(`HTTP error ${response.status} ${response.statusText}`);
             }
 
+            // A 304 reaches us as the cached 200; skip re-rendering the same list
+            const etag = response.headers.get('ETag');
+            if (etag && etag === renderedHistoryEtag) {
+                return;
+            }
             const jobs = await response.json();
             if (!Array.isArray(jobs)) {
                  throw new Error("Invalid history data received from server.");
             }
             renderJobHistoryList(jobs); // Render the fetched jobs
+            renderedHistoryEtag = etag;
 
         } catch (error) {
             console.error('Error fetching or rendering job history:', error);
@@ -205,7 +264,231 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // --- Resumable Uploads ---
+    // The browser sends the file straight to the gateway's upload-session API
+    // in parts, several at a time. The session ID is kept in localStorage, so
+    // after a failure (or a closed tab) submitting the same file again only
+    // sends the parts the gateway does not have yet.
+
+    class UploadError extends Error {
+        constructor(message, retryable) {
+            super(message);
+            this.retryable = retryable;
+        }
+    }
+
+    /**
+     * Calls the API Gateway with the cached bearer token (renewed once on 401).
+     * @param {string} path - Path under the gateway URL.
+     * @param {object} options - fetch() options.
+     * @returns {Promise<Response>}
+     */
+    async function gatewayFetch(path, options = {}) {
+        let token = await getJwtToken();
+        for (let attempt = 0; attempt < 2 && token; attempt++) {
+            const headers = Object.assign({}, options.headers, { 'Authorization': `Bearer ${token}` });
+            const response = await fetch(`${API_GATEWAY_URL}${path}`, Object.assign({}, options, { headers }));
+            if (response.status !== 401 || attempt === 1) {
+                return response;
+            }
+            token = await getJwtToken(true);
+        }
+        throw new UploadError('Your session has expired. Please log in again.', false);
+    }
+
+    async function errorMessage(response) {
+        try {
+            const data = await response.json();
+            return data.error || `HTTP ${response.status}`;
+        } catch (e) {
+            return `HTTP ${response.status}`;
+        }
+    }
+
+    function showUploadStatus(message, kind = 'info', progress = null) {
+        if (!uploadStatus) {
+            return;
+        }
+        uploadStatus.innerHTML = '';
+        const text = document.createElement('p');
+        text.className = `alert alert-${kind}`; // Same look as the flashed messages
+        text.textContent = message;
+        uploadStatus.appendChild(text);
+        if (progress !== null) {
+            const bar = document.createElement('progress');
+            bar.max = 100;
+            bar.value = Math.round(progress * 100);
+            uploadStatus.appendChild(bar);
+        }
+    }
+
+    /**
+     * Sends one part, retrying network errors and 5xx responses with backoff.
+     */
+    async function uploadPart(uploadId, file, session, partNumber) {
+        const start = (partNumber - 1) * session.part_size;
+        const blob = file.slice(start, Math.min(start + session.part_size, file.size));
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await gatewayFetch(`/uploads/${uploadId}/parts/${partNumber}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: blob,
+                });
+                if (response.ok) {
+                    return blob.size;
+                }
+                const retryable = response.status >= 500 || response.status === 429;
+                throw new UploadError(await errorMessage(response), retryable);
+            } catch (error) {
+                // fetch() rejects with a TypeError on network failures
+                const retryable = error instanceof UploadError ? error.retryable : true;
+                if (!retryable || attempt >= PART_MAX_ATTEMPTS) {
+                    throw error;
+                }
+                console.warn(`Part ${partNumber} failed (attempt ${attempt}), retrying:`, error.message);
+                await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** (attempt - 1)));
+            }
+        }
+    }
+
+    async function completeUpload(uploadId) {
+        // The upload id doubles as the Idempotency-Key: if a response is lost,
+        // the retry gets the job that was already queued instead of a 404
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await gatewayFetch(`/uploads/${uploadId}/complete`, {
+                    method: 'POST',
+                    headers: { 'Idempotency-Key': uploadId },
+                });
+                if (response.status < 500 || attempt >= PART_MAX_ATTEMPTS) {
+                    return response;
+                }
+            } catch (error) {
+                if (error instanceof UploadError || attempt >= PART_MAX_ATTEMPTS) {
+                    throw error;
+                }
+            }
+            console.warn(`Completing upload ${uploadId} failed (attempt ${attempt}), retrying.`);
+            await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** (attempt - 1)));
+        }
+    }
+
+    /**
+     * Uploads (or resumes uploading) a file and queues its transcoding job.
+     * @returns {Promise<string>} The job ID.
+     */
+    async function uploadFile(file, options) {
+        const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}:${options.output_format}`;
+        let uploadId = localStorage.getItem(resumeKey);
+        let session = null;
+        let storedParts = new Set();
+
+        if (uploadId) {
+            const response = await gatewayFetch(`/uploads/${uploadId}`);
+            if (response.ok) {
+                session = await response.json();
+                storedParts = new Set(session.uploaded_parts);
+                console.log(`Resuming upload ${uploadId}: ${storedParts.size}/${session.part_count} parts stored.`);
+            } else {
+                localStorage.removeItem(resumeKey); // Expired or cancelled; start over
+            }
+        }
+        if (!session) {
+            const response = await gatewayFetch('/uploads', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(Object.assign({
+                    filename: file.name,
+                    size: file.size,
+                    content_type: file.type || null,
+                }, options)),
+            });
+            if (!response.ok) {
+                throw new UploadError(await errorMessage(response), false);
+            }
+            session = await response.json();
+            uploadId = session.upload_id;
+            localStorage.setItem(resumeKey, uploadId);
+        }
+
+        const pending = [];
+        for (let n = 1; n <= session.part_count; n++) {
+            if (!storedParts.has(n)) {
+                pending.push(n);
+            }
+        }
+        let sentBytes = file.size - pending.reduce(
+            (total, n) => total + Math.min(session.part_size, file.size - (n - 1) * session.part_size), 0);
+        const report = () => showUploadStatus(`Uploading ${file.name}...`, 'info', sentBytes / file.size);
+        report();
+
+        // Part 1 first: the gateway checks the file type on it, so a wrong
+        // file fails fast instead of after every other part was sent
+        if (pending[0] === 1) {
+            sentBytes += await uploadPart(uploadId, file, session, pending.shift());
+            report();
+        }
+        const worker = async () => {
+            while (pending.length) {
+                sentBytes += await uploadPart(uploadId, file, session, pending.shift());
+                report();
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(UPLOAD_CONCURRENCY, pending.length) }, worker));
+
+        showUploadStatus(`Finishing upload of ${file.name}...`, 'info', 1);
+        const response = await completeUpload(uploadId);
+        if (!response.ok) {
+            if (response.status === 404 || response.status === 415) {
+                localStorage.removeItem(resumeKey);
+            }
+            throw new UploadError(await errorMessage(response), false);
+        }
+        localStorage.removeItem(resumeKey);
+        const data = await response.json();
+        return data.job_id;
+    }
+
+    if (uploadForm && API_GATEWAY_URL && window.fetch && window.localStorage) {
+        // With JS the form is sent by uploadFile(); without it, the classic
+        // form POST through the client backend still works
+        uploadForm.addEventListener('submit', async (event) => {
+            const fileInput = uploadForm.querySelector('input[type="file"]');
+            const file = fileInput && fileInput.files[0];
+            if (!file) {
+                return;
+            }
+            event.preventDefault();
+            const submitButton = uploadForm.querySelector('button[type="submit"]');
+            const formData = new FormData(uploadForm);
+            const options = {
+                output_format: formData.get('output_format'),
+                email: formData.get('email') || null,
+                priority: formData.get('priority') || null,
+            };
+
+            submitButton.disabled = true;
+            try {
+                const jobId = await uploadFile(file, options);
+                showUploadStatus(`Transcoding job submitted successfully! Job ID: ${jobId}.`, 'success');
+                fileInput.value = '';
+                fetchAndRenderHistory();
+                if (!historyIntervalId && jobHistorySection) {
+                    historyIntervalId = setInterval(fetchAndRenderHistory, REFRESH_INTERVAL_MS);
+                }
+            } catch (error) {
+                console.error('Upload failed:', error);
+                showUploadStatus(`Upload failed: ${error.message}. Submit the same file again to resume.`, 'danger');
+            } finally {
+                submitButton.disabled = false;
+            }
+        });
+    }
+
     // --- Initialization ---
+    cacheToken(window.APP_CONFIG?.token); // Token rendered with the page, if logged in
+
     // Start periodic refresh ONLY if user is logged in AND history section exists
     if (IS_LOGGED_IN && jobHistorySection) {
         console.log("User is logged in, initiating periodic history refresh.");
@@ -1,6 +1,9 @@
 # ./services/api-gateway/app.py
+import hashlib
+import hmac
 import logging
 import os
+import re
 import time
 import uuid
 from functools import wraps
@@ -11,9 +14,43 @@ import requests
 from celery import Celery
 
 # from dotenv import dotenv_values
-from flask import Flask, g, jsonify, request  # g for storing user info per request
+from flask import (  # g for storing user info per request
+    Flask,
+    Response,
+    g,
+    jsonify,
+    request,
+    stream_with_context,
+)
 from werkzeug.utils import secure_filename  # For getting original filename safely
 
+# Important: Ensure 'common' is accessible in PYTHONPATH
+try:
+    from common import (
+        fair_queue,
+        formats,
+        idempotency,
+        job_store,
+        media_sniff,
+        revocation,
+        storage,
+        upload_sessions,
+    )
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from common import (
+        fair_queue,
+        formats,
+        idempotency,
+        job_store,
+        media_sniff,
+        revocation,
+        storage,
+        upload_sessions,
+    )
+
 # --- Configuration ---
 # Load .env file from project root
 config = {
@@ -30,17 +67,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Redis Connection (for job metadata & user history)
+# redis-py connects lazily on the first command, so start-up never blocks on
+# Redis; each gunicorn worker opens its own connections after the fork.
 try:
     redis_client = redis.Redis.from_url(
         config.get("REDIS_URL", "redis://redis:6379/0"),
         decode_responses=True,  # Decode responses to strings
     )
-    redis_client.ping()  # Check connection
-    logger.info("Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    logger.error(f"Could not connect to Redis: {e}")
+except ValueError as e:  # Malformed REDIS_URL
+    logger.error(f"Invalid Redis configuration: {e}")
     redis_client = None  # Handle gracefully later if needed
 
+# Revoked login sessions, mirrored into an in-memory Bloom filter so the
+# per-request check needs no Redis round trip (see common/revocation.py)
+revocation_filter = revocation.RevocationFilter(redis_client) if redis_client else None
+
 # Celery Configuration (only need broker to send tasks)
 # Result backend interaction happens via redis_client or AsyncResult if needed directly
 celery_app = Celery(
@@ -51,10 +92,52 @@ celery_app = Celery(
 
 # Service URLs
 UPLOAD_SERVICE_URL = config.get("UPLOAD_SERVICE_URL", "http://upload-service:5003")
+UPLOAD_FORWARD_CHUNK_SIZE = 1024 * 1024  # Bytes per write when forwarding a file
+S3_RAW_PREFIX = config.get("S3_RAW_PREFIX", "raw/")  # Same prefix the upload-service writes to
+
+# Browser origins allowed to call the API directly (client UI), comma-separated
+CORS_ALLOWED_ORIGINS = {
+    origin.strip().rstrip("/")
+    for origin in config.get("CORS_ALLOWED_ORIGINS", "http://localhost:5000").split(",")
+    if origin.strip()
+}
 
 # JWT Configuration
-JWT_SECRET_KEY = config.get("JWT_SECRET_KEY", "default-fallback-secret-key-change-me")
+DEFAULT_JWT_SECRET_KEY = "default-fallback-secret-key-change-me"
+JWT_SECRET_KEY = config.get("JWT_SECRET_KEY", DEFAULT_JWT_SECRET_KEY)
 JWT_ALGORITHM = config.get("JWT_ALGORITHM", "HS256")
+# Asymmetric tokens are verified against the auth-service's JWK Set; keys are
+# cached and refetched when a token carries an unknown kid (key rotation)
+JWKS_URL = config.get("JWKS_URL", "http://auth-service:5002/.well-known/jwks.json")
+JWKS_CACHE_SECONDS = int(config.get("JWKS_CACHE_SECONDS", 300))
+ASYMMETRIC_ALGORITHMS = ["RS256", "EdDSA"]
+# Legacy shared-secret (HS256) tokens are only accepted when explicitly enabled
+# for a migration, and never with the public default secret: anyone could sign
+# a token for any user with it
+JWT_ACCEPT_SHARED_SECRET = config.get("JWT_ACCEPT_SHARED_SECRET", "False").lower() in ["true", "1", "t"]
+if JWT_ACCEPT_SHARED_SECRET and JWT_SECRET_KEY == DEFAULT_JWT_SECRET_KEY:
+    logger.error("JWT_ACCEPT_SHARED_SECRET is on but JWT_SECRET_KEY is using its default value; HS256 tokens are rejected.")
+    JWT_ACCEPT_SHARED_SECRET = False
+jwks_client = jwt.PyJWKClient(JWKS_URL, cache_jwk_set=True, lifespan=JWKS_CACHE_SECONDS) if JWKS_URL else None
+
+# Download proxy (/download/<job_id>)
+# Base URL browsers reach the gateway on; used to build absolute download links
+PUBLIC_GATEWAY_URL = config.get("API_GATEWAY_URL_FOR_BROWSER")
+# Signs download links. Falls back to JWT_SECRET_KEY only if that was set: with
+# asymmetric JWTs nothing requires it, and its built-in default is public, so
+# links signed with it could be forged for any job. Without a key, no signed
+# links are issued or accepted (owners can still download with their token).
+DOWNLOAD_SIGNING_KEY = config.get("DOWNLOAD_SIGNING_KEY") or (
+    JWT_SECRET_KEY if JWT_SECRET_KEY != DEFAULT_JWT_SECRET_KEY else None
+)
+if not DOWNLOAD_SIGNING_KEY:
+    logger.warning("DOWNLOAD_SIGNING_KEY is not set; signed download links are disabled.")
+DOWNLOAD_LINK_TTL_SECONDS = int(config.get("DOWNLOAD_LINK_TTL_SECONDS", 86400))
+# Link expiry is rounded up to this step, so repeated /jobs polls return the
+# same URL and browser/proxy caches keep hitting
+DOWNLOAD_LINK_BUCKET_SECONDS = int(config.get("DOWNLOAD_LINK_BUCKET_SECONDS", 3600))
+DOWNLOAD_CACHE_MAX_AGE = int(config.get("DOWNLOAD_CACHE_MAX_AGE", 86400))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
 
 # --- Constants ---
 ALLOWED_EXTENSIONS = {
@@ -67,6 +150,7 @@ ALLOWED_EXTENSIONS = {
     "wav",
     "flac",
     "aac",
+    "m4a",
 }  # Example, refine as needed
 SUPPORTED_OUTPUT_FORMATS = {
     "mp4",
@@ -78,74 +162,163 @@ SUPPORTED_OUTPUT_FORMATS = {
     "wav",
     "flac",
     "aac",
+    "m4a",
 }
 MAX_JOB_HISTORY = 10  # Number of recent job IDs to keep per user
+# /jobs ETags also change at least this often, so a revalidated response never
+# holds download/preview links past their expiry
+HISTORY_ETAG_WINDOW_SECONDS = max(
+    60, min(DOWNLOAD_LINK_BUCKET_SECONDS, storage.S3_PRESIGNED_URL_EXPIRATION // 2)
+)
+TRANSCODING_POOL = "transcoding"  # Fair-queue pool consumed by the transcoding workers
+TRANSCODE_TICKET_TASK = "transcoding.tasks.transcode_next"
+# Audio-only outputs go to their own pool, consumed by the lightweight audio
+# workers; set AUDIO_POOL_ENABLED=False where no audio worker runs
+AUDIO_POOL = "audio"
+AUDIO_TICKET_TASK = "transcoding.tasks.audio_next"
+AUDIO_POOL_ENABLED = config.get("AUDIO_POOL_ENABLED", "True").lower() in ["true", "1", "t"]
 
 
 # --- Helper Functions ---
+def job_route(output_format):
+    """Returns the (fair-queue pool, Celery queue, ticket task) serving an output format."""
+    if AUDIO_POOL_ENABLED and formats.is_audio_only(output_format):
+        return AUDIO_POOL, "audio_queue", AUDIO_TICKET_TASK
+    return TRANSCODING_POOL, "transcoding_queue", TRANSCODE_TICKET_TASK
+
+
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def get_task_result(task_id):
-    """Get task result directly from Celery backend (Redis)."""
-    if not redis_client:
-        return {"status": "ERROR", "error": "Redis connection unavailable"}
-    try:
-        # Celery stores results under keys like 'celery-task-meta-<task_id>'
-        result_key = f"celery-task-meta-{task_id}"
-        raw_data = redis_client.get(result_key)
-        if raw_data:
-            # Data is stored as a JSON string
-            import json
-
-            data = json.loads(raw_data)
-            # Map Celery states to our application states
-            status_map = {
-                "PENDING": "PENDING",
-                "STARTED": "PROCESSING",  # Celery's STARTED maps to our PROCESSING
-                "SUCCESS": "COMPLETED",  # Celery's SUCCESS maps to our COMPLETED
-                "FAILURE": "FAILED",  # Celery's FAILURE maps to our FAILED
-                "RETRY": "PROCESSING",  # Treat retry as still processing
-                "REVOKED": "FAILED",  # Treat revoked as failed
-            }
-            app_status = status_map.get(data.get("status", "PENDING"), "PENDING")
+def sign_download(job_id, expires):
+    """HMAC signature authorising a download link for a job until `expires` (needs DOWNLOAD_SIGNING_KEY)."""
+    message = f"{job_id}:{expires}".encode("utf-8")
+    return hmac.new(DOWNLOAD_SIGNING_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()
 
-            result_payload = {
-                "status": app_status,
-                "job_id": task_id,
-            }
-            # If failed, include the error message (result field might contain exception info)
-            if app_status == "FAILED":
-                # Celery stores exception info in 'result' or 'traceback'
-                error_info = data.get("result")  # Often contains exception repr
-                if isinstance(error_info, dict) and "exc_message" in error_info:
-                    result_payload["error"] = str(error_info["exc_message"])
-                elif error_info:
-                    result_payload["error"] = str(error_info)
-                else:
-                    result_payload["error"] = data.get("traceback", "Unknown error")
 
-            return result_payload
-        else:
-            # If key doesn't exist, task might not have started or expired
-            # Check our own metadata store as a fallback
-            return {
-                "status": "UNKNOWN",
-                "job_id": task_id,
-                "error": "Task status not found in backend",
-            }
+def download_link(job_id, metadata):
+    """
+    Builds the signed /download link for a completed job.
 
-    except Exception as e:
-        logger.error(f"Error fetching task result for {task_id} from backend: {e}")
-        return {
-            "status": "ERROR",
-            "job_id": task_id,
-            "error": f"Internal error fetching status: {e}",
-        }
+    Outputs are served through the gateway instead of S3 presigned URLs, so
+    links survive S3 credential/URL expiry and carry cache headers. The link
+    itself is signed (no Authorization header needed, so plain <a href> works).
+
+    Returns:
+        str: The absolute download URL, or None if the job has no output
+             (or no DOWNLOAD_SIGNING_KEY is configured).
+    """
+    if metadata.get("status") != job_store.STATUS_COMPLETED or not metadata.get("output_s3_key"):
+        return None
+    if not DOWNLOAD_SIGNING_KEY:
+        return None
+    bucket = max(1, DOWNLOAD_LINK_BUCKET_SECONDS)
+    expires = -(-(int(time.time()) + DOWNLOAD_LINK_TTL_SECONDS) // bucket) * bucket
+    base_url = (PUBLIC_GATEWAY_URL or request.host_url).rstrip("/")
+    return f"{base_url}/download/{job_id}?expires={expires}&sig={sign_download(job_id, expires)}"
+
+
+def history_etag(user_email, version):
+    """
+    Strong ETag of a user's /jobs response: the user, their history version,
+    and the current link window (download and preview links rotate with it).
+    """
+    window = int(time.time()) // HISTORY_ETAG_WINDOW_SECONDS
+    user_tag = hashlib.sha256(user_email.encode("utf-8")).hexdigest()[:12]
+    return f"{user_tag}-{version}-{window}"
+
+
+class MultipartFileBody:
+    """
+    A multipart/form-data body holding one file, produced chunk by chunk.
+
+    Has a length, so requests sends it with Content-Length instead of chunked.
+    """
+
+    def __init__(self, boundary, field, filename, fileobj, content_type, chunk_size=UPLOAD_FORWARD_CHUNK_SIZE):
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self._fileobj = fileobj
+        self._chunk_size = chunk_size
+        start = fileobj.tell()
+        self._file_size = fileobj.seek(0, os.SEEK_END) - start
+        fileobj.seek(start)
+
+    def __len__(self):
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        while True:
+            chunk = self._fileobj.read(self._chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        yield self._tail
+
+
+def multipart_file_body(field, filename, fileobj, content_type):
+    """Returns (Content-Type header, body) for streaming one seekable file as a form upload."""
+    boundary = uuid.uuid4().hex
+    body = MultipartFileBody(boundary, field, filename, fileobj, content_type)
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+def presign_preview(job_id, metadata):
+    """Presigns the preview image (sprite sheet or waveform) of a job, if one exists."""
+    return _presign(job_id, metadata.get("preview_s3_key"))
+
+
+def presign_previews(jobs):
+    """Presigns the previews of many jobs (metadata dicts or None) in one go; returns key -> URL."""
+    keys = [metadata["preview_s3_key"] for metadata in jobs if metadata and metadata.get("preview_s3_key")]
+    if not keys:
+        return {}
+    try:
+        return storage.presign_many(keys)
+    except storage.S3Error as e:
+        logger.warning(f"Could not presign {len(keys)} preview URL(s): {e}")
+        return {}
+
+
+def _presign(job_id, s3_key):
+    if not s3_key:
+        return None
+    try:
+        return storage.create_presigned_url(s3_key)
+    except storage.S3Error as e:
+        logger.warning(f"Job {job_id}: Could not presign URL for {s3_key}: {e}")
+        return None
 
 
 # --- Authentication Decorator ---
+def decode_token(token):
+    """
+    Verifies a bearer token and returns its claims.
+
+    RS256/EdDSA tokens are checked against the auth-service JWKS (no shared
+    secret needed); HS256 tokens only while JWT_ACCEPT_SHARED_SECRET is on
+    and JWT_SECRET_KEY is not its default.
+
+    Raises:
+        jwt.PyJWTError: If the token is invalid, expired or its key unknown.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        if not jwks_client:
+            raise jwt.InvalidTokenError("Asymmetric tokens are not accepted (JWKS_URL not set)")
+        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        return jwt.decode(token, signing_key.key, algorithms=ASYMMETRIC_ALGORITHMS)
+    if algorithm == JWT_ALGORITHM and JWT_ACCEPT_SHARED_SECRET:
+        return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    raise jwt.InvalidTokenError(f"Unsupported token algorithm: {algorithm}")
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -164,8 +337,8 @@ def token_required(f):
             return jsonify({"error": "Authorization token is missing"}), 401
 
         try:
-            # Validate the token using the secret key
-            data = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            # Validate the token (JWKS public key, or the legacy shared secret)
+            data = decode_token(token)
             # Store user data in Flask's 'g' object for access within the request context
             g.current_user = {
                 "email": data.get("email"),
@@ -175,6 +348,11 @@ def token_required(f):
             if not g.current_user.get("email"):
                 logger.error("JWT is valid but missing 'email' claim.")
                 return jsonify({"error": "Invalid token claims (missing email)"}), 401
+            # Tokens from before session ids existed carry no 'sid' and cannot be revoked
+            sid = data.get("sid")
+            if sid and revocation_filter and revocation_filter.is_revoked(sid):
+                logger.warning(f"Token of revoked session {sid} rejected.")
+                return jsonify({"error": "Token has been revoked"}), 401
             logger.info(f"Authenticated user: {g.current_user['email']}")
 
         except jwt.ExpiredSignatureError:
@@ -183,6 +361,10 @@ def token_required(f):
         except jwt.InvalidTokenError as e:
             logger.error(f"Invalid token received: {e}")
             return jsonify({"error": f"Token is invalid: {e}"}), 401
+        except jwt.PyJWKClientError as e:
+            # Unknown kid even after a refetch, or the JWKS endpoint is unreachable
+            logger.error(f"Could not get a verification key for token: {e}")
+            return jsonify({"error": "Token signing key could not be verified"}), 401
         except Exception as e:
             logger.error(f"Error during token decoding: {e}")
             return jsonify(
@@ -194,6 +376,196 @@ def token_required(f):
     return decorated
 
 
+# --- CORS ---
+@app.after_request
+def add_cors_headers(response):
+    """Lets the client UI call the gateway from the browser (other origin)."""
+    origin = request.headers.get("Origin")
+    if origin and origin.rstrip("/") in CORS_ALLOWED_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.vary.add("Origin")
+        response.headers["Access-Control-Expose-Headers"] = "ETag, Idempotent-Replayed"
+        if request.method == "OPTIONS":  # Preflight (answered by Flask, no auth)
+            response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, HEAD"
+            response.headers["Access-Control-Allow-Headers"] = "Authorization, Content-Type, Idempotency-Key"
+            response.headers["Access-Control-Max-Age"] = "600"
+    return response
+
+
+# --- Idempotency ---
+def idempotent(f):
+    """
+    Honours an optional `Idempotency-Key` header on a job-creating route.
+
+    The first request with a key claims it and runs; a retry with the same key
+    (same user and path) gets 409 while that request is still running, and
+    afterwards the stored response of a successful (2xx) run, marked with
+    `Idempotent-Replayed: true`. The retry's body is never read, so nothing
+    is uploaded, stored or transcoded twice. A failed run frees the key so
+    the client can try again. Must be applied below @token_required.
+    """
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return f(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > idempotency.MAX_KEY_LENGTH:
+            return jsonify(
+                {"error": f"Idempotency-Key must be 1-{idempotency.MAX_KEY_LENGTH} characters"}
+            ), 400
+        if not redis_client:
+            logger.warning("Redis unavailable; Idempotency-Key ignored.")
+            return f(*args, **kwargs)
+
+        scope = f"{g.current_user['email']}:{request.path}"
+        try:
+            state, value = idempotency.begin(redis_client, scope, key)
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Redis error checking Idempotency-Key: {e}")
+            return jsonify({"error": "Backend service unavailable (Redis)"}), 503
+
+        if state == idempotency.IN_PROGRESS:
+            logger.info(f"Retry of in-flight request {request.path} (Idempotency-Key {key})")
+            response = jsonify(
+                {"error": "A request with this Idempotency-Key is still in progress"}
+            )
+            response.status_code = 409
+            response.headers["Retry-After"] = "5"
+            return response
+        if state == idempotency.DONE:
+            logger.info(f"Replaying response for {request.path} (Idempotency-Key {key})")
+            response = jsonify(value["body"])
+            response.status_code = value["status"]
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        token = value
+        try:
+            # Streamed uploads can outlast the claim's TTL; keep renewing it
+            with idempotency.hold(redis_client, scope, key, token):
+                response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency.release(redis_client, scope, key, token)
+            raise
+        try:
+            if 200 <= response.status_code < 300 and response.is_json:
+                stored = idempotency.complete(
+                    redis_client,
+                    scope,
+                    key,
+                    token,
+                    {"status": response.status_code, "body": response.get_json()},
+                )
+                if not stored:
+                    logger.warning(f"Idempotency-Key {key} claim was lost; response not stored.")
+            else:
+                idempotency.release(redis_client, scope, key, token)
+        except redis.exceptions.RedisError as e:
+            # The key stays "pending" until IDEMPOTENCY_LOCK_SECONDS pass
+            logger.error(f"Redis error storing Idempotency-Key result: {e}")
+        return response
+
+    return decorated
+
+
+# --- Job Creation ---
+def queue_transcoding_job(
+    user_email,
+    notification_email,
+    input_s3_key,
+    input_container,
+    output_format,
+    original_filename,
+    priority,
+):
+    """
+    Records a job for an input already stored in S3 and queues it for transcoding.
+
+    Shared by the single-request /upload and the resumable upload sessions.
+
+    Returns:
+        tuple: Flask (response, status) - 202 with the job ID, or an error.
+    """
+    # 1. Generate Job ID and Store Initial Job Metadata in Redis
+    # (before queueing, so a fast worker can never be overwritten by PENDING)
+    job_id = str(uuid.uuid4())
+    task_payload = {
+        "job_id": job_id,
+        "input_s3_key": input_s3_key,
+        "output_format": output_format.lower(),
+        "user_email": user_email,  # User who initiated
+        "notification_email": notification_email,  # Email for notification
+        "original_filename": original_filename,
+        "input_container": input_container,
+    }
+
+    if redis_client:
+        try:
+            initial_metadata = {
+                "user_email": user_email,
+                "notification_email": notification_email,
+                "input_s3_key": input_s3_key,
+                "output_format": output_format.lower(),
+                "original_filename": original_filename,
+                "input_container": input_container or "",
+                "priority": priority,
+                "timestamp": int(time.time()),  # Unix timestamp
+            }
+            # Job hash, active set and user's history list in one round-trip
+            job_store.create_job(redis_client, job_id, initial_metadata, MAX_JOB_HISTORY)
+
+        except redis.exceptions.RedisError as e:
+            logger.error(
+                f"Redis error storing metadata/history for Job ID {job_id}: {e}"
+            )
+            # Continue, but log the error. The job is queued, but history/status might be incomplete initially.
+            # The worker *should* update the status later anyway.
+        except Exception as e:
+            logger.error(
+                f"Non-Redis error storing metadata/history for Job ID {job_id}: {e}"
+            )
+
+    # 2. Queue Transcoding Task
+    pool, queue, ticket_task = job_route(output_format)
+    try:
+        if redis_client:
+            # Per-user fair queue: the job waits in its owner's queue/lane, and the
+            # Celery message is only a ticket telling some worker to pull the next fair job
+            fair_queue.enqueue(
+                redis_client, pool, user_email, task_payload, lane=priority
+            )
+            celery_app.send_task(ticket_task, queue=queue)
+        else:
+            # Without Redis there is no fair queue; fall back to plain FIFO
+            celery_app.send_task(
+                "transcoding.tasks.transcode_media",
+                args=[task_payload],
+                task_id=job_id,
+                queue=queue,
+            )
+        logger.info(
+            f"Transcoding job queued ({pool} pool, {priority} lane). Job ID: {job_id}"
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to queue transcoding task for Job ID {job_id}: {e}")
+        if redis_client:
+            try:
+                job_store.update_job(
+                    redis_client, job_id, job_store.STATUS_FAILED, error_message="Failed to queue job"
+                )
+            except redis.exceptions.RedisError:
+                pass
+        return jsonify({"error": f"Failed to queue transcoding job: {e}"}), 500
+
+    # 3. Return Job ID to Client
+    return jsonify(
+        {"job_id": job_id, "message": "File upload received, transcoding queued."}
+    ), 202  # Accepted
+
+
 # --- Routes ---
 
 
@@ -201,15 +573,21 @@ def token_required(f):
 def health_check():
     """Basic health check endpoint."""
     # Could add checks for Redis, Celery broker connections here
-    return jsonify({"status": "healthy"}), 200
+    # Signed links are optional (owners download with their token), so their
+    # absence is reported but never takes the gateway out of service
+    return jsonify(
+        {"status": "healthy", "download_links": "enabled" if DOWNLOAD_SIGNING_KEY else "disabled"}
+    ), 200
 
 
 @app.route("/upload", methods=["POST"])
 @token_required
+@idempotent
 def upload_file():
     """
     Handles file upload, forwards to upload-service, and queues transcoding task.
-    Requires JWT authentication.
+    Requires JWT authentication. Retries carrying the same Idempotency-Key
+    get the original job back instead of a second upload.
     """
     user_email = g.current_user["email"]
     logger.info(f"Upload request received from user: {user_email}")
@@ -223,6 +601,8 @@ def upload_file():
     notification_email = request.form.get(
         "email", user_email
     )  # Default to user's login email
+    # Priority lane: 'interactive', 'normal' (default) or 'bulk'
+    priority = fair_queue.normalize_lane(request.form.get("priority"))
 
     if not file or file.filename == "":
         logger.warning("No selected file.")
@@ -238,10 +618,16 @@ def upload_file():
 
     original_filename = secure_filename(file.filename)  # Sanitize filename
 
-    # Optional: Check file extension here if needed, though FFmpeg is robust
-    # if not allowed_file(original_filename):
-    #     logger.warning(f"File type not allowed: {original_filename}")
-    #     return jsonify({'error': 'File type not allowed'}), 400
+    # Check content rather than extension: sniff the container from the first
+    # few KB so junk never reaches the upload-service, S3 or a worker.
+    # (Werkzeug spools form files, so the stream can be rewound afterwards.)
+    header = file.stream.read(media_sniff.SNIFF_BYTES)
+    file.stream.seek(0)
+    if not media_sniff.detect_container(header):
+        logger.warning(f"Rejected upload '{original_filename}': not a media container")
+        return jsonify(
+            {"error": "File does not look like a supported audio/video container."}
+        ), 415
 
     logger.info(
         f"Processing upload: Filename='{original_filename}', Format='{output_format}', User='{user_email}'"
@@ -249,19 +635,32 @@ def upload_file():
 
     # 1. Forward file to Upload Service
     try:
-        # Important: Pass the file stream directly using 'files' parameter
-        files_to_forward = {
-            "media_file": (original_filename, file.stream, file.mimetype)
-        }
+        # Stream the spooled file (requests' files= would read it into memory)
+        content_type, body = multipart_file_body(
+            "media_file", original_filename, file.stream, file.mimetype
+        )
         logger.info(f"Forwarding file to upload service at {UPLOAD_SERVICE_URL}/upload")
         upload_response = requests.post(
             f"{UPLOAD_SERVICE_URL}/upload",
-            files=files_to_forward,
+            data=body,
+            headers={"Content-Type": content_type},
             timeout=60,  # Add a timeout
         )
+        if upload_response.status_code == 503:
+            # All upload slots of the upload-service are busy; ask the client to come back
+            response = jsonify({"error": "Upload service is busy, retry shortly"})
+            response.status_code = 503
+            response.headers["Retry-After"] = upload_response.headers.get("Retry-After", "5")
+            return response
+        if upload_response.status_code in (400, 413, 415):
+            # Client-side problem with the file itself; pass the reason through
+            return jsonify(
+                {"error": upload_response.json().get("error", "Upload rejected")}
+            ), upload_response.status_code
         upload_response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
         upload_data = upload_response.json()
         input_s3_key = upload_data.get("s3_key")
+        input_container = upload_data.get("container")
 
         if not input_s3_key:
             logger.error("Upload service did not return an S3 key.")
@@ -280,75 +679,272 @@ def upload_file():
         logger.error(f"Unexpected error during upload forwarding: {e}")
         return jsonify({"error": f"Internal error during upload: {e}"}), 500
 
-    # 2. Generate Job ID and Queue Transcoding Task
-    job_id = str(uuid.uuid4())
-    task_payload = {
-        "job_id": job_id,
-        "input_s3_key": input_s3_key,
-        "output_format": output_format.lower(),
-        "user_email": user_email,  # User who initiated
-        "notification_email": notification_email,  # Email for notification
-        "original_filename": original_filename,
-    }
+    return queue_transcoding_job(
+        user_email,
+        notification_email,
+        input_s3_key,
+        input_container,
+        output_format,
+        original_filename,
+        priority,
+    )
+
 
+# --- Resumable Upload Sessions ---
+# The browser sends a file as fixed-size parts, in parallel, straight to the
+# gateway; each part goes into an S3 multipart upload. If the connection
+# drops, GET /uploads/<id> lists the stored parts and the browser sends only
+# the missing ones. No upload-service or client hop, and no request is ever
+# larger than one part, so request timeouts no longer cap the file size.
+def _get_upload_session(upload_id):
+    """Loads an upload session owned by the current user, or returns an error response."""
+    if not redis_client:
+        return None, (jsonify({"error": "Backend service unavailable (Redis)"}), 503)
     try:
-        # --- MODIFIED: Specify the queue ---
-        celery_app.send_task(
-            "transcoding.tasks.transcode_media",
-            args=[task_payload],
-            task_id=job_id,
-            queue="transcoding_queue",  # <--- ADD THIS
-        )
-        # --- END MODIFICATION ---
-        logger.info(
-            f"Transcoding task queued successfully to 'transcoding_queue'. Job ID: {job_id}"
+        session = upload_sessions.get_session(redis_client, upload_id)
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error reading upload {upload_id}: {e}")
+        return None, (jsonify({"error": "Backend service unavailable (Redis)"}), 503)
+    if not session:
+        return None, (jsonify({"error": "Upload session not found or expired"}), 404)
+    if session.get("user_email") != g.current_user["email"]:
+        logger.warning(
+            f"Access denied: User {g.current_user['email']} attempting to use upload {upload_id}"
         )
+        return None, (jsonify({"error": "Access denied to this upload"}), 403)
+    return session, None
 
-    except Exception as e:
-        logger.error(f"Failed to queue transcoding task for Job ID {job_id}: {e}")
-        return jsonify({"error": f"Failed to queue transcoding job: {e}"}), 500
 
-    # 3. Store Initial Job Metadata in Redis
-    if redis_client:
-        try:
-            job_metadata_key = f"job:{job_id}"
-            initial_metadata = {
-                "job_id": job_id,
-                "user_email": user_email,
-                "notification_email": notification_email,
-                "status": "PENDING",  # Initial status
-                "input_s3_key": input_s3_key,
-                "output_format": output_format.lower(),
-                "original_filename": original_filename,
-                "timestamp": int(time.time()),  # Unix timestamp
+def _abort_upload(upload_id, session):
+    try:
+        storage.abort_multipart_upload(session["s3_key"], session["s3_upload_id"])
+    except storage.S3Error as e:
+        logger.warning(f"Upload {upload_id}: could not abort multipart upload: {e}")
+    try:
+        upload_sessions.delete_session(redis_client, upload_id)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Upload {upload_id}: session left to expire: {e}")
+
+
+@app.route("/uploads", methods=["POST"])
+@token_required
+def create_upload_session():
+    """
+    Starts a resumable upload. Expects JSON: {"filename", "size", "output_format",
+    "email" (optional), "priority" (optional), "content_type" (optional)}.
+    Returns the upload ID and how to split the file (part_size, part_count).
+    """
+    user_email = g.current_user["email"]
+    data = request.get_json(silent=True) or {}
+    original_filename = secure_filename(data.get("filename") or "")
+    output_format = (data.get("output_format") or "").lower()
+    size = data.get("size")
+
+    if not original_filename:
+        return jsonify({"error": "Missing filename"}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({"error": "size must be a positive integer (bytes)"}), 400
+    if size > upload_sessions.UPLOAD_MAX_SIZE:
+        return jsonify(
+            {"error": f"File too large (max {upload_sessions.UPLOAD_MAX_SIZE} bytes)"}
+        ), 413
+    if output_format not in SUPPORTED_OUTPUT_FORMATS:
+        return jsonify(
+            {
+                "error": f"Invalid or missing output_format. Supported: {', '.join(SUPPORTED_OUTPUT_FORMATS)}"
             }
-            redis_client.hset(job_metadata_key, mapping=initial_metadata)
-            # Optional: Set an expiry for job metadata? Maybe not, keep for history.
+        ), 400
+    if not redis_client:
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
 
-            # Add job to user's history list (most recent first)
-            user_history_key = f"user:{user_email}:jobs"
-            # Push job ID to the left (front) of the list
-            redis_client.lpush(user_history_key, job_id)
-            # Trim the list to keep only the last N jobs
-            redis_client.ltrim(user_history_key, 0, MAX_JOB_HISTORY - 1)
+    # Keep within S3's part limit for very large files (whole MiB parts)
+    part_size = max(
+        upload_sessions.UPLOAD_PART_SIZE,
+        -(-size // storage.S3_MAX_PARTS // upload_sessions.MIB) * upload_sessions.MIB,
+    )
+    extension = original_filename.rsplit(".", 1)[1].lower() if "." in original_filename else ""
+    s3_key = f"{S3_RAW_PREFIX.strip('/')}/{uuid.uuid4()}" + (f".{extension}" if extension else "")
+    upload_id = str(uuid.uuid4())
 
-            logger.info(f"Initial metadata stored in Redis for Job ID: {job_id}")
+    try:
+        s3_upload_id = storage.create_multipart_upload(
+            s3_key, ContentType=data.get("content_type") or None
+        )
+        upload_sessions.create_session(
+            redis_client,
+            upload_id,
+            {
+                "user_email": user_email,
+                "notification_email": data.get("email") or user_email,
+                "priority": fair_queue.normalize_lane(data.get("priority")),
+                "output_format": output_format,
+                "original_filename": original_filename,
+                "s3_key": s3_key,
+                "s3_upload_id": s3_upload_id,
+                "size": size,
+                "part_size": part_size,
+                "part_count": upload_sessions.part_count(size, part_size),
+                "created": int(time.time()),
+            },
+        )
+    except storage.S3Error as e:
+        logger.error(f"Could not start multipart upload for {original_filename}: {e}")
+        return jsonify({"error": "Storage unavailable"}), 503
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error creating upload session: {e}")
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
 
-        except redis.exceptions.RedisError as e:
-            logger.error(
-                f"Redis error storing metadata/history for Job ID {job_id}: {e}"
-            )
-            # Continue, but log the error. The job is queued, but history/status might be incomplete initially.
-            # The worker *should* update the status later anyway.
-        except Exception as e:
-            logger.error(
-                f"Non-Redis error storing metadata/history for Job ID {job_id}: {e}"
-            )
+    logger.info(
+        f"Upload {upload_id} started by {user_email}: '{original_filename}', {size} bytes "
+        f"in {upload_sessions.part_count(size, part_size)} part(s)"
+    )
+    return jsonify(
+        {
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "part_count": upload_sessions.part_count(size, part_size),
+            "expires_in": upload_sessions.UPLOAD_SESSION_TTL_SECONDS,
+        }
+    ), 201
 
-    # 4. Return Job ID to Client
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+@token_required
+def get_upload_session(upload_id):
+    """Returns an upload's progress: which parts are already stored."""
+    session, error = _get_upload_session(upload_id)
+    if error:
+        return error
+    try:
+        parts = upload_sessions.get_parts(redis_client, upload_id)
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error reading upload {upload_id}: {e}")
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
     return jsonify(
-        {"job_id": job_id, "message": "File upload received, transcoding queued."}
-    ), 202  # Accepted
+        {
+            "upload_id": upload_id,
+            "original_filename": session.get("original_filename"),
+            "size": session["size"],
+            "part_size": session["part_size"],
+            "part_count": session["part_count"],
+            "uploaded_parts": sorted(parts),
+        }
+    ), 200
+
+
+@app.route("/uploads/<upload_id>/parts/<int:part_number>", methods=["PUT"])
+@token_required
+def put_upload_part(upload_id, part_number):
+    """
+    Stores one part (raw request body). Parts may arrive in any order and in
+    parallel; re-sending a part replaces it, so retries are safe.
+    """
+    session, error = _get_upload_session(upload_id)
+    if error:
+        return error
+    if not 1 <= part_number <= session["part_count"]:
+        return jsonify({"error": f"part_number must be 1..{session['part_count']}"}), 400
+    expected_length = upload_sessions.expected_part_length(session, part_number)
+    if request.content_length != expected_length:
+        return jsonify(
+            {"error": f"Part {part_number} must be exactly {expected_length} bytes"}
+        ), 400
+
+    # At most one part (UPLOAD_PART_SIZE) is held in memory per request
+    body = request.get_data(cache=False)
+    if len(body) != expected_length:
+        return jsonify({"error": f"Part {part_number} was truncated"}), 400
+
+    container = None
+    if part_number == 1:
+        # Same content check as /upload, on the first bytes of the file
+        container = media_sniff.detect_container(body[: media_sniff.SNIFF_BYTES])
+        if not container:
+            logger.warning(f"Rejected upload {upload_id}: not a media container")
+            _abort_upload(upload_id, session)
+            return jsonify(
+                {"error": "File does not look like a supported audio/video container."}
+            ), 415
+
+    try:
+        etag = storage.upload_part(
+            session["s3_key"], session["s3_upload_id"], part_number, body
+        )
+        upload_sessions.record_part(
+            redis_client, session, upload_id, part_number, etag, container
+        )
+    except storage.S3RequestError as e:
+        if e.code == "NoSuchUpload":
+            upload_sessions.delete_session(redis_client, upload_id)
+            return jsonify({"error": "Upload session not found or expired"}), 404
+        logger.error(f"Upload {upload_id}: storing part {part_number} failed: {e}")
+        return jsonify({"error": "Storage unavailable"}), 503
+    except storage.S3Error as e:
+        logger.error(f"Upload {upload_id}: storing part {part_number} failed: {e}")
+        return jsonify({"error": "Storage unavailable"}), 503
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error recording part {part_number} of upload {upload_id}: {e}")
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
+
+    return jsonify({"part_number": part_number, "etag": etag}), 200
+
+
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+@token_required
+@idempotent
+def complete_upload_session(upload_id):
+    """Assembles the stored parts into the input file and queues the transcoding job."""
+    session, error = _get_upload_session(upload_id)
+    if error:
+        return error
+    try:
+        parts = upload_sessions.get_parts(redis_client, upload_id)
+        missing = [n for n in range(1, session["part_count"] + 1) if n not in parts]
+        if missing:
+            return jsonify(
+                {"error": "Upload is incomplete", "missing_parts": missing[:100]}
+            ), 409
+        if not upload_sessions.claim_completion(redis_client, upload_id):
+            return jsonify({"error": "Upload is already being completed"}), 409
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error completing upload {upload_id}: {e}")
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
+
+    try:
+        storage.complete_multipart_upload(
+            session["s3_key"], session["s3_upload_id"], parts.items()
+        )
+    except storage.S3Error as e:
+        logger.error(f"Upload {upload_id}: completing multipart upload failed: {e}")
+        upload_sessions.release_completion(redis_client, upload_id)
+        return jsonify({"error": "Storage unavailable"}), 503
+    try:
+        upload_sessions.delete_session(redis_client, upload_id)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Upload {upload_id}: session left to expire: {e}")
+
+    logger.info(f"Upload {upload_id} complete: {session['s3_key']}")
+    return queue_transcoding_job(
+        session["user_email"],
+        session.get("notification_email") or session["user_email"],
+        session["s3_key"],
+        session.get("container"),
+        session["output_format"],
+        session.get("original_filename"),
+        session.get("priority") or fair_queue.DEFAULT_LANE,
+    )
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+@token_required
+def abort_upload_session(upload_id):
+    """Cancels an upload and discards the parts stored so far."""
+    session, error = _get_upload_session(upload_id)
+    if error:
+        return error
+    _abort_upload(upload_id, session)
+    logger.info(f"Upload {upload_id} cancelled by {g.current_user['email']}")
+    return "", 204
 
 
 @app.route("/status/<job_id>", methods=["GET"])
@@ -361,14 +957,12 @@ def get_job_status(job_id):
     if not redis_client:
         return jsonify({"error": "Backend service unavailable (Redis)"}), 503
 
-    # 1. Check our primary metadata store first
-    job_metadata_key = f"job:{job_id}"
+    # Job metadata is the single source of truth: one HGETALL, no Celery backend read.
+    # Drift against the Celery backend is repaired by the background reconciler.
     try:
-        metadata = redis_client.hgetall(job_metadata_key)
+        metadata = job_store.get_job(redis_client, job_id)
         if not metadata:
             logger.warning(f"Job metadata not found in Redis for Job ID: {job_id}")
-            # Optionally check Celery backend as fallback, but metadata should be source of truth
-            # For now, return 404 if not in our metadata store
             return jsonify({"error": "Job not found"}), 404
 
         # Security Check: Ensure the requesting user owns this job
@@ -378,33 +972,7 @@ def get_job_status(job_id):
             )
             return jsonify({"error": "Access denied to this job"}), 403
 
-        # 2. If status is PENDING or PROCESSING in metadata, double-check Celery backend
-        current_status = metadata.get("status", "UNKNOWN")
-        if current_status in ["PENDING", "PROCESSING", "UNKNOWN"]:
-            logger.info(
-                f"Checking Celery backend for potentially updated status for Job ID: {job_id}"
-            )
-            backend_result = get_task_result(job_id)  # Use the helper
-            backend_status = backend_result.get("status")
-
-            if (
-                backend_status
-                and backend_status != "UNKNOWN"
-                and backend_status != current_status
-            ):
-                logger.info(
-                    f"Celery backend status ({backend_status}) differs from metadata ({current_status}) for Job ID: {job_id}. Updating metadata."
-                )
-                metadata["status"] = backend_status  # Update local copy
-                # Persist the updated status back to Redis metadata
-                redis_client.hset(job_metadata_key, "status", backend_status)
-                if backend_status == "FAILED" and "error" in backend_result:
-                    metadata["error"] = backend_result["error"]
-                    redis_client.hset(
-                        job_metadata_key, "error", backend_result["error"]
-                    )
-
-        # 3. Prepare response based on metadata (possibly updated from backend check)
+        # Prepare response based on metadata
         response_payload = {
             "job_id": job_id,
             "status": metadata.get("status", "UNKNOWN"),
@@ -415,9 +983,10 @@ def get_job_status(job_id):
         if metadata.get("status") == "FAILED":
             response_payload["error"] = metadata.get("error", "Unknown error")
         if metadata.get("status") == "COMPLETED":
-            response_payload["download_url"] = metadata.get(
-                "download_url"
-            )  # Worker should add this
+            response_payload["download_url"] = download_link(job_id, metadata)
+            response_payload["preview_url"] = presign_preview(job_id, metadata)
+            if metadata.get("notification_status"):
+                response_payload["notification_status"] = metadata["notification_status"]
 
         return jsonify(response_payload), 200
 
@@ -440,17 +1009,23 @@ def get_job_history():
         return jsonify({"error": "Backend service unavailable (Redis)"}), 503
 
     try:
-        user_history_key = f"user:{user_email}:jobs"
+        # Unchanged since the caller's copy: one GET, no job reads, no JSON
+        etag = history_etag(user_email, job_store.get_history_version(redis_client, user_email))
+        if request.if_none_match.contains(etag):
+            logger.debug(f"Job history of {user_email} not modified")
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
         # Get all job IDs from the user's list (up to MAX_JOB_HISTORY)
-        job_ids = redis_client.lrange(user_history_key, 0, -1)
+        job_ids = job_store.get_user_job_ids(redis_client, user_email)
 
         jobs_details = []
         if job_ids:
-            # Use Redis pipeline for efficient fetching of multiple hashes
-            pipe = redis_client.pipeline()
-            for job_id in job_ids:
-                pipe.hgetall(f"job:{job_id}")
-            results = pipe.execute()
+            # Fetches all hashes in a single pipelined round-trip
+            results = job_store.get_jobs(redis_client, job_ids)
+            preview_urls = presign_previews(results)
 
             for job_id, metadata in zip(job_ids, results):
                 if metadata:  # Check if hash exists (it might have expired or failed to be created)
@@ -473,27 +1048,28 @@ def get_job_history():
                         "input_s3_key": metadata.get(
                             "input_s3_key"
                         ),  # May not want to expose this?
-                        "download_url": metadata.get(
-                            "download_url"
+                        "download_url": download_link(
+                            job_id, metadata
                         ),  # Only present if completed
+                        "preview_url": preview_urls.get(
+                            metadata.get("preview_s3_key")
+                        ),  # Only present once the preview worker has run
                         "error": metadata.get("error"),  # Only present if failed
+                        "notification_status": metadata.get("notification_status"),
                     }
                     jobs_details.append(job_detail)
                 else:
-                    logger.warning(
-                        f"Metadata for job ID {job_id} listed in user {user_email}'s history not found in Redis."
-                    )
-                    # Optionally include a placeholder or skip
-                    jobs_details.append(
-                        {
-                            "job_id": job_id,
-                            "status": "UNKNOWN",
-                            "error": "Metadata not found",
-                        }
+                    # Finished jobs expire after JOB_TTL_SECONDS; skip stale history entries
+                    logger.debug(
+                        f"Metadata for job ID {job_id} listed in user {user_email}'s history has expired."
                     )
 
         logger.info(f"Returning {len(jobs_details)} jobs for user {user_email}")
-        return jsonify(jobs_details), 200
+        response = jsonify(jobs_details)
+        # Browsers revalidate on every poll (If-None-Match) instead of refetching
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response, 200
 
     except redis.exceptions.RedisError as e:
         logger.error(f"Redis error fetching job history for user {user_email}: {e}")
@@ -503,6 +1079,156 @@ def get_job_history():
         return jsonify({"error": f"Internal server error fetching history: {e}"}), 500
 
 
+@app.route("/download/<job_id>", methods=["GET", "HEAD"])
+def download_output(job_id):
+    """
+    Streams a completed job's output from S3, with Range and ETag support.
+
+    Accepts either a signed link (?expires=&sig=, as returned in download_url)
+    or a JWT bearer token from the job's owner.
+    """
+    if "sig" not in request.args:
+        return token_required(_serve_download)(job_id)
+    if not DOWNLOAD_SIGNING_KEY:
+        return jsonify({"error": "Signed download links are not configured"}), 503
+
+    try:
+        expires = int(request.args.get("expires", ""))
+    except ValueError:
+        return jsonify({"error": "Invalid download link"}), 403
+    if not hmac.compare_digest(request.args["sig"], sign_download(job_id, expires)):
+        logger.warning(f"Rejected download of job {job_id}: bad link signature")
+        return jsonify({"error": "Invalid download link"}), 403
+    if expires < time.time():
+        return jsonify({"error": "Download link has expired"}), 410
+    return _serve_download(job_id, link_expires=expires)
+
+
+def _serve_download(job_id, link_expires=None):
+    if not redis_client:
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
+    try:
+        metadata = job_store.get_job(redis_client, job_id)
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error loading job {job_id} for download: {e}")
+        return jsonify({"error": "Backend service unavailable (Redis)"}), 503
+    if not metadata:
+        return jsonify({"error": "Job not found"}), 404
+    if link_expires is None and metadata.get("user_email") != g.current_user["email"]:
+        logger.warning(
+            f"Access denied: User {g.current_user['email']} attempting to download job {job_id}"
+        )
+        return jsonify({"error": "Access denied to this job"}), 403
+    output_key = metadata.get("output_s3_key")
+    if metadata.get("status") != job_store.STATUS_COMPLETED or not output_key:
+        return jsonify({"error": "Job output is not available"}), 409
+
+    # Outputs are immutable (keyed by job ID). Signed links may be cached by a
+    # shared proxy (the signature is part of the cache key) until they expire;
+    # bearer-token responses only by the browser.
+    if link_expires is not None:
+        max_age = max(0, min(DOWNLOAD_CACHE_MAX_AGE, int(link_expires - time.time())))
+        cache_control = f"public, max-age={max_age}, immutable"
+    else:
+        cache_control = f"private, max-age={DOWNLOAD_CACHE_MAX_AGE}, immutable"
+
+    stem = (metadata.get("original_filename") or job_id).rsplit(".", 1)[0]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "Content-Disposition": f'attachment; filename="{stem}.{metadata.get("output_format", "bin")}"',
+    }
+
+    try:
+        if request.method == "HEAD":
+            head = storage.head_object(output_key)
+            headers.update(_object_headers(head))
+            headers["Content-Length"] = str(head["ContentLength"])
+            return Response(status=200, headers=headers)
+
+        obj = _open_output(output_key)
+    except storage.S3RequestError as e:
+        if e.http_status == 304:
+            etag = _not_modified_etag(output_key, e)
+            if etag:
+                headers["ETag"] = etag
+            return Response(status=304, headers=headers)
+        if e.http_status == 416:
+            return Response(status=416, headers={"Accept-Ranges": "bytes"})
+        if e.http_status == 404:
+            logger.error(f"Job {job_id}: Output {output_key} is missing from S3")
+            return jsonify({"error": "Job output not found"}), 404
+        return jsonify({"error": "Storage error while fetching output"}), 502
+    except storage.S3Error as e:
+        logger.error(f"Job {job_id}: Could not open output {output_key}: {e}")
+        return jsonify({"error": "Storage service unavailable"}), 503
+
+    headers.update(_object_headers(obj))
+    headers["Content-Length"] = str(obj["ContentLength"])
+    status = 200
+    if obj.get("ContentRange"):
+        headers["Content-Range"] = obj["ContentRange"]
+        status = 206
+
+    body = obj["Body"]
+    response = Response(
+        stream_with_context(body.iter_chunks(DOWNLOAD_CHUNK_SIZE)),
+        status=status,
+        headers=headers,
+        direct_passthrough=True,
+    )
+    response.call_on_close(body.close)  # Return the S3 connection even if the client disconnects
+    return response
+
+
+def _open_output(output_key):
+    """GetObject honouring the request's Range / If-Range / If-None-Match headers."""
+    byte_range = request.headers.get("Range")
+    # S3 serves a single range only; anything else gets the whole object (RFC 9110 allows ignoring Range)
+    if byte_range and not re.fullmatch(r"bytes=(\d+-\d*|-\d+)", byte_range.strip()):
+        byte_range = None
+    if_range = request.headers.get("If-Range")
+    if byte_range and if_range and not if_range.startswith('"'):
+        byte_range = None  # Date-based If-Range: can't check cheaply, send everything
+
+    try:
+        return storage.get_object(
+            output_key,
+            Range=byte_range,
+            IfNoneMatch=request.headers.get("If-None-Match"),
+            IfMatch=if_range if byte_range else None,
+        )
+    except storage.S3RequestError as e:
+        if e.http_status == 412 and byte_range:
+            # If-Range no longer matches: the client's partial copy is stale, send it all
+            return storage.get_object(output_key)
+        raise
+
+
+def _not_modified_etag(output_key, error):
+    """
+    The object's own ETag for a 304. The request's If-None-Match may list
+    several tags, weak ones or `*`, so it can't be echoed back.
+    """
+    etag = error.headers.get("etag")
+    if etag:
+        return etag
+    try:
+        return storage.head_object(output_key).get("ETag")
+    except storage.S3Error as e:
+        logger.warning(f"Could not read the ETag of {output_key} for a 304: {e}")
+        return None
+
+
+def _object_headers(obj):
+    headers = {"Content-Type": obj.get("ContentType") or "application/octet-stream"}
+    if obj.get("ETag"):
+        headers["ETag"] = obj["ETag"]
+    if obj.get("LastModified"):
+        headers["Last-Modified"] = obj["LastModified"].strftime("%a, %d %b %Y %H:%M:%S GMT")
+    return headers
+
+
 if __name__ == "__main__":
     # Use 0.0.0.0 to be accessible within Docker network
     # Port 5001 as per docker-compose example
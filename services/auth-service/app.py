@@ -2,12 +2,18 @@
 import logging
 import os
 import time
+import uuid
 
 import jwt  # PyJWT
+import redis
 import requests
 # from dotenv import dotenv_values
 from flask import Flask, jsonify, request
 
+import http_client
+import keys
+import sessions
+
 # --- Configuration ---
 # Load .env file from project root
 config = {
@@ -30,29 +36,49 @@ GITHUB_CLIENT_ID = config.get("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = config.get("GITHUB_CLIENT_SECRET")
 
 # JWT Configuration
-JWT_SECRET_KEY = config.get("JWT_SECRET_KEY", "default-fallback-secret-key-change-me")
+DEFAULT_JWT_SECRET_KEY = "default-fallback-secret-key-change-me"
+JWT_SECRET_KEY = config.get("JWT_SECRET_KEY", DEFAULT_JWT_SECRET_KEY)
 JWT_ALGORITHM = config.get("JWT_ALGORITHM", "HS256")
+# Access tokens are short-lived; clients renew them with a refresh token
+# (POST /auth/refresh), and a revoked session stops working within this window
+# even on a gateway that cannot see the revocation
 try:
     JWT_EXPIRATION_SECONDS = int(
-        config.get("JWT_EXPIRATION_SECONDS", 86400)
-    )  # Default 24 hours
+        config.get("JWT_EXPIRATION_SECONDS", 900)
+    )  # Default 15 minutes
 except ValueError:
-    JWT_EXPIRATION_SECONDS = 86400
+    JWT_EXPIRATION_SECONDS = 900
     logger.warning(
         f"Invalid JWT_EXPIRATION_SECONDS, defaulting to {JWT_EXPIRATION_SECONDS}"
     )
 
+# Asymmetric signing keys (see keys.py); without them tokens fall back to
+# HS256 with JWT_SECRET_KEY, but never with its public default value
+key_ring = keys.KeyRing()
+JWKS_MAX_AGE_SECONDS = int(config.get("JWKS_MAX_AGE_SECONDS", 300))
 
-# OAuth Endpoint URLs
-GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_USERINFO_URL = (
-    "https://www.googleapis.com/oauth2/v3/userinfo"  # Or openid endpoint
-)
-GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
-GITHUB_USERAPI_URL = "https://api.github.com/user"
-GITHUB_USER_EMAILS_URL = (
-    "https://api.github.com/user/emails"  # Need separate call for primary email
+# Redis holds refresh tokens and the revoked-session set (see sessions.py);
+# redis-py connects lazily, so start-up never blocks on it
+try:
+    redis_client = redis.Redis.from_url(
+        config.get("REDIS_URL", "redis://redis:6379/0"), decode_responses=True
+    )
+except ValueError as e:  # Malformed REDIS_URL
+    logger.error(f"Invalid Redis configuration: {e}")
+    redis_client = None
+
+# OAuth Endpoint URLs (overridable to point at a local fake provider)
+GOOGLE_TOKEN_URL = config.get("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = config.get(
+    "GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v3/userinfo"
+)  # Or openid endpoint
+GITHUB_TOKEN_URL = config.get(
+    "GITHUB_TOKEN_URL", "https://github.com/login/oauth/access_token"
 )
+GITHUB_USERAPI_URL = config.get("GITHUB_USERAPI_URL", "https://api.github.com/user")
+GITHUB_USER_EMAILS_URL = config.get(
+    "GITHUB_USER_EMAILS_URL", "https://api.github.com/user/emails"
+)  # Need separate call for primary email
 
 # --- Helper Functions ---
 
@@ -68,9 +94,7 @@ def exchange_google_code_for_token(code, redirect_uri):
     }
     headers = {"Accept": "application/json"}
     try:
-        response = requests.post(
-            GOOGLE_TOKEN_URL, data=payload, headers=headers, timeout=10
-        )
+        response = http_client.post(GOOGLE_TOKEN_URL, data=payload, headers=headers)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -84,7 +108,7 @@ def get_google_user_info(access_token):
     """Fetches user info from Google using access token."""
     headers = {"Authorization": f"Bearer {access_token}"}
     try:
-        response = requests.get(GOOGLE_USERINFO_URL, headers=headers, timeout=10)
+        response = http_client.get(GOOGLE_USERINFO_URL, headers=headers)
         response.raise_for_status()
         user_info = response.json()
         # Ensure essential fields are present
@@ -116,9 +140,7 @@ def exchange_github_code_for_token(code):
         "Accept": "application/json"  # Request JSON response
     }
     try:
-        response = requests.post(
-            GITHUB_TOKEN_URL, data=payload, headers=headers, timeout=10
-        )
+        response = http_client.post(GITHUB_TOKEN_URL, data=payload, headers=headers)
         response.raise_for_status()
         data = response.json()
         if "error" in data:
@@ -142,15 +164,18 @@ def get_github_user_info(access_token):
         "Accept": "application/vnd.github.v3+json",
     }
     try:
-        # Get basic user profile
-        user_response = requests.get(GITHUB_USERAPI_URL, headers=headers, timeout=10)
+        # Basic user profile and emails (to find the primary one) are
+        # independent, so fetch them concurrently
+        executor = http_client.get_executor()
+        user_future = executor.submit(http_client.get, GITHUB_USERAPI_URL, headers=headers)
+        emails_future = executor.submit(
+            http_client.get, GITHUB_USER_EMAILS_URL, headers=headers
+        )
+        user_response = user_future.result()
+        emails_response = emails_future.result()
+
         user_response.raise_for_status()
         user_data = user_response.json()
-
-        # Get user emails to find the primary one
-        emails_response = requests.get(
-            GITHUB_USER_EMAILS_URL, headers=headers, timeout=10
-        )
         emails_response.raise_for_status()
         emails_data = emails_response.json()
 
@@ -188,8 +213,21 @@ def get_github_user_info(access_token):
         raise ValueError(f"Failed to fetch GitHub user info: {e}") from e
 
 
-def create_jwt(user_info):
-    """Creates a JWT for the given user info."""
+def signing_configured():
+    """True if tokens can be signed: a key in the key ring, or a non-default shared secret."""
+    return key_ring.signing_key() is not None or (
+        bool(JWT_SECRET_KEY) and JWT_SECRET_KEY != DEFAULT_JWT_SECRET_KEY
+    )
+
+
+def create_jwt(user_info, sid=None):
+    """
+    Creates a JWT for the given user info, tied to login session `sid`.
+
+    Raises:
+        RuntimeError: If there is no signing key and JWT_SECRET_KEY is unset
+            or its public default (anyone could forge such tokens).
+    """
     payload = {
         "email": user_info["email"],
         "name": user_info.get("name"),
@@ -197,27 +235,59 @@ def create_jwt(user_info):
         "provider": user_info.get("provider"),  # Add which provider was used
         "iat": int(time.time()),  # Issued at time
         "exp": int(time.time()) + JWT_EXPIRATION_SECONDS,  # Expiration time
+        "jti": uuid.uuid4().hex,
     }
+    if sid:
+        payload["sid"] = sid  # Lets the gateway reject tokens of a revoked session
+    signing_key = key_ring.signing_key()
+    if signing_key:
+        kid, private_key, algorithm = signing_key
+        return jwt.encode(payload, private_key, algorithm=algorithm, headers={"kid": kid})
+    # Legacy: shared-secret signing, every verifier needs JWT_SECRET_KEY
+    if not JWT_SECRET_KEY or JWT_SECRET_KEY == DEFAULT_JWT_SECRET_KEY:
+        raise RuntimeError("No JWT signing key and JWT_SECRET_KEY is not set or is using its default value")
     token = jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
     return token
 
 
+def token_response(user_info, sid, refresh_token):
+    """The JSON body returned by /auth/token and /auth/refresh."""
+    body = {
+        "access_token": create_jwt(user_info, sid),
+        "token_type": "bearer",
+        "expires_in": JWT_EXPIRATION_SECONDS,
+    }
+    if refresh_token:
+        body["refresh_token"] = refresh_token
+        body["refresh_expires_in"] = sessions.REFRESH_TOKEN_TTL_SECONDS
+    return jsonify(body)
+
+
 # --- Routes ---
 
 
 @app.route("/health", methods=["GET"])
 def health_check():
     """Basic health check endpoint."""
-    # Check if essential config is present
-    if not JWT_SECRET_KEY or JWT_SECRET_KEY == "default-fallback-secret-key-change-me":
-        logger.error("JWT_SECRET_KEY is not set or is using default value.")
+    # Check if essential config is present: signing keys, or at least a real shared secret
+    if not signing_configured():
+        logger.error("No JWT signing keys and JWT_SECRET_KEY is not set or is using default value.")
         return jsonify(
-            {"status": "unhealthy", "reason": "JWT_SECRET_KEY not configured"}
+            {"status": "unhealthy", "reason": "JWT signing not configured"}
         ), 500
     # Could add checks for provider configs if needed
     return jsonify({"status": "healthy"}), 200
 
 
+@app.route("/.well-known/jwks.json", methods=["GET"])
+def jwks():
+    """Public keys verifiers use to check our tokens (RFC 7517 JWK Set)."""
+    response = jsonify(key_ring.jwks())
+    # Verifiers refetch on an unknown kid anyway, so a short cache is safe
+    response.headers["Cache-Control"] = f"public, max-age={JWKS_MAX_AGE_SECONDS}"
+    return response
+
+
 @app.route("/auth/token", methods=["POST"])
 def get_token():
     """
@@ -236,6 +306,9 @@ def get_token():
         return jsonify({"error": "Missing or invalid provider specified"}), 400
     if not code:
         return jsonify({"error": "Missing authorization code"}), 400
+    if not signing_configured():
+        logger.error("Refusing to issue tokens: no JWT signing keys and JWT_SECRET_KEY is not set or is using default value.")
+        return jsonify({"error": "Token signing is not configured"}), 503
 
     logger.info(f"Received token exchange request for provider: {provider}")
 
@@ -272,12 +345,19 @@ def get_token():
             # For this project scope, we'll just use the info directly.
             # --- End Optional ---
 
-            # Create our application-specific JWT
-            app_jwt = create_jwt(user_info)
+            # Start a login session: short-lived JWT + rotating refresh token.
+            # Without Redis the login still works, just without refresh.
+            sid = sessions.new_session_id()
+            refresh_token = None
+            try:
+                if redis_client:
+                    refresh_token = sessions.issue_refresh_token(redis_client, sid, user_info)
+            except redis.exceptions.RedisError as e:
+                logger.error(f"Could not store refresh token for session {sid}: {e}")
             logger.info(
                 f"Successfully generated JWT for user: {user_info.get('email')} via {provider}"
             )
-            return jsonify({"access_token": app_jwt, "token_type": "bearer"})
+            return token_response(user_info, sid, refresh_token)
 
         else:
             # Should not happen if no exception was raised, but as a safeguard
@@ -300,6 +380,64 @@ def get_token():
         return jsonify({"error": f"An internal server error occurred: {e}"}), 500
 
 
+@app.route("/auth/refresh", methods=["POST"])
+def refresh_token():
+    """
+    Trades a refresh token for a new access token and a new refresh token.
+    Expects JSON payload: {"refresh_token": "..."}. The old refresh token
+    stops working; presenting it again revokes the whole session, unless it
+    is within a few seconds of the first use (concurrent refreshes), which
+    get the same new refresh token back.
+    """
+    data = request.get_json(silent=True) or {}
+    token = data.get("refresh_token")
+    if not token:
+        return jsonify({"error": "Missing refresh_token"}), 400
+    if not redis_client:
+        return jsonify({"error": "Session store unavailable"}), 503
+    # Checked before rotating, so the refresh token is not spent on a failed refresh
+    if not signing_configured():
+        logger.error("Refusing to issue tokens: no JWT signing keys and JWT_SECRET_KEY is not set or is using default value.")
+        return jsonify({"error": "Token signing is not configured"}), 503
+
+    try:
+        user_info, new_refresh_token = sessions.rotate_refresh_token(
+            redis_client, token, JWT_EXPIRATION_SECONDS
+        )
+    except sessions.RefreshError as e:
+        logger.warning(f"Refresh rejected: {e}")
+        return jsonify({"error": str(e)}), 401
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error during token refresh: {e}")
+        return jsonify({"error": "Session store unavailable"}), 503
+
+    sid = user_info.pop("sid")
+    logger.info(f"Refreshed session {sid} for user: {user_info.get('email')}")
+    return token_response(user_info, sid, new_refresh_token)
+
+
+@app.route("/auth/revoke", methods=["POST"])
+def revoke_token():
+    """
+    Ends the login session of a refresh token (logout). Its access tokens are
+    rejected by the API Gateway from now on. Expects JSON payload:
+    {"refresh_token": "..."}. Unknown tokens are not an error (RFC 7009).
+    """
+    data = request.get_json(silent=True) or {}
+    token = data.get("refresh_token")
+    if not token:
+        return jsonify({"error": "Missing refresh_token"}), 400
+    if not redis_client:
+        return jsonify({"error": "Session store unavailable"}), 503
+
+    try:
+        sessions.revoke_refresh_token(redis_client, token, JWT_EXPIRATION_SECONDS)
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Redis error during token revocation: {e}")
+        return jsonify({"error": "Session store unavailable"}), 503
+    return jsonify({"status": "revoked"}), 200
+
+
 if __name__ == "__main__":
     # Use 0.0.0.0 to be accessible within Docker network
     # Port 5002 as per docker-compose example
@@ -0,0 +1,81 @@
+# ./services/auth-service/http_client.py
+"""
+Shared outbound HTTP for OAuth provider calls.
+
+One `requests.Session` per process keeps TCP/TLS connections to the
+providers alive between logins, instead of a fresh handshake on every call.
+A small per-process thread pool lets a login issue independent provider calls
+(e.g. GitHub user + emails) at the same time. Both are created lazily and
+re-created after a fork, so gunicorn workers never share sockets.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+OAUTH_POOL_MAXSIZE = int(os.environ.get("OAUTH_POOL_MAXSIZE", 20))  # Kept-alive connections per host
+OAUTH_MAX_WORKERS = int(os.environ.get("OAUTH_MAX_WORKERS", 8))  # Concurrent provider calls per process
+OAUTH_TIMEOUT_SECONDS = float(os.environ.get("OAUTH_TIMEOUT_SECONDS", 10))
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+_owner_pid = None
+
+
+def _build_session():
+    # Only connection failures are retried: nothing reached the provider yet,
+    # so even the single-use code exchange POST is safe to resend
+    retry = Retry(total=None, connect=2, read=0, status=0, redirect=0, backoff_factor=0.1)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OAUTH_POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)  # Local fake providers in tests/benchmarks
+    return session
+
+
+def _ensure():
+    global _session, _executor, _owner_pid
+    pid = os.getpid()
+    if _owner_pid == pid:
+        return
+    with _lock:
+        if _owner_pid != pid:
+            _session = _build_session()
+            _executor = ThreadPoolExecutor(
+                max_workers=OAUTH_MAX_WORKERS, thread_name_prefix="oauth-http"
+            )
+            _owner_pid = pid
+            logger.info(f"OAuth HTTP session created for process {pid}.")
+
+
+def get_session():
+    """Returns this process's pooled keep-alive session."""
+    _ensure()
+    return _session
+
+
+def get_executor():
+    """Returns this process's thread pool for concurrent provider calls."""
+    _ensure()
+    return _executor
+
+
+def get(url, **kwargs):
+    """GET through the pooled session (default timeout OAUTH_TIMEOUT_SECONDS)."""
+    kwargs.setdefault("timeout", OAUTH_TIMEOUT_SECONDS)
+    return get_session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """POST through the pooled session (default timeout OAUTH_TIMEOUT_SECONDS)."""
+    kwargs.setdefault("timeout", OAUTH_TIMEOUT_SECONDS)
+    return get_session().post(url, **kwargs)
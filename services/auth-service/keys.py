@@ -0,0 +1,187 @@
+# ./services/auth-service/keys.py
+"""
+Asymmetric JWT signing keys for the auth-service.
+
+Private keys are PEM files in JWT_KEYS_DIR, one per key, named `<kid>.pem`
+(RSA -> RS256, Ed25519 -> EdDSA). Tokens are signed with the active key
+(JWT_ACTIVE_KID, or the newest file) and carry its `kid` header. The public
+halves of *all* keys in the directory are published as a JWKS, so verifiers
+(API Gateway, client) keep accepting tokens signed by a previous key until it
+is removed.
+
+Rotation without restarts:
+    1. python keys.py generate --dir $JWT_KEYS_DIR     # new key becomes the newest
+    2. verifiers pick it up the first time they see its kid (JWKS refetch)
+    3. delete the old .pem once tokens signed with it have expired
+
+The directory is re-read at most every JWT_KEYS_RELOAD_SECONDS, so steps 1
+and 3 take effect in every auth-service process without a restart.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import jwt  # PyJWT
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+JWT_KEYS_DIR = os.environ.get("JWT_KEYS_DIR")
+JWT_ACTIVE_KID = os.environ.get("JWT_ACTIVE_KID")  # Default: newest key file
+JWT_KEYS_RELOAD_SECONDS = int(os.environ.get("JWT_KEYS_RELOAD_SECONDS", 30))
+
+ALGORITHM_RSA = "RS256"
+ALGORITHM_EDDSA = "EdDSA"
+
+
+def _algorithm_for(private_key):
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return ALGORITHM_RSA
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return ALGORITHM_EDDSA
+    return None
+
+
+def _public_jwk(kid, private_key, algorithm):
+    public_key = private_key.public_key()
+    if algorithm == ALGORITHM_RSA:
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(public_key))
+    else:
+        jwk = json.loads(jwt.algorithms.OKPAlgorithm.to_jwk(public_key))
+    jwk.update({"kid": kid, "alg": algorithm, "use": "sig"})
+    return jwk
+
+
+class KeyRing:
+    """The signing keys in a directory, re-read when the directory changes."""
+
+    def __init__(self, keys_dir=JWT_KEYS_DIR, active_kid=JWT_ACTIVE_KID):
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self._lock = threading.Lock()
+        self._keys = {}  # kid -> (private_key, algorithm, mtime)
+        self._jwks = {"keys": []}
+        self._dir_mtime = None
+        self._checked_at = 0
+
+    def _refresh(self):
+        now = time.time()
+        if not self.keys_dir or now - self._checked_at < JWT_KEYS_RELOAD_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                dir_mtime = os.stat(self.keys_dir).st_mtime
+            except OSError as e:
+                logger.error(f"JWT keys directory {self.keys_dir} is not readable: {e}")
+                return
+            if dir_mtime == self._dir_mtime:
+                return
+            self._load()
+            self._dir_mtime = dir_mtime
+
+    def _load(self):
+        keys = {}
+        for path in glob.glob(os.path.join(self.keys_dir, "*.pem")):
+            kid = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, "rb") as f:
+                    private_key = serialization.load_pem_private_key(f.read(), password=None)
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Skipping unreadable JWT key {path}: {e}")
+                continue
+            algorithm = _algorithm_for(private_key)
+            if not algorithm:
+                logger.error(f"Skipping JWT key {path}: only RSA and Ed25519 keys are supported")
+                continue
+            keys[kid] = (private_key, algorithm, os.path.getmtime(path))
+
+        self._keys = keys
+        self._jwks = {
+            "keys": [_public_jwk(kid, key, algorithm) for kid, (key, algorithm, _) in sorted(keys.items())]
+        }
+        logger.info(f"Loaded {len(keys)} JWT signing key(s) from {self.keys_dir}: {sorted(keys)}")
+
+    def signing_key(self):
+        """
+        Returns the key new tokens are signed with.
+
+        Returns:
+            tuple: (kid, private_key, algorithm), or None if no keys are configured.
+        """
+        self._refresh()
+        keys = self._keys
+        if not keys:
+            return None
+        if self.active_kid in keys:
+            kid = self.active_kid
+        else:
+            if self.active_kid:
+                logger.warning(f"JWT_ACTIVE_KID {self.active_kid} not found; using the newest key.")
+            kid = max(keys, key=lambda k: keys[k][2])
+        private_key, algorithm, _ = keys[kid]
+        return kid, private_key, algorithm
+
+    def jwks(self):
+        """Returns the public JWK Set of every key in the directory."""
+        self._refresh()
+        return self._jwks
+
+
+def generate_key(keys_dir, key_type="rsa", kid=None):
+    """
+    Writes a new private key to `<keys_dir>/<kid>.pem` (mode 0600).
+
+    Returns:
+        str: The path of the new key file.
+    """
+    if key_type == "ed25519":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    kid = kid or f"{time.strftime('%Y%m%d')}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(keys_dir, exist_ok=True)
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    if os.path.exists(path):
+        raise FileExistsError(f"JWT key {path} already exists")
+    # Written under a name the *.pem glob skips, then renamed into place, so a
+    # reload never sees (and caches the directory mtime over) a half-written key
+    tmp_path = os.path.join(keys_dir, f".{kid}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage JWT signing keys.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    generate = subcommands.add_parser("generate", help="Create a new signing key")
+    generate.add_argument("--dir", default=JWT_KEYS_DIR, required=not JWT_KEYS_DIR)
+    generate.add_argument("--type", choices=["rsa", "ed25519"], default="rsa")
+    generate.add_argument("--kid", help="Key ID (default: date + random suffix)")
+    args = parser.parse_args()
+    print(generate_key(args.dir, args.type, args.kid))
@@ -0,0 +1,211 @@
+# ./services/auth-service/sessions.py
+"""
+Login sessions: rotating refresh tokens and session revocation, in Redis.
+
+A login creates a session id (`sid`, carried in every access token) and an
+opaque refresh token. Access tokens are short-lived; the client trades the
+refresh token for a new access token + refresh token pair at /auth/refresh.
+Each refresh token works once: presenting an already-rotated token again
+means it leaked, and the whole session is revoked. The exception is a short
+grace window for concurrent refreshes (a page load and a background token
+fetch with the same expired session): those get the same successor token as
+the first refresh, so whichever response the client keeps is valid.
+
+Key layout:
+    auth:refresh:<sha256(token)>   hash of the session's user claims (+ 'used'
+                                   once rotated), TTL REFRESH_TOKEN_TTL_SECONDS
+    auth:refresh:<sha256(token)>:next
+                                   the token's successor, encrypted with a key
+                                   derived from the token itself, TTL
+                                   REFRESH_REUSE_GRACE_SECONDS
+    auth:session:<sid>             hash of the session's live refresh token
+    auth:revoked                   zset sid -> time its last access token expires
+    auth:revoked:version           bumped on every revocation
+
+Only token hashes are stored, so a Redis dump does not hand out sessions. The
+API Gateway mirrors `auth:revoked` into an in-memory Bloom filter (see
+services/common/revocation.py, which must use the same key names).
+"""
+
+import hashlib
+import logging
+import os
+import secrets
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+REFRESH_TOKEN_TTL_SECONDS = int(os.environ.get("REFRESH_TOKEN_TTL_SECONDS", 30 * 86400))
+# A second refresh with the same token this soon after the first is a race
+# (two tabs, a retried request), not theft: it gets the first one's successor
+REFRESH_REUSE_GRACE_SECONDS = int(os.environ.get("REFRESH_REUSE_GRACE_SECONDS", 10))
+# How long a racing refresh waits for the first one to store its successor
+SUCCESSOR_WAIT_SECONDS = 1.0
+
+# --- Key layout (shared with services/common/revocation.py) ---
+REVOKED_KEY = "auth:revoked"
+REVOKED_VERSION_KEY = "auth:revoked:version"
+
+SESSION_FIELDS = ("sid", "email", "name", "provider_id", "provider")
+
+# KEYS: [1] refresh token key.  ARGV: [1] now
+# Marks the token used and returns its fields plus whether this call did it
+_CONSUME_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local fresh = redis.call('HSETNX', KEYS[1], 'used', ARGV[1])
+local fields = redis.call('HGETALL', KEYS[1])
+table.insert(fields, 'fresh')
+table.insert(fields, tostring(fresh))
+return fields
+"""
+
+
+class RefreshError(Exception):
+    """The refresh token is unknown, expired, already used or revoked."""
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def refresh_key(token_hash):
+    """Returns the Redis key of a refresh token (by hash)."""
+    return f"auth:refresh:{token_hash}"
+
+
+def successor_key(token_hash):
+    """Returns the Redis key holding a rotated token's (encrypted) successor."""
+    return f"{refresh_key(token_hash)}:next"
+
+
+def _seal(token, data):
+    """XORs data with a keystream only the holder of `token` can derive (its own inverse)."""
+    stream = hashlib.shake_256(f"refresh-successor:{token}".encode("utf-8")).digest(len(data))
+    return bytes(a ^ b for a, b in zip(data, stream))
+
+
+def _store_successor(r, token, successor):
+    sealed = _seal(token, successor.encode("utf-8")).hex()
+    r.set(successor_key(_token_hash(token)), sealed, ex=REFRESH_REUSE_GRACE_SECONDS)
+
+
+def _load_successor(r, token):
+    """Returns the successor of a token rotated within the grace window, waiting briefly for it."""
+    deadline = time.monotonic() + SUCCESSOR_WAIT_SECONDS
+    while True:
+        sealed = r.get(successor_key(_token_hash(token)))
+        if sealed:
+            return _seal(token, bytes.fromhex(sealed)).decode("utf-8")
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.05)  # The first refresh is between consuming and storing
+
+
+def session_key(sid):
+    """Returns the Redis key pointing at a session's live refresh token."""
+    return f"auth:session:{sid}"
+
+
+def new_session_id():
+    """Returns a new random session id."""
+    return uuid.uuid4().hex
+
+
+def issue_refresh_token(r, sid, user_info):
+    """
+    Creates a refresh token for a session and makes it the session's live one.
+
+    Args:
+        r (redis.Redis): Redis client.
+        sid (str): Session id (also in the access token's `sid` claim).
+        user_info (dict): email, name, provider_id and provider of the user.
+
+    Returns:
+        str: The opaque refresh token (only its hash is stored).
+    """
+    token = secrets.token_urlsafe(32)
+    token_hash = _token_hash(token)
+    fields = {name: str(user_info.get(name) or "") for name in SESSION_FIELDS if name != "sid"}
+    fields["sid"] = sid
+    pipe = r.pipeline()
+    pipe.hset(refresh_key(token_hash), mapping=fields)
+    pipe.expire(refresh_key(token_hash), REFRESH_TOKEN_TTL_SECONDS)
+    pipe.set(session_key(sid), token_hash, ex=REFRESH_TOKEN_TTL_SECONDS)
+    pipe.execute()
+    return token
+
+
+def rotate_refresh_token(r, token, access_ttl):
+    """
+    Consumes a refresh token and issues its successor for the same session.
+
+    Args:
+        r (redis.Redis): Redis client.
+        token (str): The refresh token presented by the client.
+        access_ttl (int): Access token lifetime, used if the session is revoked.
+
+    Returns:
+        tuple: (user_info dict including 'sid', new refresh token).
+
+    Raises:
+        RefreshError: If the token cannot be used (the session is revoked on reuse).
+    """
+    now = int(time.time())
+    raw = r.eval(_CONSUME_SCRIPT, 1, refresh_key(_token_hash(token)), now)
+    if not raw:
+        raise RefreshError("Refresh token is invalid or expired")
+    data = dict(zip(raw[::2], raw[1::2]))
+    sid = data["sid"]
+
+    user_info = {name: data.get(name) or None for name in SESSION_FIELDS}
+    if data.pop("fresh") != "1":
+        used_at = int(data.get("used") or 0)
+        if now - used_at > REFRESH_REUSE_GRACE_SECONDS:
+            logger.warning(f"Refresh token reuse detected for session {sid}; revoking it.")
+            revoke_session(r, sid, access_ttl)
+            raise RefreshError("Refresh token has already been used")
+        successor = _load_successor(r, token)
+        if not successor:
+            raise RefreshError("Refresh token has already been used")
+        logger.info(f"Concurrent refresh for session {sid}; returning the same successor.")
+        return user_info, successor
+
+    successor = issue_refresh_token(r, sid, user_info)
+    _store_successor(r, token, successor)
+    return user_info, successor
+
+
+def revoke_session(r, sid, access_ttl):
+    """
+    Ends a session: its refresh token stops working at once, and its access
+    tokens are rejected by the gateway until they would have expired anyway.
+    """
+    now = time.time()
+    live_hash = r.get(session_key(sid))
+    pipe = r.pipeline()
+    if live_hash:
+        pipe.delete(refresh_key(live_hash))
+    pipe.delete(session_key(sid))
+    pipe.zadd(REVOKED_KEY, {sid: now + access_ttl})
+    pipe.zremrangebyscore(REVOKED_KEY, "-inf", now)  # Entries whose tokens are all expired
+    pipe.incr(REVOKED_VERSION_KEY)
+    pipe.execute()
+    logger.info(f"Session {sid} revoked.")
+
+
+def revoke_refresh_token(r, token, access_ttl):
+    """
+    Revokes the session a refresh token belongs to (logout).
+
+    Returns:
+        bool: False if the token was unknown or already expired.
+    """
+    sid = r.hget(refresh_key(_token_hash(token)), "sid")
+    if not sid:
+        return False
+    revoke_session(r, sid, access_ttl)
+    return True
@@ -0,0 +1,198 @@
+# ./services/common/fair_queue.py
+"""
+Per-user fair queuing with priority lanes, backed by Redis.
+
+The gateway enqueues job payloads here instead of putting them straight on the
+Celery queue, and sends a payload-less "ticket" task to Celery for each job.
+Whichever worker runs a ticket pulls the next job from this module, so Celery
+still handles delivery, acks and worker fan-out, while this module decides
+*which* job runs next:
+
+  - Lanes ('interactive', 'normal', 'bulk') are served by weighted round-robin,
+    so higher lanes get most of the capacity but lower lanes never starve.
+  - Within a lane, users are served round-robin: a user with 500 queued files
+    gets one slot per rotation, the same as a user with one file.
+
+Key layout for a pool (e.g. 'transcoding'):
+    fq:<pool>:<lane>:users      ring (list) of users with queued jobs in the lane
+    fq:<pool>:<lane>:u:<user>   FIFO (list) of that user's job payloads (JSON)
+    fq:<pool>:tick              lane-selection counter
+    fq:<pool>:inflight          hash ticket_id -> payload, until the ticket is acked
+
+A ticket that is redelivered (worker died, acks_late) gets its original job
+back from the in-flight hash instead of a new one.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# --- Lanes ---
+LANE_INTERACTIVE = "interactive"
+LANE_NORMAL = "normal"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_NORMAL, LANE_BULK)  # Highest priority first
+DEFAULT_LANE = LANE_NORMAL
+
+# Share of dequeues each lane gets while all lanes have work
+LANE_WEIGHTS = {
+    LANE_INTERACTIVE: int(os.environ.get("FAIR_QUEUE_WEIGHT_INTERACTIVE", 8)),
+    LANE_NORMAL: int(os.environ.get("FAIR_QUEUE_WEIGHT_NORMAL", 3)),
+    LANE_BULK: int(os.environ.get("FAIR_QUEUE_WEIGHT_BULK", 1)),
+}
+
+# KEYS: [1] user queue, [2] lane ring.  ARGV: [1] user, [2] payload
+_ENQUEUE_SCRIPT = """
+local length = redis.call('RPUSH', KEYS[1], ARGV[2])
+if length == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+end
+return length
+"""
+
+# KEYS: [1] tick, [2] inflight hash.  ARGV: [1] key prefix, [2] ticket id,
+# [3] lane count n, then n lane names, then n weights.
+_DEQUEUE_SCRIPT = """
+local existing = redis.call('HGET', KEYS[2], ARGV[2])
+if existing then
+    return existing
+end
+
+local prefix = ARGV[1]
+local n = tonumber(ARGV[3])
+local total = 0
+for i = 1, n do total = total + tonumber(ARGV[3 + n + i]) end
+
+local pick = redis.call('INCR', KEYS[1]) % math.max(total, 1)
+local preferred, acc = 1, 0
+for i = 1, n do
+    acc = acc + tonumber(ARGV[3 + n + i])
+    if pick < acc then preferred = i break end
+end
+local order = {preferred}
+for i = 1, n do
+    if i ~= preferred then table.insert(order, i) end
+end
+
+for _, i in ipairs(order) do
+    local lane_prefix = prefix .. ARGV[3 + i]
+    local ring = lane_prefix .. ':users'
+    local tries = redis.call('LLEN', ring)
+    while tries > 0 do
+        tries = tries - 1
+        -- Rotate: take the user at the tail and move them to the head
+        local user = redis.call('RPOPLPUSH', ring, ring)
+        local user_queue = lane_prefix .. ':u:' .. user
+        local payload = redis.call('LPOP', user_queue)
+        if redis.call('LLEN', user_queue) == 0 then
+            redis.call('LREM', ring, 1, user)
+        end
+        if payload then
+            redis.call('HSET', KEYS[2], ARGV[2], payload)
+            return payload
+        end
+    end
+end
+return false
+"""
+
+
+# --- Key Helpers ---
+def _prefix(pool):
+    return f"fq:{pool}:"
+
+
+def ring_key(pool, lane):
+    return f"{_prefix(pool)}{lane}:users"
+
+
+def user_queue_key(pool, lane, user):
+    return f"{_prefix(pool)}{lane}:u:{user}"
+
+
+def inflight_key(pool):
+    return f"{_prefix(pool)}inflight"
+
+
+def normalize_lane(lane):
+    """Returns a valid lane name, falling back to DEFAULT_LANE."""
+    lane = (lane or "").lower()
+    return lane if lane in LANES else DEFAULT_LANE
+
+
+# --- Operations ---
+def enqueue(r, pool, user, payload, lane=DEFAULT_LANE):
+    """
+    Appends a job payload to a user's queue in the given lane.
+
+    Returns:
+        int: The number of jobs this user now has queued in the lane.
+    """
+    lane = normalize_lane(lane)
+    return r.eval(
+        _ENQUEUE_SCRIPT,
+        2,
+        user_queue_key(pool, lane, user),
+        ring_key(pool, lane),
+        user,
+        json.dumps(payload),
+    )
+
+
+def dequeue(r, pool, ticket_id):
+    """
+    Pops the next job fairly, recording it as in flight under `ticket_id`.
+
+    Returns:
+        dict: The job payload, or None if every lane is empty.
+    """
+    args = [_prefix(pool), ticket_id, len(LANES), *LANES, *[LANE_WEIGHTS[lane] for lane in LANES]]
+    raw = r.eval(_DEQUEUE_SCRIPT, 2, f"{_prefix(pool)}tick", inflight_key(pool), *args)
+    return json.loads(raw) if raw else None
+
+
+def ack(r, pool, ticket_id):
+    """Forgets the in-flight job of a ticket once it has been fully handled."""
+    r.hdel(inflight_key(pool), ticket_id)
+
+
+def depth(r, pool):
+    """
+    Returns the number of queued (not in-flight) jobs per lane.
+
+    Cost is one LRANGE per lane plus one LLEN per user with queued jobs.
+    """
+    depths = {}
+    for lane in LANES:
+        users = r.lrange(ring_key(pool, lane), 0, -1)
+        pipe = r.pipeline(transaction=False)
+        for user in users:
+            pipe.llen(user_queue_key(pool, lane, user))
+        depths[lane] = sum(pipe.execute()) if users else 0
+    return depths
+
+
+def queued_payloads(r, pool):
+    """
+    Returns (lane, payload) for every queued (not in-flight) job, oldest first per user.
+
+    Meant for monitoring (e.g. the backlog exporter); it reads every queue in full.
+    """
+    queued = []
+    for lane in LANES:
+        users = r.lrange(ring_key(pool, lane), 0, -1)
+        if not users:
+            continue
+        pipe = r.pipeline(transaction=False)
+        for user in users:
+            pipe.lrange(user_queue_key(pool, lane, user), 0, -1)
+        for raw_payloads in pipe.execute():
+            queued.extend((lane, json.loads(raw)) for raw in raw_payloads)
+    return queued
+
+
+def inflight_payloads(r, pool):
+    """Returns the payloads of the jobs workers are running now."""
+    return [json.loads(raw) for raw in r.hvals(inflight_key(pool))]
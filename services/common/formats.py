@@ -0,0 +1,18 @@
+# ./services/common/formats.py
+"""
+Media format sets shared by the API Gateway and the transcoding workers.
+
+The gateway routes jobs by output format (audio-only outputs go to the audio
+worker pool), and the workers pick encoders, CPU budgets and preview kinds
+by the same sets, so they are defined once here.
+"""
+
+# Outputs without a video stream. The gateway sends these to the audio pool,
+# whose workers must be able to encode every one of them (see
+# transcoding-service/audio.py, which checks this on import).
+AUDIO_ONLY = frozenset({"mp3", "aac", "m4a", "wav", "flac"})
+
+
+def is_audio_only(output_format):
+    """True if the output format has no video stream."""
+    return (output_format or "").lower() in AUDIO_ONLY
@@ -0,0 +1,156 @@
+# ./services/common/idempotency.py
+"""
+Idempotency keys backed by Redis.
+
+A client that retries a request (timeout, dropped connection) sends the same
+`Idempotency-Key` header again. The first request claims the key with SET NX;
+while it runs, retries are told to wait, and once it succeeded they get its
+response replayed instead of doing the work a second time.
+
+Key layout:
+    idem:<sha256(scope, key)>   "pending:<token>" while the first request runs,
+                                then its stored JSON response
+                                (IDEMPOTENCY_TTL_SECONDS)
+
+The claim expires after IDEMPOTENCY_LOCK_SECONDS, so a crashed request frees
+the key. A request that runs longer (a multi-GB upload) keeps it with
+`hold()`, which renews the claim in the background. The token identifies the
+claim: complete(), release() and renewals only act on a key that still holds
+the caller's own claim, never on another request's claim or stored result.
+
+The scope (e.g. user + path) keeps one user's keys from ever matching another's.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 86400))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", 300))
+MAX_KEY_LENGTH = 255
+
+# --- States returned by begin() ---
+NEW = "new"  # Caller owns the key and must complete() or release() it
+IN_PROGRESS = "in_progress"  # The first request is still running
+DONE = "done"  # The first request finished; replay its response
+
+_PENDING = "pending"
+
+# --- Lua Scripts (act only while the key holds the caller's claim) ---
+# KEYS: [1] idem key.  ARGV: [1] claim, [2] new value, [3] TTL seconds
+_SET_IF_CLAIMED_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# KEYS: [1] idem key.  ARGV: [1] claim
+_DELETE_IF_CLAIMED_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _redis_key(scope, key):
+    digest = hashlib.sha256(f"{scope}\n{key}".encode("utf-8")).hexdigest()
+    return f"idem:{digest}"
+
+
+def _claim(token):
+    return f"{_PENDING}:{token}"
+
+
+def begin(r, scope, key):
+    """
+    Claims an idempotency key, or reports what happened to the request that did.
+
+    Returns:
+        tuple: (state, value) - value is the claim token to pass to
+               complete()/release()/hold() when state is NEW, the dict given
+               to complete() when state is DONE, else None.
+    """
+    redis_key = _redis_key(scope, key)
+    token = uuid.uuid4().hex
+    for _ in range(2):  # Second pass only if the key expired between SET and GET
+        if r.set(redis_key, _claim(token), nx=True, ex=IDEMPOTENCY_LOCK_SECONDS):
+            return NEW, token
+        value = r.get(redis_key)
+        if value is not None and value.startswith(_PENDING):
+            return IN_PROGRESS, None
+        if value is not None:
+            return DONE, json.loads(value)
+    return IN_PROGRESS, None
+
+
+def complete(r, scope, key, token, response):
+    """
+    Stores the response (JSON-serialisable dict) to replay for this key.
+
+    Returns:
+        bool: False if the claim was lost (expired and taken by another request).
+    """
+    return bool(
+        r.eval(
+            _SET_IF_CLAIMED_SCRIPT,
+            1,
+            _redis_key(scope, key),
+            _claim(token),
+            json.dumps(response),
+            IDEMPOTENCY_TTL_SECONDS,
+        )
+    )
+
+
+def release(r, scope, key, token):
+    """Frees a claimed key without a stored response, so the client may retry."""
+    return bool(r.eval(_DELETE_IF_CLAIMED_SCRIPT, 1, _redis_key(scope, key), _claim(token)))
+
+
+def renew(r, scope, key, token):
+    """Restarts the claim's IDEMPOTENCY_LOCK_SECONDS. Returns False if the claim was lost."""
+    claim = _claim(token)
+    return bool(
+        r.eval(
+            _SET_IF_CLAIMED_SCRIPT, 1, _redis_key(scope, key), claim, claim, IDEMPOTENCY_LOCK_SECONDS
+        )
+    )
+
+
+@contextmanager
+def hold(r, scope, key, token):
+    """
+    Keeps a claim alive while the wrapped work runs, however long it takes.
+
+    Usage:
+        with idempotency.hold(redis_client, scope, key, token):
+            response = view()
+    """
+    stop = threading.Event()
+
+    def keep_alive():
+        while not stop.wait(IDEMPOTENCY_LOCK_SECONDS / 3):
+            try:
+                if not renew(r, scope, key, token):
+                    logger.warning("Idempotency claim lost while its request was running.")
+                    return
+            except Exception as e:  # Redis hiccup; the next round tries again
+                logger.warning(f"Could not renew idempotency claim: {e}")
+
+    thread = threading.Thread(target=keep_alive, name="idempotency-hold", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
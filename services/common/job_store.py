@@ -0,0 +1,628 @@
+# ./services/common/job_store.py
+"""
+Authoritative job state store backed by Redis.
+
+Every read and write of the `job:<id>` hashes and the per-user history lists
+goes through this module, so the API Gateway and the Celery workers agree on
+a single layout. Status reads are a single HGETALL; reconciliation against the
+Celery result backend is only done by the background repair pass
+(`reconcile_active_jobs`), never on the request path.
+
+When the workers run with Celery results disabled (CELERY_IGNORE_RESULTS),
+these hashes are the only record of a job: the transcoder writes every status
+transition and the notification worker writes the e-mail outcome
+(`set_notification_status`), and there is no backend for the repair pass to
+read.
+
+Job hashes use a compact encoding (see `encode_fields`/`decode_job`): one- or
+two-letter field names, one-letter status codes, integer timestamps, and no
+values that can be derived (job ID, default output key, notification email
+when it equals the owner's, presigned download URLs). Redis keeps a hash as
+a listpack only while every value fits `hash-max-listpack-value` (64 bytes
+by default), so filenames are cut to 64 bytes. Error messages are kept
+longer to stay useful: a FAILED job with a long error, or an unusually long
+e-mail address, falls back to a hash table. Callers only ever see the decoded,
+long-name dicts. Hashes written in the old long-name layout still decode;
+where a worker has since written compact fields into one, those win, and
+`update_job` deletes the long names it supersedes.
+
+Every write that changes what a user's history shows also bumps that user's
+history version (`get_history_version`), so the gateway can answer a repeated
+/jobs poll with 304 Not Modified after a single GET.
+
+All functions take a redis-py client created with `decode_responses=True`.
+"""
+
+import json
+import logging
+import os
+import time
+
+import redis
+
+# --- Logging ---
+logger = logging.getLogger(__name__)
+
+# --- Job Statuses ---
+STATUS_PENDING = "PENDING"
+STATUS_PROCESSING = "PROCESSING"
+STATUS_COMPLETED = "COMPLETED"
+STATUS_FAILED = "FAILED"
+STATUS_UNKNOWN = "UNKNOWN"
+
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_PROCESSING)
+TERMINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+# --- Key Layout ---
+JOB_KEY_PREFIX = "job:"
+ACTIVE_JOBS_KEY = "jobs:active"  # Set of job IDs not yet COMPLETED/FAILED
+CELERY_META_PREFIX = "celery-task-meta-"  # Written by the Celery result backend
+
+# --- Compact Encoding ---
+ERROR_MAX_LENGTH = 256  # Limit error message length stored in Redis
+FILENAME_MAX_BYTES = 64  # UTF-8 bytes; display name only, shortened with the extension kept
+S3_PROCESSED_PREFIX = os.environ.get("S3_PROCESSED_PREFIX", "processed/")
+
+# Long (API) field name -> short field name stored in Redis
+FIELD_CODES = {
+    "user_email": "u",
+    "notification_email": "n",
+    "status": "s",
+    "input_s3_key": "i",
+    "input_container": "c",
+    "output_format": "o",
+    "original_filename": "f",
+    "priority": "p",
+    "timestamp": "t",
+    "last_updated": "l",
+    "error": "e",
+    "output_s3_key": "k",
+    "input_deleted": "x",
+    "notification_status": "m",
+    "preview_s3_key": "v",
+    "heartbeat": "h",
+}
+FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+INTEGER_FIELDS = {"timestamp", "last_updated", "heartbeat"}
+
+# Long names the old layout wrote on status updates; superseded by update_job
+LEGACY_UPDATE_FIELDS = ("status", "last_updated", "error", "output_s3_key", "download_url")
+
+STATUS_CODES = {
+    STATUS_PENDING: "P",
+    STATUS_PROCESSING: "R",
+    STATUS_COMPLETED: "C",
+    STATUS_FAILED: "F",
+}
+STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+DEFAULT_PRIORITY = "normal"
+
+# --- Notification Outcomes ---
+NOTIFICATION_SENT = "sent"
+NOTIFICATION_SKIPPED = "skipped"
+NOTIFICATION_FAILED = "failed"
+
+# --- Retention ---
+# Finished jobs (and history lists of idle users) expire after this long
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 7 * 86400))  # Default 7 days
+
+# Map Celery states to our application states
+CELERY_STATUS_MAP = {
+    "PENDING": STATUS_PENDING,
+    "RECEIVED": STATUS_PENDING,
+    "STARTED": STATUS_PROCESSING,  # Celery's STARTED maps to our PROCESSING
+    "RETRY": STATUS_PROCESSING,  # Treat retry as still processing
+    "SUCCESS": STATUS_COMPLETED,  # Celery's SUCCESS maps to our COMPLETED
+    "FAILURE": STATUS_FAILED,  # Celery's FAILURE maps to our FAILED
+    "REVOKED": STATUS_FAILED,  # Treat revoked as failed
+}
+
+
+# --- Key Helpers ---
+def job_key(job_id):
+    """Returns the Redis key of the metadata hash for a job."""
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+
+def user_history_key(user_email):
+    """Returns the Redis key of the recent-jobs list for a user."""
+    return f"user:{user_email}:jobs"
+
+
+def history_version_key(user_email):
+    """Returns the Redis key of the counter bumped whenever a user's history changes."""
+    return f"user:{user_email}:jobs:version"
+
+
+def default_output_key(job_id, output_format):
+    """The S3 key the transcoder writes a job's output to unless told otherwise."""
+    return f"{S3_PROCESSED_PREFIX.strip('/')}/{job_id}.{output_format}"
+
+
+# --- Encoding ---
+def _truncate_bytes(text, max_bytes):
+    return text.encode("utf-8")[:max_bytes].decode("utf-8", "ignore")
+
+
+def _shorten_filename(filename):
+    if len(filename.encode("utf-8")) <= FILENAME_MAX_BYTES:
+        return filename
+    stem, dot, extension = filename.rpartition(".")
+    if not dot or len(extension) > 8:
+        return _truncate_bytes(filename, FILENAME_MAX_BYTES)
+    suffix = f"~.{extension}"
+    return _truncate_bytes(stem, FILENAME_MAX_BYTES - len(suffix.encode("utf-8"))) + suffix
+
+
+def encode_fields(job_id, fields, user_email=None):
+    """
+    Converts long-name job fields to the compact stored form.
+
+    Args:
+        job_id (str): The job the fields belong to.
+        fields (dict): Long-name fields; None/empty values are dropped.
+        user_email (str, optional): Owner, used to elide an identical notification email.
+
+    Returns:
+        dict: Mapping suitable for HSET.
+    """
+    encoded = {}
+    for name, value in fields.items():
+        if value is None or value == "" or name == "job_id":
+            continue
+        if name == "status":
+            value = STATUS_CODES.get(value, value)
+        elif name == "error":
+            value = str(value)[:ERROR_MAX_LENGTH]
+        elif name == "original_filename":
+            value = _shorten_filename(value)
+        elif name == "notification_email" and value == user_email:
+            continue
+        elif name == "priority" and value == DEFAULT_PRIORITY:
+            continue
+        elif name == "output_s3_key" and value == default_output_key(
+            job_id, fields.get("output_format", "")
+        ):
+            continue
+        encoded[FIELD_CODES.get(name, name)] = value
+    return encoded
+
+
+def decode_job(job_id, raw):
+    """
+    Expands a stored job hash into the long-name dict used by callers.
+
+    Returns:
+        dict: Decoded fields including 'job_id', or {} if the hash is empty.
+    """
+    if not raw:
+        return {}
+    # A job queued before the compact layout can hold both forms of a field
+    # once a newer worker has updated it; the compact (newer) value wins
+    legacy, compact = {}, {}
+    for field, value in raw.items():
+        if field in FIELD_NAMES:
+            compact[FIELD_NAMES[field]] = value
+        else:
+            legacy[field] = value
+    job = {**legacy, **compact, "job_id": job_id}
+    job.pop("download_url", None)  # Old layouts stored it; links are now signed on read
+    for name in INTEGER_FIELDS & set(job):
+        try:
+            job[name] = int(job[name])
+        except (TypeError, ValueError):
+            job[name] = 0
+    job["status"] = STATUS_NAMES.get(job.get("status"), job.get("status", STATUS_UNKNOWN))
+    job.setdefault("notification_email", job.get("user_email"))
+    job.setdefault("priority", DEFAULT_PRIORITY)
+    if job["status"] == STATUS_COMPLETED and job.get("output_format"):
+        job.setdefault("output_s3_key", default_output_key(job_id, job["output_format"]))
+    return job
+
+
+def _decode_status(values):
+    """Status from an HMGET of ('s', 'status') — compact or legacy layout."""
+    code, legacy = values
+    if code is not None:
+        return STATUS_NAMES.get(code, code)
+    return legacy
+
+
+# --- Writes ---
+# KEYS: [1] job hash.  ARGV: [1] field, [2] value
+_HSET_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+# KEYS: [1] job hash.  ARGV: [1] status field, [2] legacy status field,
+# [3] number N of finished statuses, [4..3+N] finished statuses (codes and
+# legacy names), [4+N] number M of fields to delete, the M fields, then the
+# field/value pairs to set. Nothing is written once the job has finished.
+_UPDATE_UNLESS_FINISHED_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], ARGV[1]) or redis.call('HGET', KEYS[1], ARGV[2])
+local finished = tonumber(ARGV[3])
+for i = 4, 3 + finished do
+    if status == ARGV[i] then
+        return 0
+    end
+end
+local deleted = tonumber(ARGV[4 + finished])
+local first = 5 + finished
+if deleted > 0 then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, first, first + deleted - 1))
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, first + deleted))
+return 1
+"""
+
+
+# KEYS: [1] job hash.  ARGV: [1] status field, [2] legacy status field,
+# [3] PROCESSING code, [4] legacy PROCESSING name, [5] heartbeat field, [6] now
+_HEARTBEAT_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], ARGV[1]) or redis.call('HGET', KEYS[1], ARGV[2])
+if status == ARGV[3] or status == ARGV[4] then
+    redis.call('HSET', KEYS[1], ARGV[5], ARGV[6])
+    return 1
+end
+return 0
+"""
+
+# Stored status values (compact codes and legacy names) update_job never overwrites
+_FINISHED_STATUS_VALUES = [STATUS_CODES[status] for status in TERMINAL_STATUSES] + list(
+    TERMINAL_STATUSES
+)
+
+
+# KEYS: [1] job hash.  ARGV: [1] owner field, [2] legacy owner field, [3] now (ms), [4] TTL
+# Bumps the history version of the job's owner. A missing counter restarts
+# from the current time, so a version is never reused after the key expired.
+_BUMP_HISTORY_VERSION_SCRIPT = """
+local owner = redis.call('HGET', KEYS[1], ARGV[1]) or redis.call('HGET', KEYS[1], ARGV[2])
+if not owner then
+    return false
+end
+local key = 'user:' .. owner .. ':jobs:version'
+redis.call('SET', key, ARGV[3], 'NX')
+local version = redis.call('INCR', key)
+redis.call('EXPIRE', key, ARGV[4])
+return version
+"""
+
+
+def _bump_history_version(pipe, job_id):
+    """Queues a history-version bump for the owner of `job_id` on a pipeline."""
+    pipe.eval(
+        _BUMP_HISTORY_VERSION_SCRIPT,
+        1,
+        job_key(job_id),
+        FIELD_CODES["user_email"],
+        "user_email",
+        int(time.time() * 1000),
+        JOB_TTL_SECONDS,
+    )
+
+
+def create_job(r, job_id, metadata, max_history):
+    """
+    Stores the initial metadata for a new job and adds it to its owner's history.
+
+    Args:
+        r: Redis client.
+        job_id (str): The unique ID of the job.
+        metadata (dict): Initial job fields. Must contain 'user_email'.
+        max_history (int): Number of recent job IDs to keep per user.
+    """
+    user_email = metadata["user_email"]
+    record = {"status": STATUS_PENDING, **metadata}
+    record.setdefault("timestamp", int(time.time()))
+
+    history_key = user_history_key(user_email)
+    pipe = r.pipeline()
+    pipe.hset(job_key(job_id), mapping=encode_fields(job_id, record, user_email))
+    pipe.sadd(ACTIVE_JOBS_KEY, job_id)
+    # Push job ID to the front of the list, then keep only the last N jobs
+    pipe.lpush(history_key, job_id)
+    pipe.ltrim(history_key, 0, max_history - 1)
+    pipe.expire(history_key, JOB_TTL_SECONDS)
+    _bump_history_version(pipe, job_id)
+    pipe.execute()
+    logger.info(f"Job {job_id}: Initial metadata stored for {user_email}.")
+
+
+def update_job(r, job_id, status, error_message=None, output_key=None, output_format=None):
+    """
+    Writes a status transition (and optional result fields) for a job.
+
+    Download URLs are not stored; readers presign `output_s3_key` on demand.
+    Pass `output_format` with `output_key` so a default key can be elided.
+
+    Terminal statuses remove the job from the active set so the repair pass
+    no longer visits it, and start the job's retention TTL. A job that already
+    is COMPLETED or FAILED is never moved again: such updates are dropped, so
+    e.g. a late write from a worker cannot flip a result users have seen.
+
+    Returns:
+        bool: True if the update was written, False if the job had finished.
+    """
+    update_data = {
+        "status": status,
+        "last_updated": int(time.time()),
+        "error": error_message,
+        "output_s3_key": output_key,
+        "output_format": output_format,
+    }
+    encoded = encode_fields(job_id, update_data)
+    encoded.pop(FIELD_CODES["output_format"], None)  # Only used to elide the key
+
+    pairs = [item for field_value in encoded.items() for item in field_value]
+    applied = r.eval(
+        _UPDATE_UNLESS_FINISHED_SCRIPT,
+        1,
+        job_key(job_id),
+        FIELD_CODES["status"],
+        "status",
+        len(_FINISHED_STATUS_VALUES),
+        *_FINISHED_STATUS_VALUES,
+        # Drop what a pre-compact writer left behind (no-op on compact hashes)
+        len(LEGACY_UPDATE_FIELDS),
+        *LEGACY_UPDATE_FIELDS,
+        *pairs,
+    )
+    if not applied:
+        logger.warning(f"Job {job_id}: Already finished; ignoring status update to {status}.")
+        return False
+
+    pipe = r.pipeline()
+    if status in TERMINAL_STATUSES:
+        pipe.srem(ACTIVE_JOBS_KEY, job_id)
+        pipe.expire(job_key(job_id), JOB_TTL_SECONDS)
+    else:
+        pipe.sadd(ACTIVE_JOBS_KEY, job_id)
+    _bump_history_version(pipe, job_id)
+    pipe.execute()
+    logger.info(f"Job {job_id}: Status updated to {status}.")
+    return True
+
+
+def heartbeat(r, job_id):
+    """
+    Records that a worker is still processing a job (the `heartbeat` field).
+
+    Only touches jobs that are PROCESSING, so a late heartbeat never revives a
+    finished or expired job. `last_updated` is left alone: it keeps the time
+    of the last status change.
+
+    Returns:
+        bool: True if the heartbeat was written.
+    """
+    return bool(
+        r.eval(
+            _HEARTBEAT_SCRIPT,
+            1,
+            job_key(job_id),
+            FIELD_CODES["status"],
+            "status",
+            STATUS_CODES[STATUS_PROCESSING],
+            STATUS_PROCESSING,
+            FIELD_CODES["heartbeat"],
+            int(time.time()),
+        )
+    )
+
+
+def _set_field_if_exists(r, job_id, name, value):
+    """HSETs one field only if the job hash still exists; returns True if it did."""
+    pipe = r.pipeline()
+    pipe.eval(_HSET_IF_EXISTS_SCRIPT, 1, job_key(job_id), FIELD_CODES[name], value)
+    _bump_history_version(pipe, job_id)  # No-op when the hash is gone
+    return bool(pipe.execute()[0])
+
+
+def set_notification_status(r, job_id, notification_status):
+    """
+    Records the outcome of a job's completion e-mail (sent/skipped/failed).
+
+    Only touches an existing hash, so a late notification never recreates a
+    job the janitor already expired.
+    """
+    if _set_field_if_exists(r, job_id, "notification_status", notification_status):
+        logger.info(f"Job {job_id}: Notification {notification_status}.")
+    else:
+        logger.warning(f"Job {job_id}: Job no longer exists; notification outcome not recorded.")
+
+
+def set_preview(r, job_id, preview_key):
+    """Records the S3 key of a job's preview image (only if the job still exists)."""
+    if _set_field_if_exists(r, job_id, "preview_s3_key", preview_key):
+        logger.info(f"Job {job_id}: Preview stored at {preview_key}.")
+    else:
+        logger.warning(f"Job {job_id}: Job no longer exists; preview not recorded.")
+
+
+def apply_ttl(r, job_ids, ttl=JOB_TTL_SECONDS):
+    """Sets the retention TTL on several job hashes in one round-trip."""
+    pipe = r.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.expire(job_key(job_id), ttl)
+    pipe.execute()
+
+
+def mark_inputs_deleted(r, job_ids):
+    """Records that the raw input objects of these jobs were removed from S3."""
+    pipe = r.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hset(job_key(job_id), FIELD_CODES["input_deleted"], 1)
+    pipe.execute()
+
+
+# --- Reads ---
+def get_job(r, job_id):
+    """Returns the decoded metadata dict of a job, or an empty dict if it does not exist."""
+    return decode_job(job_id, r.hgetall(job_key(job_id)))
+
+
+def get_status(r, job_id):
+    """Returns just the status of a job (None if it does not exist)."""
+    return _decode_status(r.hmget(job_key(job_id), FIELD_CODES["status"], "status"))
+
+
+def get_jobs(r, job_ids):
+    """Returns the metadata dicts for several jobs in one round-trip (same order)."""
+    if not job_ids:
+        return []
+    pipe = r.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hgetall(job_key(job_id))
+    return [decode_job(job_id, raw) for job_id, raw in zip(job_ids, pipe.execute())]
+
+
+def get_history_version(r, user_email):
+    """
+    Returns the current version of a user's job history (a string).
+
+    Every write that changes what the user's history shows bumps it, so
+    callers can use it to validate a cached rendering without reading jobs.
+    """
+    key = history_version_key(user_email)
+    version = r.get(key)
+    if version is None:
+        # First read (or the counter expired): start from the current time
+        r.set(key, int(time.time() * 1000), nx=True, ex=JOB_TTL_SECONDS)
+        version = r.get(key)
+    return version
+
+
+def get_user_job_ids(r, user_email):
+    """Returns the recent job IDs of a user, most recent first."""
+    return r.lrange(user_history_key(user_email), 0, -1)
+
+
+def scan_jobs(r, batch_size=500):
+    """
+    Iterates over every job hash using SCAN, without blocking Redis.
+
+    Yields:
+        list: Batches of (job_id, metadata, ttl) tuples, where ttl is the
+              remaining TTL in seconds (-1 if the hash has no expiry).
+    """
+    batch = []
+    for key in r.scan_iter(match=f"{JOB_KEY_PREFIX}*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield _load_job_batch(r, batch)
+            batch = []
+    if batch:
+        yield _load_job_batch(r, batch)
+
+
+def _load_job_batch(r, keys):
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+        pipe.ttl(key)
+    results = pipe.execute()
+
+    jobs = []
+    for index, key in enumerate(keys):
+        job_id = key[len(JOB_KEY_PREFIX):]
+        metadata = decode_job(job_id, results[2 * index])
+        if metadata:  # Skip keys that expired between SCAN and HGETALL
+            jobs.append((job_id, metadata, results[2 * index + 1]))
+    return jobs
+
+
+# --- Background Repair (Celery result backend reconciliation) ---
+def parse_backend_state(raw_data):
+    """
+    Translates a raw `celery-task-meta-*` value into an application status.
+
+    Returns:
+        tuple: (status, error) where status is None if the value is missing or
+               unreadable, and error is only set for FAILED tasks.
+    """
+    if not raw_data:
+        return None, None
+    try:
+        data = json.loads(raw_data)
+    except (TypeError, ValueError):
+        return None, None
+
+    status = CELERY_STATUS_MAP.get(data.get("status"))
+    error = None
+    result = data.get("result")
+    if status == STATUS_COMPLETED and isinstance(result, dict):
+        # Our tasks return {"status": "failed", ...} instead of raising
+        if result.get("status") == "failed":
+            status = STATUS_FAILED
+            error = str(result.get("error", "Unknown error"))
+    elif status == STATUS_FAILED:
+        # Celery stores exception info in 'result' or 'traceback'
+        error_info = result
+        if isinstance(error_info, dict) and "exc_message" in error_info:
+            error = str(error_info["exc_message"])
+        elif error_info:
+            error = str(error_info)
+        else:
+            error = data.get("traceback") or "Unknown error"
+    return status, error
+
+
+def reconcile_active_jobs(r, batch_size=100):
+    """
+    Repairs active jobs whose Celery backend state moved on without the job hash.
+
+    Walks the active set with SSCAN in batches, reading job statuses and Celery
+    metadata for each batch in a single pipeline. Jobs whose hash no longer
+    exists are dropped from the active set.
+
+    Returns:
+        int: Number of jobs whose status was repaired.
+    """
+    repaired = 0
+    batch = []
+    for job_id in r.sscan_iter(ACTIVE_JOBS_KEY, count=batch_size):
+        batch.append(job_id)
+        if len(batch) >= batch_size:
+            repaired += _reconcile_batch(r, batch)
+            batch = []
+    if batch:
+        repaired += _reconcile_batch(r, batch)
+    return repaired
+
+
+def _reconcile_batch(r, job_ids):
+    pipe = r.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hmget(job_key(job_id), FIELD_CODES["status"], "status")
+        pipe.get(f"{CELERY_META_PREFIX}{job_id}")
+    results = pipe.execute()
+
+    repaired = 0
+    for index, job_id in enumerate(job_ids):
+        current_status = _decode_status(results[2 * index])
+        if current_status is None:
+            r.srem(ACTIVE_JOBS_KEY, job_id)
+            continue
+        if current_status in TERMINAL_STATUSES:
+            # The worker's own terminal write wins over the backend
+            r.srem(ACTIVE_JOBS_KEY, job_id)
+            continue
+        backend_status, backend_error = parse_backend_state(results[2 * index + 1])
+        if backend_status in (None, STATUS_PENDING, current_status):
+            # Nothing newer in the backend; never move a job backwards
+            continue
+
+        logger.info(
+            f"Job {job_id}: Celery backend status ({backend_status}) differs from metadata ({current_status}). Repairing."
+        )
+        try:
+            update_job(r, job_id, backend_status, error_message=backend_error)
+            repaired += 1
+        except redis.RedisError as e:
+            logger.error(f"Job {job_id}: Redis error while repairing status: {e}")
+    return repaired
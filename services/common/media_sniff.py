@@ -0,0 +1,153 @@
+# ./services/common/media_sniff.py
+"""
+Cheap upload-time media validation from the first few KB of a file.
+
+Identifies the container from magic bytes and sanity-checks its header, so
+corrupt or non-media uploads are rejected before they are written to S3 and
+before a transcoding worker wastes an FFmpeg run on them. Nothing here reads
+more than SNIFF_BYTES of the stream.
+"""
+
+import io
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 4096  # Enough for every container header we check
+
+# ISO base media (MP4/MOV/M4A/3GP) top-level boxes a file may start with
+_ISO_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot"}
+_ASF_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+_MPEG_TS_PACKET = 188
+
+
+class MediaValidationError(ValueError):
+    """Raised when an upload does not look like a supported media container."""
+
+    pass
+
+
+def detect_container(header):
+    """
+    Identifies the media container from the first bytes of a file.
+
+    Args:
+        header (bytes): The first bytes of the file (ideally SNIFF_BYTES).
+
+    Returns:
+        str: Container name ('mp4', 'matroska', 'webm', 'avi', 'wav', 'flac',
+             'ogg', 'mp3', 'aac', 'mpegts', 'mpegps', 'flv', 'asf'), or None.
+    """
+    if len(header) < 12:
+        return None
+
+    if header[4:8] in _ISO_BOXES:
+        box_size = struct.unpack(">I", header[:4])[0]
+        # Size 0 = box runs to EOF, 1 = 64-bit size follows; otherwise it must cover its header
+        if box_size in (0, 1) or box_size >= 8:
+            return "mp4"
+        return None
+    if header[:4] == b"\x1a\x45\xdf\xa3":  # EBML
+        # The DocType element tells WebM and Matroska apart
+        if b"webm" in header[:64]:
+            return "webm"
+        if b"matroska" in header[:64]:
+            return "matroska"
+        return None
+    if header[:4] == b"RIFF":
+        form_type = header[8:12]
+        if form_type == b"WAVE":
+            return "wav"
+        if form_type == b"AVI ":
+            return "avi"
+        return None
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:3] == b"FLV":
+        return "flv"
+    if header[:16] == _ASF_GUID:
+        return "asf"
+    if header[:4] == b"\x00\x00\x01\xba":
+        return "mpegps"
+    if header[0] == 0x47 and (
+        len(header) <= _MPEG_TS_PACKET or header[_MPEG_TS_PACKET] == 0x47
+    ):
+        return "mpegts"
+    if header[:3] == b"ID3":
+        return "mp3"
+    if header[0] == 0xFF and (header[1] & 0xF6) == 0xF0:  # ADTS sync word, layer 0
+        return "aac"
+    if header[0] == 0xFF and (header[1] & 0xE0) == 0xE0:  # MPEG audio frame sync
+        return "mp3"
+    return None
+
+
+class SniffingReader(io.RawIOBase):
+    """
+    Wraps an upload stream, validating its header before passing bytes on.
+
+    `validate()` reads only the first SNIFF_BYTES; afterwards `read()` replays
+    those bytes and continues straight from the source, so the file can be
+    streamed to S3 without ever being buffered whole.
+
+    Usage:
+        reader = SniffingReader(file.stream)
+        container = reader.validate()        # raises MediaValidationError
+        storage.upload_fileobj(reader, key)  # streams header + rest
+    """
+
+    def __init__(self, stream, sniff_bytes=SNIFF_BYTES):
+        super().__init__()
+        self._stream = stream
+        self._sniff_bytes = sniff_bytes
+        self._buffer = b""
+        self._validated = False
+        self.container = None
+
+    def validate(self):
+        """Sniffs the header; returns the container name or raises MediaValidationError."""
+        if not self._validated:
+            self._buffer = self._read_header()
+            self.container = detect_container(self._buffer)
+            self._validated = True
+        if not self.container:
+            raise MediaValidationError(
+                "File does not look like a supported audio/video container."
+            )
+        return self.container
+
+    def _read_header(self):
+        chunks, remaining = [], self._sniff_bytes
+        while remaining > 0:
+            chunk = self._stream.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        self.validate()
+        if self._buffer:
+            if size is None or size < 0:
+                data, self._buffer = self._buffer + self._stream.read(), b""
+                return data
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            if len(data) < size:
+                # Top up from the source: S3's transfer manager takes a short
+                # read for the end of the file (and would then upload it with
+                # a single PUT, reading everything that follows into memory)
+                data += self._stream.read(size - len(data))
+            return data
+        return self._stream.read(size)
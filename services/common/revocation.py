@@ -0,0 +1,111 @@
+# ./services/common/revocation.py
+"""
+Revoked login sessions, checked without a Redis round trip per request.
+
+The auth-service records a revoked session id in the `auth:revoked` zset
+(score = when the session's last access token expires) and bumps
+`auth:revoked:version` (see services/auth-service/sessions.py, which owns the
+key layout). Each process here keeps a Bloom filter of the live entries,
+rebuilt by a background thread whenever the version changes or an entry
+expires, so checking a token is a few hash probes in memory:
+
+  - not in the filter  -> not revoked (the answer for almost every request)
+  - in the filter      -> confirmed with one ZSCORE, since Bloom filters
+                          have false positives
+
+A revocation reaches every process within REVOCATION_SYNC_SECONDS.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import redis
+
+from .bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+REVOCATION_SYNC_SECONDS = float(os.environ.get("REVOCATION_SYNC_SECONDS", 5))
+REVOCATION_FILTER_CAPACITY = int(os.environ.get("REVOCATION_FILTER_CAPACITY", 10000))
+REVOCATION_FILTER_ERROR_RATE = 0.001
+
+# --- Key layout (owned by services/auth-service/sessions.py) ---
+REVOKED_KEY = "auth:revoked"
+REVOKED_VERSION_KEY = "auth:revoked:version"
+
+
+class RevocationFilter:
+    """
+    In-memory view of the revoked-session set for one process.
+
+    The sync thread is started on first use, in the process that uses it, so
+    it survives gunicorn's fork.
+    """
+
+    def __init__(self, r, sync_seconds=REVOCATION_SYNC_SECONDS):
+        self.r = r
+        self.sync_seconds = sync_seconds
+        self._bloom = None  # None until the first successful sync
+        self._version = None
+        self._next_expiry = None
+        self._lock = threading.Lock()
+        self._owner_pid = None
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._owner_pid == pid:
+            return
+        with self._lock:
+            if self._owner_pid == pid:
+                return
+            self._bloom = None  # Never trust a filter inherited across a fork
+            self._version = None
+            thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+            thread.start()
+            self._owner_pid = pid
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Revocation filter sync failed: {e}")
+            time.sleep(self.sync_seconds)
+
+    def sync(self):
+        """Rebuilds the filter if revocations were added or entries expired."""
+        now = time.time()
+        version = self.r.get(REVOKED_VERSION_KEY)
+        expired = self._next_expiry is not None and now >= self._next_expiry
+        if self._bloom is not None and version == self._version and not expired:
+            return
+        entries = self.r.zrangebyscore(REVOKED_KEY, now, "+inf", withscores=True)
+        self._bloom = BloomFilter.from_items(
+            (sid for sid, _ in entries), REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE
+        )
+        self._next_expiry = min((score for _, score in entries), default=None)
+        self._version = version
+        logger.info(f"Revocation filter rebuilt with {len(entries)} session(s) (version {version}).")
+
+    def is_revoked(self, sid):
+        """
+        Returns True if the session was revoked and its tokens have not expired.
+
+        A filter hit is confirmed in Redis; if Redis is unreachable then, the
+        session is treated as revoked. Before the first sync every check
+        goes to Redis, and an unreachable Redis then lets the token through
+        (it is still short-lived and signature-checked).
+        """
+        self._ensure_started()
+        bloom = self._bloom
+        if bloom is not None and sid not in bloom:
+            return False
+        try:
+            score = self.r.zscore(REVOKED_KEY, sid)
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Could not confirm revocation of session {sid}: {e}")
+            return bloom is not None
+        return score is not None and score > time.time()
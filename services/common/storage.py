@@ -5,13 +5,20 @@ Utility functions for interacting with AWS S3 storage.
 Requires AWS credentials to be configured (e.g., via environment variables
 AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_SESSION_TOKEN, or via
 IAM roles when running on EC2/ECS/Fargate).
+
+Importing this module is cheap: boto3 is imported and the S3 client built on
+first use (`get_s3_client`), once per process. Prefork children (Celery,
+gunicorn) notice the PID change and build their own client instead of
+sharing the parent's connection pool.
 """
 
 import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 
-import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
 
@@ -28,6 +35,21 @@ AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
 S3_PRESIGNED_URL_EXPIRATION = int(os.environ.get('PRESIGNED_URL_EXPIRATION', 3600)) # Default 1 hour
 AWS_ENDPOINT_URL = os.environ.get('AWS_ENDPOINT_URL') # <-- Get endpoint override
+S3_DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects accepts at most 1000 keys per request
+# Threads one managed upload/download may use for multipart parts
+S3_TRANSFER_CONCURRENCY = int(os.environ.get('S3_TRANSFER_CONCURRENCY', 10))
+# Parts of one streamed (non-seekable) upload held in memory at once; reading
+# the source pauses while they are all in use, so a managed upload needs at most
+# S3_MAX_BUFFERED_PARTS x S3_MULTIPART_CHUNKSIZE bytes of buffer
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+S3_MAX_BUFFERED_PARTS = int(os.environ.get('S3_MAX_BUFFERED_PARTS', 4))
+# Requests one batch helper (head_many, delete_objects, ...) keeps in flight
+S3_BATCH_CONCURRENCY = int(os.environ.get('S3_BATCH_CONCURRENCY', 16))
+# HTTP connections per process-local client; must cover every thread using the
+# client at once (request threads x transfer threads), or requests queue for a connection
+S3_MAX_POOL_CONNECTIONS = int(
+    os.environ.get('S3_MAX_POOL_CONNECTIONS', max(10, 2 * S3_TRANSFER_CONCURRENCY))
+)
 
 # Boto3 Configuration (optional: for retries, etc.)
 # See: https://boto3.amazonaws.com/v1/documentation/api/latest/guide/configuration.html
@@ -43,7 +65,8 @@ AWS_ENDPOINT_URL = os.environ.get('AWS_ENDPOINT_URL') # <-- Get endpoint overrid
 BOTO_CONFIG = Config(
     region_name=AWS_REGION,
     signature_version='s3v4',
-    retries={'max_attempts': 3, 'mode': 'standard'}
+    retries={'max_attempts': 3, 'mode': 'standard'},
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
     # Optional: Needed for MinIO path-style access if virtual-host style fails
     # s3={'addressing_style': 'path'} if AWS_ENDPOINT_URL else None
 )
@@ -74,59 +97,110 @@ class S3DownloadError(S3Error):
     pass
 
 
+class S3RequestError(S3Error):
+    """
+    Exception for a failed object request, keeping S3's answer.
+
+    Attributes:
+        code (str): S3 error code (e.g., 'NoSuchKey', 'InvalidRange', '304').
+        http_status (int): HTTP status S3 responded with (e.g., 404, 416, 304).
+        headers (dict): S3's response headers, lower-case names (e.g. 'etag' on a 304).
+    """
+
+    def __init__(self, message, code=None, http_status=None, headers=None):
+        super().__init__(message)
+        self.code = code
+        self.http_status = http_status
+        self.headers = headers or {}
+
+
 # --- Boto3 S3 Client Initialization ---
-s3_client = None
-s3_resource = None
-
-# try:
-#     if not S3_BUCKET_NAME:
-#         logger.error("S3_BUCKET_NAME environment variable is not set.")
-#         # Raise configuration error only if used? Or log and let functions fail?
-#         # Let's allow initialization but functions will fail if BUCKET_NAME is missing.
-
-#     # Use session to ensure credentials are sourced consistently
-#     session = boto3.Session()
-#     s3_client = session.client("s3", config=BOTO_CONFIG)
-#     s3_resource = session.resource("s3", config=BOTO_CONFIG)
-#     logger.info(f"Boto3 S3 client and resource initialized for region {AWS_REGION}.")
-
-#     # Optional: Check credentials early
-#     # sts_client = session.client('sts')
-#     # identity = sts_client.get_caller_identity()
-#     # logger.info(f"Running with AWS identity: {identity['Arn']}")
-
-# except (NoCredentialsError, PartialCredentialsError) as e:
-#     logger.error(f"AWS credentials not found or incomplete: {e}")
-#     # Services using this module will fail when calling S3 functions
-#     s3_client = None
-#     s3_resource = None
-# except Exception as e:
-#     logger.error(f"Error initializing Boto3 S3 client: {e}")
-#     s3_client = None
-#     s3_resource = None
-
-try:
-    # Use session to ensure credentials are sourced consistently
-    session = boto3.Session()
-    s3_client = session.client(
-        's3',
-        config=BOTO_CONFIG,
-        endpoint_url=AWS_ENDPOINT_URL # <-- Pass endpoint_url if set
-    )
-    s3_resource = session.resource(
-        's3',
-        config=BOTO_CONFIG,
-        endpoint_url=AWS_ENDPOINT_URL # <-- Pass endpoint_url if set
-    )
-    if AWS_ENDPOINT_URL:
-         logger.info(f"Boto3 S3 client initialized for endpoint {AWS_ENDPOINT_URL}")
-    else:
-         logger.info(f"Boto3 S3 client initialized for default AWS endpoint in region {AWS_REGION}.")
+# Per-process state: a urllib3 pool inherited across fork shares sockets with
+# the parent and other children, so each process builds (and rebuilds) its own.
+_s3_client = None
+_s3_client_pid = None  # PID that built _s3_client; a forked child must not reuse it
+_s3_client_lock = threading.Lock()
+_transfer_config = None
+
+
+def get_s3_client():
+    """
+    Returns this process's S3 client, building it on first use.
+
+    Raises:
+        S3ConfigError: If the client cannot be created (e.g., missing credentials).
+    """
+    global _s3_client, _s3_client_pid
+    pid = os.getpid()
+    if _s3_client is not None and _s3_client_pid == pid:
+        return _s3_client
+
+    with _s3_client_lock:
+        if _s3_client is None or _s3_client_pid != pid:
+            import boto3  # Deferred: importing boto3 dominates module start-up time
+
+            try:
+                # A private session per process; the default session is not fork- or thread-safe
+                session = boto3.session.Session()
+                _s3_client = session.client(
+                    's3',
+                    config=BOTO_CONFIG,
+                    endpoint_url=AWS_ENDPOINT_URL # <-- Pass endpoint_url if set
+                )
+            except (NoCredentialsError, PartialCredentialsError) as e:
+                logger.error(f"AWS credentials not found or incomplete: {e}")
+                raise S3ConfigError(f"AWS credentials not found or incomplete: {e}") from e
+            except Exception as e:
+                logger.error(f"Error initializing Boto3 S3 client: {e}")
+                raise S3ConfigError(f"Error initializing S3 client: {e}") from e
+            _s3_client_pid = pid
+            if AWS_ENDPOINT_URL:
+                logger.info(f"Boto3 S3 client initialized for endpoint {AWS_ENDPOINT_URL} (pid {pid})")
+            else:
+                logger.info(f"Boto3 S3 client initialized for default AWS endpoint in region {AWS_REGION} (pid {pid}).")
+    return _s3_client
+
+
+def get_transfer_config():
+    """Returns the managed-transfer settings used for uploads and downloads."""
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+
+        _transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_CHUNKSIZE,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=min(S3_TRANSFER_CONCURRENCY, S3_MAX_POOL_CONNECTIONS),
+            use_threads=S3_TRANSFER_CONCURRENCY > 1,
+        )
+        # Not a boto3 constructor argument, but honoured by s3transfer
+        _transfer_config.max_in_memory_upload_chunks = S3_MAX_BUFFERED_PARTS
+    return _transfer_config
+
+
+def reset_s3_client():
+    """
+    Drops this process's S3 client; the next call to get_s3_client builds a new one.
+
+    Celery workers call this from `worker_process_init`, so every prefork
+    child starts with its own connection pool.
+    """
+    global _s3_client, _s3_client_pid
+    with _s3_client_lock:
+        _s3_client = None
+        _s3_client_pid = None
 
-except (NoCredentialsError, PartialCredentialsError) as e:
-    logger.error(f"AWS credentials not found or incomplete: {e}")
-except Exception as e:
-    logger.error(f"Error initializing Boto3 S3 client: {e}")
+
+def _reset_after_fork():
+    # The lock may have been held by another thread of the parent at fork time
+    global _s3_client, _s3_client_pid, _s3_client_lock
+    _s3_client_lock = threading.Lock()
+    _s3_client = None
+    _s3_client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 # --- S3 Functions ---
@@ -151,10 +225,7 @@ def upload_fileobj(
         S3ConfigError: If S3 client or bucket name is not configured.
         S3UploadError: If the upload fails.
     """
-    if not s3_client:
-        raise S3ConfigError(
-            "S3 client not initialized. Check AWS credentials and configuration."
-        )
+    s3_client = get_s3_client()
     if not Bucket:
         raise S3ConfigError("S3 bucket name is not configured.")
 
@@ -165,7 +236,11 @@ def upload_fileobj(
     logger.debug(f"Attempting to upload file object to s3://{Bucket}/{s3_key}")
     try:
         s3_client.upload_fileobj(
-            Fileobj=file_obj, Bucket=Bucket, Key=s3_key, ExtraArgs=upload_args
+            Fileobj=file_obj,
+            Bucket=Bucket,
+            Key=s3_key,
+            ExtraArgs=upload_args,
+            Config=get_transfer_config(),
         )
         logger.info(f"Successfully uploaded file object to s3://{Bucket}/{s3_key}")
     except ClientError as e:
@@ -198,10 +273,7 @@ def upload_file(file_path, s3_key, Bucket=S3_BUCKET_NAME, ExtraArgs=None):
         FileNotFoundError: If the local file_path does not exist.
         S3UploadError: If the upload fails.
     """
-    if not s3_client:
-        raise S3ConfigError(
-            "S3 client not initialized. Check AWS credentials and configuration."
-        )
+    s3_client = get_s3_client()
     if not Bucket:
         raise S3ConfigError("S3 bucket name is not configured.")
     if not os.path.exists(file_path):
@@ -213,7 +285,11 @@ def upload_file(file_path, s3_key, Bucket=S3_BUCKET_NAME, ExtraArgs=None):
     logger.debug(f"Attempting to upload file {file_path} to s3://{Bucket}/{s3_key}")
     try:
         s3_client.upload_file(
-            Filename=file_path, Bucket=Bucket, Key=s3_key, ExtraArgs=upload_args
+            Filename=file_path,
+            Bucket=Bucket,
+            Key=s3_key,
+            ExtraArgs=upload_args,
+            Config=get_transfer_config(),
         )
         logger.info(f"Successfully uploaded {file_path} to s3://{Bucket}/{s3_key}")
     except ClientError as e:
@@ -240,13 +316,10 @@ def download_file(s3_key, local_path, Bucket=S3_BUCKET_NAME):
         Bucket (str, optional): The source S3 bucket. Defaults to S3_BUCKET_NAME from env.
 
     Raises:
-        S3ConfigError: If S3 resource or bucket name is not configured.
+        S3ConfigError: If S3 client or bucket name is not configured.
         S3DownloadError: If the download fails (e.g., file not found, permissions).
     """
-    if not s3_resource:
-        raise S3ConfigError(
-            "S3 resource not initialized. Check AWS credentials and configuration."
-        )
+    s3_client = get_s3_client()
     if not Bucket:
         raise S3ConfigError("S3 bucket name is not configured.")
 
@@ -264,7 +337,9 @@ def download_file(s3_key, local_path, Bucket=S3_BUCKET_NAME):
 
     logger.debug(f"Attempting to download s3://{Bucket}/{s3_key} to {local_path}")
     try:
-        s3_resource.Bucket(Bucket).download_file(s3_key, local_path)
+        s3_client.download_file(
+            Bucket=Bucket, Key=s3_key, Filename=local_path, Config=get_transfer_config()
+        )
         logger.info(f"Successfully downloaded s3://{Bucket}/{s3_key} to {local_path}")
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
@@ -311,10 +386,7 @@ def create_presigned_url(
         S3ConfigError: If S3 client or bucket name is not configured.
         S3Error: If URL generation fails.
     """
-    if not s3_client:
-        raise S3ConfigError(
-            "S3 client not initialized. Check AWS credentials and configuration."
-        )
+    s3_client = get_s3_client()
     if not Bucket:
         raise S3ConfigError("S3 bucket name is not configured.")
 
@@ -355,6 +427,443 @@ def create_presigned_url(
         raise S3Error(f"Unexpected error during pre-signed URL generation: {e}") from e
 
 
+def get_object(s3_key, Bucket=S3_BUCKET_NAME, Range=None, IfNoneMatch=None, IfMatch=None):
+    """
+    Opens an object for streaming, optionally a byte range of it.
+
+    Args:
+        s3_key (str): The key (path) of the object in S3.
+        Bucket (str, optional): The S3 bucket. Defaults to S3_BUCKET_NAME from env.
+        Range (str, optional): HTTP Range header value (single range, e.g. 'bytes=0-1023').
+        IfNoneMatch (str, optional): ETag(s) the caller already has.
+        IfMatch (str, optional): ETag the object must still have.
+
+    Returns:
+        dict: The GetObject response. 'Body' is a StreamingBody to read in
+              chunks and close; 'ContentLength', 'ContentRange', 'ETag',
+              'LastModified' and 'ContentType' describe what it holds.
+
+    Raises:
+        S3ConfigError: If S3 client or bucket name is not configured.
+        S3RequestError: If S3 rejects the request (not found, 304, 412, 416, ...).
+    """
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+
+    params = {"Bucket": Bucket, "Key": s3_key}
+    if Range:
+        params["Range"] = Range
+    if IfNoneMatch:
+        params["IfNoneMatch"] = IfNoneMatch
+    if IfMatch:
+        params["IfMatch"] = IfMatch
+    try:
+        return s3_client.get_object(**params)
+    except ClientError as e:
+        raise _request_error(e, s3_key) from e
+    except Exception as e:
+        logger.error(f"Unexpected error opening {s3_key}: {e}")
+        raise S3Error(f"Unexpected error during S3 get: {e}") from e
+
+
+def head_object(s3_key, Bucket=S3_BUCKET_NAME):
+    """
+    Returns an object's metadata (ContentLength, ETag, LastModified, ContentType, ...).
+
+    Raises:
+        S3ConfigError: If S3 client or bucket name is not configured.
+        S3RequestError: If S3 rejects the request (e.g., 404).
+    """
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+    try:
+        return s3_client.head_object(Bucket=Bucket, Key=s3_key)
+    except ClientError as e:
+        raise _request_error(e, s3_key) from e
+    except Exception as e:
+        logger.error(f"Unexpected error reading metadata of {s3_key}: {e}")
+        raise S3Error(f"Unexpected error during S3 head: {e}") from e
+
+
+def _request_error(error, s3_key):
+    """Converts a botocore ClientError into an S3RequestError keeping code and status."""
+    error_code = error.response.get("Error", {}).get("Code")
+    error_msg = error.response.get("Error", {}).get("Message")
+    http_status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    headers = error.response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    if http_status in (304, 412):  # Conditional request outcomes, not failures
+        logger.debug(f"S3 answered {http_status} for {s3_key}")
+    else:
+        logger.error(f"S3 ClientError for {s3_key}: {error_code} - {error_msg}")
+    return S3RequestError(
+        f"S3 request for {s3_key} failed ({error_code}): {error_msg}",
+        code=error_code,
+        http_status=http_status,
+        headers=headers,
+    )
+
+
+def delete_objects(s3_keys, Bucket=S3_BUCKET_NAME):
+    """
+    Deletes many objects using S3 multi-object delete (up to 1000 keys per request).
+
+    Requests for more than 1000 keys run concurrently (see run_concurrently).
+
+    Args:
+        s3_keys (list): Keys of the objects to delete.
+        Bucket (str, optional): The S3 bucket. Defaults to S3_BUCKET_NAME from env.
+
+    Returns:
+        list: The keys that could NOT be deleted (empty if all succeeded).
+              Keys that do not exist count as deleted.
+
+    Raises:
+        S3ConfigError: If S3 client or bucket name is not configured.
+        S3Error: If a delete request fails as a whole.
+    """
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+
+    def delete_batch(start):
+        batch = s3_keys[start : start + S3_DELETE_BATCH_SIZE]
+        logger.debug(f"Deleting {len(batch)} objects from s3://{Bucket}")
+        try:
+            response = s3_client.delete_objects(
+                Bucket=Bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            error_msg = e.response.get("Error", {}).get("Message")
+            logger.error(f"S3 ClientError deleting objects: {error_code} - {error_msg}")
+            raise S3Error(f"Failed to delete objects ({error_code}): {error_msg}") from e
+        except Exception as e:
+            logger.error(f"Unexpected error deleting objects: {e}")
+            raise S3Error(f"Unexpected error during S3 delete: {e}") from e
+
+        # In quiet mode only the failures are reported back
+        for error in response.get("Errors", []):
+            logger.warning(
+                f"Could not delete {error.get('Key')}: {error.get('Code')} - {error.get('Message')}"
+            )
+        return [error.get("Key") for error in response.get("Errors", [])]
+
+    failed_keys = []
+    results = run_concurrently(delete_batch, range(0, len(s3_keys), S3_DELETE_BATCH_SIZE))
+    for result in results.values():
+        if isinstance(result, Exception):
+            raise result
+        failed_keys.extend(result)
+
+    logger.info(
+        f"Deleted {len(s3_keys) - len(failed_keys)} of {len(s3_keys)} objects from s3://{Bucket}"
+    )
+    return failed_keys
+
+
+# --- Batch Operations ---
+# Small S3 requests (HEAD, DELETE, abort) spend nearly all their time waiting
+# on the network, so a batch of them runs on a bounded thread pool: the batch
+# takes about as long as its slowest request instead of the sum of all.
+# boto3 clients are thread-safe; S3_MAX_POOL_CONNECTIONS caps the real
+# concurrency.
+def run_concurrently(fn, items, max_workers=S3_BATCH_CONCURRENCY):
+    """
+    Calls `fn(item)` for every item, at most `max_workers` at a time.
+
+    Returns:
+        dict: item -> fn's return value, or the exception it raised.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        results = {}
+        for item in items:
+            try:
+                results[item] = fn(item)
+            except Exception as e:
+                results[item] = e
+        return results
+
+    workers = min(max_workers, len(items), S3_MAX_POOL_CONNECTIONS)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-batch") as executor:
+        futures = {item: executor.submit(fn, item) for item in items}
+    return {
+        item: future.exception() or future.result() for item, future in futures.items()
+    }
+
+
+def presign_many(s3_keys, Bucket=S3_BUCKET_NAME, expiration=S3_PRESIGNED_URL_EXPIRATION):
+    """
+    Presigns GET URLs for many objects.
+
+    Signing is a local computation (no request to S3), so this runs in the
+    calling thread; it only saves the per-URL client lookup and logging.
+
+    Returns:
+        dict: key -> URL, for every key that could be signed.
+    """
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+    urls = {}
+    for s3_key in s3_keys:
+        try:
+            urls[s3_key] = s3_client.generate_presigned_url(
+                ClientMethod="get_object",
+                Params={"Bucket": Bucket, "Key": s3_key},
+                ExpiresIn=expiration,
+            )
+        except Exception as e:
+            logger.warning(f"Could not presign URL for {s3_key}: {e}")
+    logger.debug(f"Presigned {len(urls)} of {len(s3_keys)} URLs for s3://{Bucket}")
+    return urls
+
+
+def head_many(s3_keys, Bucket=S3_BUCKET_NAME):
+    """
+    HEADs many objects concurrently.
+
+    Returns:
+        dict: key -> head_object response, or None if the object does not
+              exist or could not be read (logged).
+    """
+    results = run_concurrently(lambda s3_key: head_object(s3_key, Bucket=Bucket), s3_keys)
+    heads = {}
+    for s3_key, result in results.items():
+        if isinstance(result, Exception):
+            if getattr(result, "http_status", None) != 404:
+                logger.warning(f"Could not HEAD {s3_key}: {result}")
+            heads[s3_key] = None
+        else:
+            heads[s3_key] = result
+    return heads
+
+
+def abort_multipart_uploads(uploads, Bucket=S3_BUCKET_NAME):
+    """
+    Aborts many multipart uploads concurrently.
+
+    Args:
+        uploads (list): Dicts with 'Key' and 'UploadId' (as from list_multipart_uploads).
+
+    Returns:
+        int: Number of uploads aborted; failures are logged.
+    """
+    results = run_concurrently(
+        lambda upload: abort_multipart_upload(upload[0], upload[1], Bucket=Bucket),
+        [(upload["Key"], upload["UploadId"]) for upload in uploads],
+    )
+    aborted = 0
+    for (s3_key, _), result in results.items():
+        if isinstance(result, Exception):
+            logger.warning(f"Could not abort multipart upload of {s3_key}: {result}")
+        else:
+            aborted += 1
+    return aborted
+
+
+# --- Server-side Copy, Metadata & Tags ---
+def object_args(ContentType=None, Metadata=None, Tags=None, **extra):
+    """
+    Builds the ExtraArgs of upload_file/upload_fileobj/copy_object.
+
+    Args:
+        ContentType (str, optional): MIME type stored with the object.
+        Metadata (dict, optional): User metadata (x-amz-meta-*); values become strings.
+        Tags (dict, optional): Object tags, e.g. for lifecycle rules or cost reports.
+        **extra: Any other ExtraArgs (e.g. CacheControl).
+    """
+    args = dict(extra)
+    if ContentType:
+        args["ContentType"] = ContentType
+    if Metadata:
+        args["Metadata"] = {key: str(value) for key, value in Metadata.items()}
+    if Tags:
+        args["Tagging"] = urlencode({key: str(value) for key, value in Tags.items()})
+    return args
+
+
+def copy_object(source_key, s3_key, Bucket=S3_BUCKET_NAME, SourceBucket=None, ExtraArgs=None):
+    """
+    Copies an object within S3; no data passes through this process.
+
+    Objects above the multipart threshold are copied as parallel UploadPartCopy
+    parts (boto3's managed copy), so objects beyond CopyObject's 5 GB limit
+    work too.
+
+    Args:
+        source_key (str): Key of the object to copy.
+        s3_key (str): Key of the new object.
+        SourceBucket (str, optional): Bucket of the source. Defaults to Bucket.
+        ExtraArgs (dict, optional): See object_args. Given metadata, content
+                                    type or tags replace the source's; without
+                                    them a multipart copy keeps none.
+
+    Raises:
+        S3ConfigError: If S3 client or bucket name is not configured.
+        S3RequestError: If S3 rejects the copy (e.g., 404 for a missing source).
+    """
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+
+    copy_args = dict(ExtraArgs or {})
+    if "Metadata" in copy_args or "ContentType" in copy_args:
+        copy_args["MetadataDirective"] = "REPLACE"
+    if "Tagging" in copy_args:
+        copy_args["TaggingDirective"] = "REPLACE"
+    source = {"Bucket": SourceBucket or Bucket, "Key": source_key}
+
+    logger.debug(f"Copying s3://{source['Bucket']}/{source_key} to s3://{Bucket}/{s3_key}")
+    try:
+        s3_client.copy(
+            CopySource=source,
+            Bucket=Bucket,
+            Key=s3_key,
+            ExtraArgs=copy_args,
+            Config=get_transfer_config(),
+        )
+        logger.info(f"Copied s3://{source['Bucket']}/{source_key} to s3://{Bucket}/{s3_key}")
+    except ClientError as e:
+        raise _request_error(e, source_key) from e
+    except Exception as e:
+        logger.error(f"Unexpected error copying {source_key} to {s3_key}: {e}")
+        raise S3Error(f"Unexpected error during S3 copy: {e}") from e
+
+
+def put_object_tags(s3_key, tags, Bucket=S3_BUCKET_NAME):
+    """Replaces the tags of an existing object with `tags` (dict)."""
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+    tag_set = [{"Key": key, "Value": str(value)} for key, value in tags.items()]
+    try:
+        s3_client.put_object_tagging(Bucket=Bucket, Key=s3_key, Tagging={"TagSet": tag_set})
+    except ClientError as e:
+        raise _request_error(e, s3_key) from e
+    except Exception as e:
+        logger.error(f"Unexpected error tagging {s3_key}: {e}")
+        raise S3Error(f"Unexpected error during S3 tagging: {e}") from e
+
+
+def get_object_tags(s3_key, Bucket=S3_BUCKET_NAME):
+    """Returns the tags of an object as a dict."""
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+    try:
+        response = s3_client.get_object_tagging(Bucket=Bucket, Key=s3_key)
+    except ClientError as e:
+        raise _request_error(e, s3_key) from e
+    except Exception as e:
+        logger.error(f"Unexpected error reading tags of {s3_key}: {e}")
+        raise S3Error(f"Unexpected error during S3 tagging: {e}") from e
+    return {tag["Key"]: tag["Value"] for tag in response.get("TagSet", [])}
+
+
+# --- Multipart Uploads ---
+# Low-level S3 multipart calls for uploads assembled from parts that arrive
+# in separate requests (e.g. resumable browser uploads through the gateway).
+# Every part except the last must be at least S3_MIN_PART_SIZE.
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+
+
+def _multipart_call(operation, s3_key, Bucket, **params):
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+    try:
+        return getattr(s3_client, operation)(Bucket=Bucket, Key=s3_key, **params)
+    except ClientError as e:
+        raise _request_error(e, s3_key) from e
+    except Exception as e:
+        logger.error(f"Unexpected error in {operation} for {s3_key}: {e}")
+        raise S3UploadError(f"Unexpected error during S3 {operation}: {e}") from e
+
+
+def create_multipart_upload(s3_key, Bucket=S3_BUCKET_NAME, ContentType=None):
+    """
+    Starts a multipart upload.
+
+    Returns:
+        str: The S3 UploadId that the other multipart calls need.
+
+    Raises:
+        S3ConfigError: If S3 client or bucket name is not configured.
+        S3RequestError: If S3 rejects the request.
+    """
+    params = {"ContentType": ContentType} if ContentType else {}
+    response = _multipart_call("create_multipart_upload", s3_key, Bucket, **params)
+    logger.info(f"Started multipart upload for s3://{Bucket}/{s3_key}")
+    return response["UploadId"]
+
+
+def upload_part(s3_key, upload_id, part_number, body, Bucket=S3_BUCKET_NAME, ContentLength=None):
+    """
+    Uploads one part (1-based `part_number`) of a multipart upload.
+
+    Args:
+        body: Bytes or a file-like object; with a stream, pass ContentLength.
+
+    Returns:
+        str: The part's ETag, needed to complete the upload.
+    """
+    params = {"UploadId": upload_id, "PartNumber": part_number, "Body": body}
+    if ContentLength is not None:
+        params["ContentLength"] = ContentLength
+    response = _multipart_call("upload_part", s3_key, Bucket, **params)
+    return response["ETag"]
+
+
+def complete_multipart_upload(s3_key, upload_id, parts, Bucket=S3_BUCKET_NAME):
+    """
+    Assembles the uploaded parts into the final object.
+
+    Args:
+        parts (list): (part_number, etag) pairs for every part, in any order.
+    """
+    multipart = {
+        "Parts": [{"PartNumber": number, "ETag": etag} for number, etag in sorted(parts)]
+    }
+    _multipart_call(
+        "complete_multipart_upload", s3_key, Bucket, UploadId=upload_id, MultipartUpload=multipart
+    )
+    logger.info(f"Completed multipart upload of {len(parts)} parts to s3://{Bucket}/{s3_key}")
+
+
+def abort_multipart_upload(s3_key, upload_id, Bucket=S3_BUCKET_NAME):
+    """Discards a multipart upload and the parts stored for it so far."""
+    _multipart_call("abort_multipart_upload", s3_key, Bucket, UploadId=upload_id)
+    logger.info(f"Aborted multipart upload for s3://{Bucket}/{s3_key}")
+
+
+def list_multipart_uploads(Prefix="", Bucket=S3_BUCKET_NAME):
+    """
+    Lists multipart uploads that were started but neither completed nor aborted.
+
+    Returns:
+        list: Dicts with 'Key', 'UploadId' and 'Initiated' (datetime).
+    """
+    s3_client = get_s3_client()
+    if not Bucket:
+        raise S3ConfigError("S3 bucket name is not configured.")
+    uploads = []
+    try:
+        paginator = s3_client.get_paginator("list_multipart_uploads")
+        for page in paginator.paginate(Bucket=Bucket, Prefix=Prefix):
+            uploads.extend(page.get("Uploads", []))
+    except ClientError as e:
+        raise _request_error(e, Prefix) from e
+    except Exception as e:
+        logger.error(f"Unexpected error listing multipart uploads: {e}")
+        raise S3Error(f"Unexpected error listing multipart uploads: {e}") from e
+    return uploads
+
+
 # --- Example Usage (for testing) ---
 if __name__ == "__main__":
     # This block runs only when storage.py is executed directly
@@ -406,8 +915,7 @@ if __name__ == "__main__":
         finally:
             # Optional: Clean up test object from S3
             try:
-                if s3_client:
-                    print(f"\nCleaning up s3://{S3_BUCKET_NAME}/{TEST_KEY}")
-                    s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=TEST_KEY)
+                print(f"\nCleaning up s3://{S3_BUCKET_NAME}/{TEST_KEY}")
+                get_s3_client().delete_object(Bucket=S3_BUCKET_NAME, Key=TEST_KEY)
             except Exception as cleanup_e:
                 print(f"Error during S3 cleanup: {cleanup_e}")
@@ -0,0 +1,106 @@
+# ./services/common/upload_sessions.py
+"""
+Resumable upload sessions backed by Redis.
+
+The browser uploads a file to the API Gateway in fixed-size parts, several at
+a time; each part goes straight into an S3 multipart upload. This module keeps
+the bookkeeping: which S3 upload a session writes to, the job options chosen
+at the start, and the ETag of every part stored so far. After a failure the
+browser asks for the session, skips the parts already listed and sends the
+rest.
+
+Key layout:
+    upload:<id>         hash of the session (owner, S3 key and UploadId, file
+                        name, size, part size, job options)
+    upload:<id>:parts   hash part number -> ETag of the stored part
+
+Both keys expire UPLOAD_SESSION_TTL_SECONDS after the session was created (a
+fixed deadline, so the janitor can safely abort any S3 multipart upload under
+the raw prefix that is older than that).
+
+All functions take a redis-py client created with `decode_responses=True`.
+"""
+
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+MIB = 1024 * 1024
+UPLOAD_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE", 8 * MIB))  # >= 5 MiB (S3 minimum)
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 10 * 1024 * MIB))
+UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get("UPLOAD_SESSION_TTL_SECONDS", 86400))
+
+INTEGER_FIELDS = {"size", "part_size", "part_count", "created"}
+
+
+# --- Key Helpers ---
+def session_key(upload_id):
+    return f"upload:{upload_id}"
+
+
+def parts_key(upload_id):
+    return f"upload:{upload_id}:parts"
+
+
+def part_count(size, part_size=UPLOAD_PART_SIZE):
+    """Number of parts a file of `size` bytes is split into (at least one)."""
+    return max(1, math.ceil(size / part_size))
+
+
+def expected_part_length(session, part_number):
+    """Byte length part `part_number` must have: part_size, except for the last part."""
+    if part_number < session["part_count"]:
+        return session["part_size"]
+    return session["size"] - session["part_size"] * (session["part_count"] - 1)
+
+
+# --- Sessions ---
+def create_session(r, upload_id, fields):
+    """Stores a new session (`fields` must include size, part_size and part_count)."""
+    pipe = r.pipeline()
+    pipe.hset(session_key(upload_id), mapping={k: v for k, v in fields.items() if v is not None})
+    pipe.expire(session_key(upload_id), UPLOAD_SESSION_TTL_SECONDS)
+    pipe.execute()
+
+
+def get_session(r, upload_id):
+    """Returns the session dict (integer fields decoded), or None if unknown or expired."""
+    raw = r.hgetall(session_key(upload_id))
+    if not raw:
+        return None
+    return {k: int(v) if k in INTEGER_FIELDS else v for k, v in raw.items()}
+
+
+def record_part(r, session, upload_id, part_number, etag, container=None):
+    """Records a stored part (and the container sniffed from part 1)."""
+    pipe = r.pipeline()
+    pipe.hset(parts_key(upload_id), part_number, etag)
+    pipe.expireat(parts_key(upload_id), session["created"] + UPLOAD_SESSION_TTL_SECONDS)
+    if container:
+        pipe.hset(session_key(upload_id), "container", container)
+    pipe.execute()
+
+
+def get_parts(r, upload_id):
+    """Returns {part_number: etag} of the parts stored so far."""
+    return {int(number): etag for number, etag in r.hgetall(parts_key(upload_id)).items()}
+
+
+def claim_completion(r, upload_id):
+    """
+    Marks the session as completing. Returns False if another request already
+    did, so a double-clicked or retried "complete" cannot create two jobs.
+    """
+    return bool(r.hsetnx(session_key(upload_id), "completing", 1))
+
+
+def release_completion(r, upload_id):
+    """Lets a failed completion be retried."""
+    r.hdel(session_key(upload_id), "completing")
+
+
+def delete_session(r, upload_id):
+    r.delete(session_key(upload_id), parts_key(upload_id))
@@ -3,6 +3,16 @@ import logging
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
+
+# Important: Ensure 'common' is accessible in PYTHONPATH
+try:
+    from common import storage
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from common import storage
 # from dotenv import dotenv_values
 
 # Logging Configuration
@@ -36,6 +46,9 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Outcomes are recorded on the job hash (common.job_store), not in the result backend
+    task_ignore_result=config.get("CELERY_IGNORE_RESULTS", "True").lower()
+    in ["true", "1", "t"],
     # Add retry settings if needed
     # task_acks_late = True # Consider if tasks are idempotent and long-running
     # worker_prefetch_multiplier = 1 # Process one message at a time if tasks are resource-intensive
@@ -43,6 +56,14 @@ celery_app.conf.update(
 
 logger.info("Notification Celery app configured.")
 logger.info(f"Broker URL: {celery_app.conf.broker_url}")
+logger.info(f"Task results ignored: {celery_app.conf.task_ignore_result}")
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Gives each prefork child its own S3 client instead of the parent's pool."""
+    storage.reset_s3_client()
+    logger.info(f"Worker process {os.getpid()} initialized with a fresh S3 client.")
+
 
 # Expose the configured app
 app = celery_app
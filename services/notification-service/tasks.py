@@ -5,25 +5,42 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+import redis
 from botocore.exceptions import ClientError
 from celery import shared_task
 
 # Important: Need access to common utilities. Assumes 'common' is in Python path.
 # This might require adjusting PYTHONPATH in Dockerfile or how 'common' is included.
 try:
-    from common import storage
+    from common import job_store, storage
 except ImportError:
     # Fallback if running locally without proper path setup - adjust as needed
     import sys
 
     # Assuming 'services' is the parent directory
     sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-    from common import storage
+    from common import job_store, storage
 
 
 # Get Logger instance defined in celery_app.py or create a new one
 logger = logging.getLogger(__name__)
 
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+
+# Redis Connection Pool (notification outcomes are recorded on the job hash)
+try:
+    redis_pool = redis.ConnectionPool.from_url(REDIS_URL, decode_responses=True)
+except Exception as e:
+    logger.error(f"Failed to create Redis connection pool: {e}")
+    redis_pool = None
+
+# Task result status -> outcome stored with the job
+NOTIFICATION_OUTCOMES = {
+    "success": job_store.NOTIFICATION_SENT,
+    "skipped": job_store.NOTIFICATION_SKIPPED,
+    "failed": job_store.NOTIFICATION_FAILED,
+}
+
 # SMTP Configuration (from environment variables loaded by celery_app)
 MAIL_SERVER = os.environ.get("MAIL_SERVER")
 MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))  # Default to 587
@@ -52,6 +69,10 @@ def send_notification_email(self, payload):
     """
     Celery task to generate a pre-signed URL and send a notification email.
 
+    The outcome is written to the job hash, since task results are normally
+    not stored (see CELERY_IGNORE_RESULTS). Retries record nothing until the
+    final attempt.
+
     Args:
         payload (dict): A dictionary containing job details:
             - job_id (str): The unique ID of the job.
@@ -60,6 +81,26 @@ def send_notification_email(self, payload):
             - output_format (str): The target format.
             - output_s3_key (str): The S3 key of the processed file.
     """
+    result = _send_notification(self, payload)
+    record_outcome(payload.get("job_id"), result.get("status"))
+    return result
+
+
+def record_outcome(job_id, result_status):
+    """Stores the notification outcome on the job hash; failures are only logged."""
+    outcome = NOTIFICATION_OUTCOMES.get(result_status)
+    if not job_id or not outcome or not redis_pool:
+        return
+    try:
+        job_store.set_notification_status(
+            redis.Redis(connection_pool=redis_pool), job_id, outcome
+        )
+    except redis.RedisError as e:
+        logger.error(f"Job {job_id}: Could not record notification outcome: {e}")
+
+
+def _send_notification(self, payload):
+    """Builds and sends the e-mail; returns the task result dict."""
     job_id = payload.get("job_id")
     recipient_email = payload.get("notification_email")
     original_filename = payload.get("original_filename", "your file")
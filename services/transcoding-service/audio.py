@@ -0,0 +1,123 @@
+# ./services/transcoding-service/audio.py
+"""
+Audio extraction fast path for audio-only outputs (mp3, aac, m4a, wav, flac).
+
+The regular path downloads the whole input and lets FFmpeg demux every
+stream, although `-vn` throws the video away. For audio targets the worker
+instead:
+  - points FFmpeg at a presigned URL of the input and maps only the first
+    audio stream. Nothing is written to disk but the output, and no video
+    packet is decoded. For indexed containers (MP4/MOV, Matroska/WebM with
+    cues) FFmpeg seeks with HTTP range requests, so video data between the
+    audio chunks is skipped where the file's interleaving allows; other
+    inputs are read through once, as a stream.
+  - copies the audio stream unchanged when it already is the target codec
+    (e.g. AAC in an MP4 to .aac or .m4a), instead of decoding and
+    re-encoding it.
+
+These jobs go to their own fair-queue pool and Celery queue, consumed by
+lightweight audio workers, so they never wait behind long video encodes.
+"""
+
+import logging
+import os
+
+try:
+    from common import formats
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from common import formats
+
+import passthrough
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+AUDIO_FAST_PATH_ENABLED = os.environ.get("AUDIO_FAST_PATH_ENABLED", "True").lower() in [
+    "true",
+    "1",
+    "t",
+]
+# FFmpeg reads the input for the whole run, so the URL must outlive the longest job
+AUDIO_SOURCE_URL_SECONDS = int(os.environ.get("AUDIO_SOURCE_URL_SECONDS", 3 * 3600))
+# FFmpeg reconnects this long when the S3 connection drops mid-read
+AUDIO_RECONNECT_DELAY_MAX_SECONDS = int(os.environ.get("AUDIO_RECONNECT_DELAY_MAX_SECONDS", 10))
+
+AUDIO_POOL = "audio"  # Fair-queue pool fed by the API Gateway for audio-only outputs
+AUDIO_QUEUE = "audio_queue"  # Celery queue carrying the audio tickets
+AUDIO_TICKET_TASK = "transcoding.tasks.audio_next"
+
+# Encoder settings per audio-only output format (also used by the regular path).
+# The gateway routes every format in common.formats.AUDIO_ONLY to this pool.
+ENCODE_ARGS = {
+    "mp3": ["-c:a", "libmp3lame", "-q:a", "2"],  # VBR quality setting 2
+    "aac": ["-c:a", "aac", "-b:a", "128k"],
+    "m4a": ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"],
+    "wav": ["-c:a", "pcm_s16le"],
+    "flac": ["-c:a", "flac"],
+}
+_missing = formats.AUDIO_ONLY - set(ENCODE_ARGS)
+if _missing:
+    raise RuntimeError(f"audio.ENCODE_ARGS has no settings for audio-only formats: {sorted(_missing)}")
+
+# Output format -> source audio codecs that can be copied into it as is
+COPYABLE_CODECS = {
+    "mp3": {"mp3"},
+    "aac": {"aac"},
+    "m4a": {"aac", "alac"},
+    "flac": {"flac"},
+}
+# Muxer options needed when copying (ADTS needs no bitstream filter from MP4 AAC)
+COPY_ARGS = {
+    "m4a": ["-movflags", "+faststart"],
+}
+
+
+def can_copy_audio(audio_codecs, output_format):
+    """True if the input has exactly one audio codec and the output format takes it unchanged."""
+    allowed = COPYABLE_CODECS.get(output_format)
+    return bool(allowed and audio_codecs and len(audio_codecs) == 1 and audio_codecs <= allowed)
+
+
+def probe_audio_codecs(source_url):
+    """Returns the set of audio codec names in the input (empty if none), or None if probing failed."""
+    codecs = passthrough.probe_codecs(source_url)
+    if codecs is None:
+        return None
+    return codecs.get("audio", set())
+
+
+def build_audio_command(source_url, output_path, output_format, copy=False, threads=None):
+    """
+    Constructs the FFmpeg command line extracting the first audio stream.
+
+    Args:
+        source_url (str): Presigned GET URL (or local path) of the input.
+        output_path (str): Local output file.
+        output_format (str): One of common.formats.AUDIO_ONLY.
+        copy (bool): Copy the audio stream instead of re-encoding it.
+        threads (int): Encoder thread cap (see scheduler).
+    """
+    command = [FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error"]
+    if "://" in source_url:
+        command.extend(
+            [
+                "-reconnect",
+                "1",
+                "-reconnect_delay_max",
+                str(AUDIO_RECONNECT_DELAY_MAX_SECONDS),
+            ]
+        )
+    # Only the audio stream is mapped, so no video packet is ever decoded
+    command.extend(["-i", source_url, "-map", "0:a:0", "-vn", "-sn", "-dn"])
+    if copy:
+        command.extend(["-c:a", "copy"] + COPY_ARGS.get(output_format, []))
+    else:
+        command.extend(ENCODE_ARGS[output_format])
+    if threads:
+        command.extend(["-threads", str(threads)])
+    command.append(output_path)
+    return command
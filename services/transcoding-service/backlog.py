@@ -0,0 +1,217 @@
+# ./services/transcoding-service/backlog.py
+"""
+Transcoding backlog measured in encode-seconds, the autoscaling signal.
+
+A queue of ten 3-second clips and a queue of ten feature films both have
+depth ten. What the worker fleet needs to know is how long the queued work
+keeps a worker slot busy, so this module estimates, per job,
+
+    encode-seconds = media duration x realtime factor of the output format
+
+and sums them over the fair queue (queued jobs) and the jobs running now
+(minus the time they have already run).
+
+  - Durations come from ffprobe, which reads only the container header of
+    the raw input through a presigned URL. The exporter probes a few queued
+    jobs per refresh and caches the result.
+  - Realtime factors (encode seconds per media second) are recorded by the
+    transcoding workers after every FFmpeg run; the recent samples per
+    output format are averaged.
+
+Key layout:
+    backlog:duration:<job_id>   media duration in seconds (-1: could not be probed)
+    backlog:rtf:<format>        list of recent realtime-factor samples, newest first
+
+See backlog_exporter.py for the HTTP endpoints serving the result.
+"""
+
+import logging
+import os
+import time
+
+try:
+    from common import fair_queue, formats, job_store, storage
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from common import fair_queue, formats, job_store, storage
+
+import previews
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+TRANSCODING_POOL = "transcoding"  # Fair-queue pool consumed by the transcoding workers
+BACKLOG_RTF_SAMPLES = int(os.environ.get("BACKLOG_RTF_SAMPLES", 50))
+BACKLOG_PROBE_BATCH = int(os.environ.get("BACKLOG_PROBE_BATCH", 20))  # ffprobe runs per refresh
+BACKLOG_DEFAULT_DURATION_SECONDS = float(os.environ.get("BACKLOG_DEFAULT_DURATION_SECONDS", 300))
+DURATION_TTL_SECONDS = 7 * 86400
+# Realtime factors assumed until workers have reported some
+DEFAULT_RTF_AUDIO = float(os.environ.get("BACKLOG_DEFAULT_RTF_AUDIO", 0.05))
+DEFAULT_RTF_VIDEO = float(os.environ.get("BACKLOG_DEFAULT_RTF_VIDEO", 1.0))
+
+UNPROBEABLE = -1.0
+
+
+# --- Key Helpers ---
+def duration_key(job_id):
+    return f"backlog:duration:{job_id}"
+
+
+def rtf_key(output_format):
+    return f"backlog:rtf:{output_format}"
+
+
+# --- Durations ---
+def get_durations(r, job_ids):
+    """Returns {job_id: seconds} for the jobs probed so far (UNPROBEABLE if probing failed)."""
+    if not job_ids:
+        return {}
+    values = r.mget([duration_key(job_id) for job_id in job_ids])
+    return {job_id: float(value) for job_id, value in zip(job_ids, values) if value is not None}
+
+
+def record_duration(r, job_id, seconds):
+    r.set(duration_key(job_id), seconds, ex=DURATION_TTL_SECONDS)
+
+
+def probe_inputs(r, payloads):
+    """
+    Probes the media duration of jobs' raw inputs concurrently and caches it.
+
+    Returns:
+        dict: job_id -> seconds (UNPROBEABLE where ffprobe failed).
+    """
+
+    def probe(index):
+        payload = payloads[index]
+        url = storage.create_presigned_url(
+            payload["input_s3_key"], expiration=previews.PREVIEW_TIMEOUT_SECONDS * 3
+        )
+        return previews.probe_duration(url)
+
+    results = storage.run_concurrently(probe, range(len(payloads)))
+    durations = {}
+    for index, result in results.items():
+        job_id = payloads[index]["job_id"]
+        if isinstance(result, Exception) or not result:
+            logger.warning(f"Job {job_id}: Could not probe input duration: {result}")
+            result = UNPROBEABLE
+        durations[job_id] = result
+        record_duration(r, job_id, result)
+    return durations
+
+
+# --- Realtime Factors ---
+def default_rtf(output_format):
+    return DEFAULT_RTF_AUDIO if formats.is_audio_only(output_format) else DEFAULT_RTF_VIDEO
+
+
+def record_encode(r, job_id, output_format, encode_seconds, input_path):
+    """
+    Records the realtime factor of a finished FFmpeg run.
+
+    Uses the duration the exporter probed, or probes the local input file.
+    """
+    durations = get_durations(r, [job_id])
+    seconds = durations.get(job_id)
+    if not seconds or seconds <= 0:
+        try:
+            seconds = previews.probe_duration(input_path)
+        except previews.PreviewError as e:
+            logger.debug(f"Job {job_id}: No duration for realtime factor: {e}")
+            return
+    if not seconds or seconds <= 0:
+        return
+    pipe = r.pipeline()
+    pipe.lpush(rtf_key(output_format), round(encode_seconds / seconds, 4))
+    pipe.ltrim(rtf_key(output_format), 0, BACKLOG_RTF_SAMPLES - 1)
+    pipe.execute()
+
+
+def realtime_factors(r, output_formats):
+    """Returns {format: mean of recent samples, or the default when there are none}."""
+    output_formats = sorted(set(output_formats))
+    pipe = r.pipeline(transaction=False)
+    for output_format in output_formats:
+        pipe.lrange(rtf_key(output_format), 0, -1)
+    factors = {}
+    for output_format, samples in zip(output_formats, pipe.execute()):
+        samples = [float(sample) for sample in samples]
+        factors[output_format] = (
+            sum(samples) / len(samples) if samples else default_rtf(output_format)
+        )
+    return factors
+
+
+# --- Backlog ---
+def compute_backlog(r, pool=TRANSCODING_POOL, probe=True, now=None):
+    """
+    Estimates the work waiting for the transcoding workers.
+
+    Args:
+        r: redis-py client (decode_responses=True).
+        pool (str): Fair-queue pool to measure.
+        probe (bool): Probe up to BACKLOG_PROBE_BATCH unprobed queued jobs first.
+
+    Returns:
+        dict: encode_seconds (queued + in flight), its two parts, job counts
+              per lane, unprobed_jobs, oldest_queued_age_seconds and the
+              realtime factors used.
+    """
+    now = now or time.time()
+    queued = fair_queue.queued_payloads(r, pool)
+    inflight = fair_queue.inflight_payloads(r, pool)
+    payloads = [payload for _, payload in queued] + inflight
+    job_ids = [payload.get("job_id") for payload in payloads]
+
+    durations = get_durations(r, job_ids)
+    if probe:
+        # Lane order (interactive first), each user's queue oldest first
+        unprobed = [
+            payload
+            for payload in payloads
+            if payload.get("job_id") not in durations and payload.get("input_s3_key")
+        ][:BACKLOG_PROBE_BATCH]
+        if unprobed:
+            durations.update(probe_inputs(r, unprobed))
+
+    known = [seconds for seconds in durations.values() if seconds > 0]
+    fallback = sum(known) / len(known) if known else BACKLOG_DEFAULT_DURATION_SECONDS
+    factors = realtime_factors(r, [payload.get("output_format") or "" for payload in payloads])
+    jobs = dict(zip(job_ids, job_store.get_jobs(r, job_ids))) if job_ids else {}
+
+    def estimate(payload):
+        seconds = durations.get(payload.get("job_id"), 0)
+        seconds = seconds if seconds > 0 else fallback
+        return seconds * factors[payload.get("output_format") or ""]
+
+    queued_seconds = sum(estimate(payload) for _, payload in queued)
+    inflight_seconds = 0.0
+    for payload in inflight:
+        metadata = jobs.get(payload.get("job_id")) or {}
+        elapsed = 0
+        if metadata.get("status") == job_store.STATUS_PROCESSING:
+            elapsed = now - int(metadata.get("last_updated") or now)
+        inflight_seconds += max(0.0, estimate(payload) - elapsed)
+
+    submitted = [
+        int((jobs.get(payload.get("job_id")) or {}).get("timestamp") or 0) for _, payload in queued
+    ]
+    submitted = [timestamp for timestamp in submitted if timestamp]
+    queued_jobs = {lane: 0 for lane in fair_queue.LANES}
+    for lane, _ in queued:
+        queued_jobs[lane] += 1
+
+    return {
+        "encode_seconds": round(queued_seconds + inflight_seconds, 1),
+        "queued_encode_seconds": round(queued_seconds, 1),
+        "inflight_encode_seconds": round(inflight_seconds, 1),
+        "queued_jobs": queued_jobs,
+        "inflight_jobs": len(inflight),
+        "unprobed_jobs": sum(1 for job_id in job_ids if durations.get(job_id, 0) <= 0),
+        "oldest_queued_age_seconds": round(now - min(submitted), 1) if submitted else 0,
+        "realtime_factors": {fmt: round(factor, 4) for fmt, factor in factors.items()},
+        "computed_at": int(now),
+    }
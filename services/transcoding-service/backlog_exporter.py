@@ -0,0 +1,120 @@
+# ./services/transcoding-service/backlog_exporter.py
+"""
+HTTP exporter for the transcoding backlog (see backlog.py).
+
+Endpoints:
+    GET /backlog   JSON, e.g. {"encode_seconds": 5400.0, ...}; KEDA's
+                   metrics-api scaler reads `encode_seconds` from here
+    GET /metrics   the same numbers in Prometheus text format
+    GET /health    liveness
+
+Run one instance per cluster (it only reads Redis and probes a few inputs):
+
+    REDIS_URL=redis://localhost:6379/0 python backlog_exporter.py
+    REDIS_URL=redis://localhost:6379/0 python backlog_exporter.py --once   # print and exit
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import redis
+
+import backlog
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+BACKLOG_EXPORTER_PORT = int(os.environ.get("BACKLOG_EXPORTER_PORT", 9102))
+BACKLOG_CACHE_SECONDS = float(os.environ.get("BACKLOG_CACHE_SECONDS", 5))
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+_cache_lock = threading.Lock()
+_cached = {"at": 0.0, "value": None}
+
+
+def current_backlog():
+    """Returns the backlog, recomputed at most every BACKLOG_CACHE_SECONDS."""
+    with _cache_lock:  # One computation (and probe batch) at a time
+        if _cached["value"] is None or time.monotonic() - _cached["at"] >= BACKLOG_CACHE_SECONDS:
+            _cached["value"] = backlog.compute_backlog(redis_client)
+            _cached["at"] = time.monotonic()
+        return _cached["value"]
+
+
+def prometheus_text(result):
+    lines = [
+        "# HELP transcoding_backlog_encode_seconds Estimated worker-slot seconds of queued and running jobs.",
+        "# TYPE transcoding_backlog_encode_seconds gauge",
+        f'transcoding_backlog_encode_seconds{{state="queued"}} {result["queued_encode_seconds"]}',
+        f'transcoding_backlog_encode_seconds{{state="inflight"}} {result["inflight_encode_seconds"]}',
+        "# HELP transcoding_backlog_jobs Jobs waiting in the fair queue, per lane.",
+        "# TYPE transcoding_backlog_jobs gauge",
+    ]
+    lines += [
+        f'transcoding_backlog_jobs{{lane="{lane}"}} {count}'
+        for lane, count in result["queued_jobs"].items()
+    ]
+    lines += [
+        "# HELP transcoding_inflight_jobs Jobs workers are running now.",
+        "# TYPE transcoding_inflight_jobs gauge",
+        f"transcoding_inflight_jobs {result['inflight_jobs']}",
+        "# HELP transcoding_backlog_unprobed_jobs Jobs estimated with the fallback duration.",
+        "# TYPE transcoding_backlog_unprobed_jobs gauge",
+        f"transcoding_backlog_unprobed_jobs {result['unprobed_jobs']}",
+        "# HELP transcoding_queue_lag_seconds Age of the oldest queued job.",
+        "# TYPE transcoding_queue_lag_seconds gauge",
+        f"transcoding_queue_lag_seconds {result['oldest_queued_age_seconds']}",
+        "# HELP transcoding_realtime_factor Encode seconds per media second (recent mean).",
+        "# TYPE transcoding_realtime_factor gauge",
+    ]
+    lines += [
+        f'transcoding_realtime_factor{{format="{fmt}"}} {factor}'
+        for fmt, factor in result["realtime_factors"].items()
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class BacklogHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send(200, "application/json", json.dumps({"status": "healthy"}))
+        if self.path not in ("/backlog", "/metrics"):
+            return self._send(404, "application/json", json.dumps({"error": "Not found"}))
+        try:
+            result = current_backlog()
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Could not compute backlog: {e}")
+            return self._send(503, "application/json", json.dumps({"error": "Redis unavailable"}))
+        if self.path == "/metrics":
+            return self._send(200, "text/plain; version=0.0.4", prometheus_text(result))
+        return self._send(200, "application/json", json.dumps(result))
+
+    def _send(self, status, content_type, body):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+if __name__ == "__main__":
+    if "--once" in sys.argv:
+        print(json.dumps(backlog.compute_backlog(redis_client), indent=2))
+        sys.exit(0)
+    server = ThreadingHTTPServer(("0.0.0.0", BACKLOG_EXPORTER_PORT), BacklogHandler)
+    logger.info(f"Backlog exporter listening on port {BACKLOG_EXPORTER_PORT}")
+    server.serve_forever()
@@ -2,6 +2,16 @@
 import os
 import logging
 from celery import Celery
+from celery.signals import worker_process_init
+
+# Important: Ensure 'common' is accessible in PYTHONPATH
+try:
+    from common import storage
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    from common import storage
 # from dotenv import dotenv_values
 
 # Logging Configuration
@@ -35,7 +45,32 @@ celery_app.conf.update(
     # Acknowledge task only after completion/failure (requires idempotent tasks or careful handling)
     task_acks_late = True,
     # Process one task at a time per worker process if FFmpeg is resource-heavy
-    worker_prefetch_multiplier = 1
+    worker_prefetch_multiplier = 1,
+    # Job state lives in the job:<id> hashes (common.job_store), so by default
+    # no celery-task-meta-* keys are written. Set CELERY_IGNORE_RESULTS=False to
+    # store results again (the reconciler then repairs drift from them).
+    task_ignore_result = config.get('CELERY_IGNORE_RESULTS', 'True').lower() in ['true', '1', 't'],
+    # Prefork children per node; scheduler.py splits the CPUs between them,
+    # so set this instead of passing -c on the command line
+    worker_concurrency = int(config.get('TRANSCODING_CONCURRENCY', 1)),
+    # Maintenance tasks run on their own queue so they never wait behind a transcode
+    task_routes = {
+        'transcoding.tasks.reconcile_jobs': {'queue': 'maintenance_queue'},
+        'transcoding.tasks.sweep_jobs': {'queue': 'maintenance_queue'},
+        # Previews are best-effort and must never delay a transcode
+        'transcoding.tasks.generate_preview': {'queue': 'preview_queue'},
+    },
+    # Periodic tasks (run `celery beat`, or a worker with -B, on exactly one node)
+    beat_schedule = {
+        'reconcile-jobs': {
+            'task': 'transcoding.tasks.reconcile_jobs',
+            'schedule': float(config.get('RECONCILE_INTERVAL_SECONDS', 60)),
+        },
+        'sweep-jobs': {
+            'task': 'transcoding.tasks.sweep_jobs',
+            'schedule': float(config.get('JANITOR_INTERVAL_SECONDS', 900)),
+        },
+    },
     # Set default task time limits if desired
     # task_time_limit = 3600 # Soft time limit (raises SoftTimeLimitExceeded)
     # task_soft_time_limit = 3500 # Hard time limit (kills worker process)
@@ -43,6 +78,14 @@ celery_app.conf.update(
 
 logger.info("Transcoding Celery app configured.")
 logger.info(f"Broker URL: {celery_app.conf.broker_url}")
+logger.info(f"Task results ignored: {celery_app.conf.task_ignore_result}")
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Gives each prefork child its own S3 client instead of the parent's pool."""
+    storage.reset_s3_client()
+    logger.info(f"Worker process {os.getpid()} initialized with a fresh S3 client.")
+
 
 # Expose the configured app
 app = celery_app
\ No newline at end of file
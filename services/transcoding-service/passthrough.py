@@ -0,0 +1,135 @@
+# ./services/transcoding-service/passthrough.py
+"""
+Jobs whose input already is the requested output format.
+
+Converting an MP3 to MP3 or a FLAC to FLAC with FFmpeg only re-encodes the
+same content (losing quality, for lossy codecs). Such jobs are answered with
+a server-side S3 copy of the input instead: no download, no FFmpeg run, no
+upload.
+
+The input counts as the requested format when:
+  - the container sniffed at upload time is the format's container, and
+  - the uploaded file's extension is one of the format's extensions (the
+    sniffer reports MP4 and MOV as the same ISO container), and
+  - for formats promising particular codecs (mp4: H.264/AAC, webm: VP9/Opus,
+    m4a: AAC/ALAC audio only), ffprobe finds exactly those codecs. ffprobe
+    reads only the container header, from a presigned URL.
+"""
+
+import json
+import logging
+import os
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+SAME_FORMAT_COPY_ENABLED = os.environ.get("SAME_FORMAT_COPY_ENABLED", "True").lower() in [
+    "true",
+    "1",
+    "t",
+]
+PROBE_TIMEOUT_SECONDS = int(os.environ.get("PROBE_TIMEOUT_SECONDS", 30))
+
+# Output format -> (containers from media_sniff, input file extensions)
+FORMAT_SOURCES = {
+    "mp4": ({"mp4"}, {"mp4", "m4v"}),
+    "mov": ({"mp4"}, {"mov"}),
+    "webm": ({"webm"}, {"webm"}),
+    "mkv": ({"matroska", "webm"}, {"mkv"}),
+    "avi": ({"avi"}, {"avi"}),
+    "mp3": ({"mp3"}, {"mp3"}),
+    "wav": ({"wav"}, {"wav"}),
+    "flac": ({"flac"}, {"flac"}),
+    "aac": ({"aac"}, {"aac"}),
+    "m4a": ({"mp4"}, {"m4a"}),
+}
+
+# Formats whose FFmpeg profile fixes the codecs: stream type -> allowed codecs
+REQUIRED_CODECS = {
+    "mp4": {"video": {"h264"}, "audio": {"aac"}},
+    "webm": {"video": {"vp9"}, "audio": {"opus"}},
+    "m4a": {"audio": {"aac", "alac"}},
+}
+
+CONTENT_TYPES = {
+    "mp4": "video/mp4",
+    "mov": "video/quicktime",
+    "webm": "video/webm",
+    "mkv": "video/x-matroska",
+    "avi": "video/x-msvideo",
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "flac": "audio/flac",
+    "aac": "audio/aac",
+    "m4a": "audio/mp4",
+}
+
+
+def content_type(output_format):
+    """MIME type stored with an output object."""
+    return CONTENT_TYPES.get(output_format, "application/octet-stream")
+
+
+def probe_codecs(source_url):
+    """Returns {stream type: set of codec names} from the container header, or None."""
+    command = [
+        FFPROBE_BINARY,
+        "-v",
+        "error",
+        "-show_entries",
+        "stream=codec_type,codec_name",
+        "-of",
+        "json",
+        source_url,
+    ]
+    try:
+        result = subprocess.run(
+            command, capture_output=True, text=True, check=False, timeout=PROBE_TIMEOUT_SECONDS
+        )
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        logger.warning(f"ffprobe could not run: {e}")
+        return None
+    if result.returncode != 0:
+        logger.warning(f"ffprobe failed (code {result.returncode}): {result.stderr[:500]}")
+        return None
+    try:
+        streams = json.loads(result.stdout).get("streams", [])
+    except ValueError:
+        return None
+    codecs = {}
+    for stream in streams:
+        codecs.setdefault(stream.get("codec_type"), set()).add(stream.get("codec_name"))
+    return codecs
+
+
+def can_copy(input_s3_key, input_container, output_format, source_url_fn):
+    """
+    Decides whether the job's output can be a plain copy of its input.
+
+    Args:
+        input_s3_key (str): Raw input key (keeps the uploaded file's extension).
+        input_container (str): Container sniffed at upload time ('' if unknown).
+        output_format (str): Requested output format.
+        source_url_fn (callable): Returns a presigned GET URL of the input;
+                                  only called when the codecs must be probed.
+    """
+    if not SAME_FORMAT_COPY_ENABLED or output_format not in FORMAT_SOURCES:
+        return False
+    containers, extensions = FORMAT_SOURCES[output_format]
+    extension = input_s3_key.rsplit(".", 1)[-1].lower() if "." in input_s3_key else ""
+    if input_container not in containers or extension not in extensions:
+        return False
+
+    required = REQUIRED_CODECS.get(output_format)
+    if not required:
+        return True
+    codecs = probe_codecs(source_url_fn())
+    if not codecs:
+        return False
+    for stream_type, allowed in required.items():
+        if not codecs.get(stream_type, set()) <= allowed:
+            return False
+    # Only streams FFmpeg would have produced (e.g. no subtitles or data tracks)
+    return set(codecs) <= set(required)
@@ -0,0 +1,175 @@
+# ./services/transcoding-service/previews.py
+"""
+Preview images for finished jobs: a thumbnail sprite sheet for video and a
+waveform PNG for audio.
+
+Previews are rendered from the transcoded output, read by FFmpeg straight
+from a presigned S3 URL, so the preview worker never downloads the full file:
+  - video: ffprobe reads only the container header for the duration, then
+    FFmpeg decodes keyframes only (`-skip_frame nokey`) and tiles PREVIEW_TILES
+    evenly spaced frames into one JPEG;
+  - audio: FFmpeg renders the whole track with `showwavespic`, which is
+    audio-only decoding and cheap.
+
+Runs are single-threaded and niced, so a preview never competes with a
+transcode for CPU.
+"""
+
+import logging
+import os
+import subprocess
+
+try:
+    from common import formats
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from common import formats
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+S3_PREVIEW_PREFIX = os.environ.get("S3_PREVIEW_PREFIX", "previews/")
+PREVIEW_TILES = int(os.environ.get("PREVIEW_TILES", 10))  # Frames in a video sprite sheet
+PREVIEW_COLUMNS = int(os.environ.get("PREVIEW_COLUMNS", 5))
+PREVIEW_TILE_WIDTH = int(os.environ.get("PREVIEW_TILE_WIDTH", 160))
+PREVIEW_WAVEFORM_SIZE = os.environ.get("PREVIEW_WAVEFORM_SIZE", "640x120")
+PREVIEW_TIMEOUT_SECONDS = int(os.environ.get("PREVIEW_TIMEOUT_SECONDS", 120))
+PREVIEW_NICENESS = int(os.environ.get("PREVIEW_NICENESS", 10))
+
+# Preview kinds
+KIND_SPRITE = "sprite"
+KIND_WAVEFORM = "waveform"
+
+CONTENT_TYPES = {KIND_SPRITE: "image/jpeg", KIND_WAVEFORM: "image/png"}
+EXTENSIONS = {KIND_SPRITE: "jpg", KIND_WAVEFORM: "png"}
+
+
+class PreviewError(Exception):
+    """Raised when a preview cannot be rendered."""
+
+    pass
+
+
+def preview_kind(output_format):
+    """Returns the preview kind for a job's output format."""
+    return KIND_WAVEFORM if formats.is_audio_only(output_format) else KIND_SPRITE
+
+
+def preview_key(job_id, kind):
+    """The S3 key a job's preview is stored under."""
+    return f"{S3_PREVIEW_PREFIX.strip('/')}/{job_id}.{EXTENSIONS[kind]}"
+
+
+def _lower_priority():
+    os.nice(PREVIEW_NICENESS)
+
+
+def _run(command):
+    try:
+        result = subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=PREVIEW_TIMEOUT_SECONDS,
+            preexec_fn=_lower_priority if PREVIEW_NICENESS else None,
+        )
+    except subprocess.TimeoutExpired as e:
+        raise PreviewError(f"{command[0]} timed out after {PREVIEW_TIMEOUT_SECONDS}s") from e
+    except FileNotFoundError as e:
+        raise PreviewError(f"{command[0]} not found") from e
+    if result.returncode != 0:
+        raise PreviewError(f"{command[0]} failed (code {result.returncode}): {result.stderr[:500]}")
+    return result.stdout
+
+
+def probe_duration(source_url):
+    """Returns the media duration in seconds from the container header, or None."""
+    output = _run(
+        [
+            FFPROBE_BINARY,
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            source_url,
+        ]
+    )
+    try:
+        return float(output.strip())
+    except ValueError:
+        return None
+
+
+def build_sprite_command(source_url, output_path, duration):
+    """FFmpeg command tiling PREVIEW_TILES evenly spaced keyframes into one JPEG."""
+    rows = -(-PREVIEW_TILES // PREVIEW_COLUMNS)  # Ceiling division
+    interval = max(duration / PREVIEW_TILES, 0.1) if duration else 10
+    video_filter = (
+        f"fps=1/{interval:.3f},scale={PREVIEW_TILE_WIDTH}:-2,"
+        f"tile={PREVIEW_COLUMNS}x{rows}"
+    )
+    return [
+        FFMPEG_BINARY,
+        "-skip_frame",
+        "nokey",  # Decode keyframes only
+        "-i",
+        source_url,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-an",
+        "-vf",
+        video_filter,
+        "-frames:v",
+        "1",
+        "-q:v",
+        "5",
+        "-threads",
+        "1",
+        output_path,
+    ]
+
+
+def build_waveform_command(source_url, output_path):
+    """FFmpeg command rendering the whole track as a single waveform PNG."""
+    return [
+        FFMPEG_BINARY,
+        "-i",
+        source_url,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-filter_complex",
+        f"aformat=channel_layouts=mono,showwavespic=s={PREVIEW_WAVEFORM_SIZE}:colors=#3273dc",
+        "-frames:v",
+        "1",
+        "-threads",
+        "1",
+        output_path,
+    ]
+
+
+def render(source_url, output_path, kind):
+    """
+    Renders a preview of `source_url` to `output_path`.
+
+    Raises:
+        PreviewError: If FFmpeg/ffprobe fails or produces no image.
+    """
+    if kind == KIND_WAVEFORM:
+        command = build_waveform_command(source_url, output_path)
+    else:
+        command = build_sprite_command(source_url, output_path, probe_duration(source_url))
+    logger.debug(f"Rendering {kind} preview to {output_path}")  # Never log the presigned URL
+    _run(command)
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        raise PreviewError("Preview image missing after a successful run")
@@ -0,0 +1,161 @@
+# ./services/transcoding-service/scheduler.py
+"""
+Per-node CPU scheduler for FFmpeg runs.
+
+Celery runs TRANSCODING_CONCURRENCY prefork children per node, and each one
+spawns FFmpeg. Left alone, every FFmpeg starts one thread per core, so N
+children oversubscribe the node N times over. This module splits the CPUs
+this worker may use into one slot per child and hands each FFmpeg run:
+  - a CPU set (applied with sched_setaffinity), and
+  - a thread count (passed as `-threads`), scaled down for cheap jobs.
+
+Slots are claimed with non-blocking file locks, so the prefork children
+coordinate without talking to each other. A lock is released automatically
+if a child dies.
+"""
+
+import contextlib
+import fcntl
+import logging
+import os
+
+try:
+    from common import formats
+except ImportError:
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from common import formats
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+TRANSCODING_CONCURRENCY = int(os.environ.get("TRANSCODING_CONCURRENCY", 1))
+SCHEDULER_LOCK_DIR = os.environ.get("SCHEDULER_LOCK_DIR", "/tmp/transcoder-slots")
+SCHEDULER_PIN_CPUS = os.environ.get("SCHEDULER_PIN_CPUS", "True").lower() in ["true", "1", "t"]
+# Inputs below this size are cheap enough that a couple of threads suffice
+SMALL_INPUT_BYTES = int(os.environ.get("SCHEDULER_SMALL_INPUT_BYTES", 50 * 1024 * 1024))
+
+# Estimated cost classes
+COST_AUDIO = "audio"  # Audio encoders are effectively single-threaded
+COST_LIGHT = "light"  # Short/small video
+COST_HEAVY = "heavy"  # Everything else
+
+
+def available_cpus():
+    """Returns the sorted CPU IDs this process may run on."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        return list(range(os.cpu_count() or 1))
+
+
+def cpu_slots(cpus=None, concurrency=TRANSCODING_CONCURRENCY):
+    """
+    Partitions the CPUs into `concurrency` contiguous slots.
+
+    With more workers than CPUs, slots wrap around and share CPUs.
+    """
+    cpus = cpus or available_cpus()
+    concurrency = max(1, concurrency)
+    if concurrency >= len(cpus):
+        return [(cpus[index % len(cpus)],) for index in range(concurrency)]
+    base, extra = divmod(len(cpus), concurrency)
+    slots, start = [], 0
+    for index in range(concurrency):
+        size = base + (1 if index < extra else 0)
+        slots.append(tuple(cpus[start : start + size]))
+        start += size
+    return slots
+
+
+def estimate_cost(input_path, output_format):
+    """Classifies a job by expected encoder load, from output format and input size."""
+    if formats.is_audio_only(output_format):
+        return COST_AUDIO
+    try:
+        size = os.path.getsize(input_path)
+    except OSError:
+        return COST_HEAVY
+    return COST_LIGHT if size < SMALL_INPUT_BYTES else COST_HEAVY
+
+
+def threads_for(cost, slot_size):
+    """Number of FFmpeg threads to use for a job of this cost in a slot of this size."""
+    if cost == COST_AUDIO:
+        return 1
+    if cost == COST_LIGHT:
+        return max(1, min(2, slot_size))
+    return max(1, slot_size)
+
+
+class Allocation:
+    """CPU set and thread count granted to one FFmpeg run."""
+
+    def __init__(self, slot, cpus, threads, cost):
+        self.slot = slot
+        self.cpus = cpus
+        self.threads = threads
+        self.cost = cost
+
+    def preexec_fn(self):
+        """Returns a subprocess preexec_fn that pins the child to this CPU set (or None)."""
+        if not SCHEDULER_PIN_CPUS or not self.cpus or not hasattr(os, "sched_setaffinity"):
+            return None
+        cpus = set(self.cpus)
+        return lambda: os.sched_setaffinity(0, cpus)
+
+    def __repr__(self):
+        return f"Allocation(slot={self.slot}, cpus={list(self.cpus)}, threads={self.threads}, cost={self.cost})"
+
+
+def _try_lock_slot(index):
+    os.makedirs(SCHEDULER_LOCK_DIR, exist_ok=True)
+    handle = open(os.path.join(SCHEDULER_LOCK_DIR, f"slot-{index}.lock"), "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return handle
+    except OSError:
+        handle.close()
+        return None
+
+
+@contextlib.contextmanager
+def allocate(input_path, output_format):
+    """
+    Claims a free CPU slot for the duration of one FFmpeg run.
+
+    Usage:
+        with scheduler.allocate(local_input_path, output_format) as allocation:
+            subprocess.run(cmd, preexec_fn=allocation.preexec_fn())
+
+    If every slot is taken (concurrency misconfigured), the run falls back to
+    all CPUs rather than waiting.
+    """
+    slots = cpu_slots()
+    cost = estimate_cost(input_path, output_format)
+    handle, slot_index = None, None
+    for index in range(len(slots)):
+        handle = _try_lock_slot(index)
+        if handle:
+            slot_index = index
+            break
+
+    if handle is None:
+        cpus = tuple(available_cpus())
+        logger.warning(
+            f"No free CPU slot out of {len(slots)} (is TRANSCODING_CONCURRENCY correct?); using all CPUs."
+        )
+    else:
+        cpus = slots[slot_index]
+    if cost == COST_AUDIO:
+        cpus = cpus[:1]
+
+    allocation = Allocation(slot_index, cpus, threads_for(cost, len(cpus)), cost)
+    logger.info(f"Scheduler granted {allocation}")
+    try:
+        yield allocation
+    finally:
+        if handle:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
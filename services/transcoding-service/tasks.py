@@ -8,15 +8,22 @@ import time
 import redis
 from botocore.exceptions import ClientError
 from celery import current_app, shared_task
+from celery.exceptions import Retry
 
 # Important: Ensure 'common' is accessible in PYTHONPATH
 try:
-    from common import storage
+    from common import fair_queue, formats, job_store, storage, upload_sessions
 except ImportError:
     import sys
 
     sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-    from common import storage
+    from common import fair_queue, formats, job_store, storage, upload_sessions
+
+import audio
+import backlog
+import passthrough
+import previews
+import scheduler
 
 # Logger instance
 logger = logging.getLogger(__name__)
@@ -24,9 +31,32 @@ logger = logging.getLogger(__name__)
 # --- Configuration (from environment loaded by celery_app) ---
 REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
 S3_PROCESSED_PREFIX = os.environ.get("S3_PROCESSED_PREFIX", "processed/")
+S3_RAW_PREFIX = os.environ.get("S3_RAW_PREFIX", "raw/")
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")  # Overridable for benchmarks
 NOTIFICATION_TASK_NAME = os.environ.get(
     "NOTIFICATION_TASK_NAME", "notification.tasks.send_notification_email"
 )  # Name of the notification task
+TRANSCODING_POOL = "transcoding"  # Fair-queue pool fed by the API Gateway
+TRANSCODING_QUEUE = "transcoding_queue"  # Celery queue carrying the tickets
+TRANSCODE_TICKET_TASK = "transcoding.tasks.transcode_next"
+PREVIEW_TASK = "transcoding.tasks.generate_preview"
+PREVIEW_QUEUE = "preview_queue"  # Low-priority queue, consumed by the preview worker
+PREVIEWS_ENABLED = os.environ.get("PREVIEWS_ENABLED", "True").lower() in ["true", "1", "t"]
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", 100))
+# Janitor settings (see sweep_jobs)
+JANITOR_BATCH_SIZE = int(os.environ.get("JANITOR_BATCH_SIZE", 500))
+RAW_RETENTION_SECONDS = int(
+    os.environ.get("RAW_RETENTION_SECONDS", 3600)
+)  # Keep raw inputs this long after the job finished
+STUCK_PENDING_SECONDS = int(
+    os.environ.get("STUCK_PENDING_SECONDS", 86400)
+)  # PENDING longer than this means the Celery message was lost
+STUCK_PROCESSING_SECONDS = int(
+    os.environ.get("STUCK_PROCESSING_SECONDS", 3 * 3600)
+)  # PROCESSING without an update or heartbeat for this long means the worker died
+JOB_HEARTBEAT_SECONDS = int(
+    os.environ.get("JOB_HEARTBEAT_SECONDS", 300)
+)  # How often a running FFmpeg's job is marked alive (well below STUCK_PROCESSING_SECONDS)
 
 # Redis Connection Pool (more efficient for frequent connections)
 try:
@@ -47,25 +77,25 @@ def get_redis_connection():
 
 
 def update_job_status(
-    job_id, status, error_message=None, output_key=None, download_url=None
+    job_id, status, error_message=None, output_key=None, output_format=None
 ):
-    """Updates the job status and details in Redis."""
+    """
+    Updates the job status and details in the shared job store.
+
+    Returns:
+        bool: What job_store.update_job returned (False if the job had already
+              finished), or None if Redis could not be reached.
+    """
     try:
         r = get_redis_connection()
-        job_key = f"job:{job_id}"
-        update_data = {"status": status, "last_updated": int(time.time())}
-        if error_message:
-            # Limit error message length stored in Redis
-            update_data["error"] = str(error_message)[:1024]
-        if output_key:
-            update_data["output_s3_key"] = output_key
-        if download_url:
-            update_data["download_url"] = download_url
-
-        r.hset(job_key, mapping=update_data)
-        logger.info(f"Job {job_id}: Status updated to {status} in Redis.")
-        # If COMPLETED or FAILED, maybe set an expiry on the main job key if desired?
-        # r.expire(job_key, 86400 * 7) # e.g., expire after 7 days
+        return job_store.update_job(
+            r,
+            job_id,
+            status,
+            error_message=error_message,
+            output_key=output_key,
+            output_format=output_format,
+        )
     except redis.RedisError as e:
         logger.error(f"Job {job_id}: Redis error updating status to {status}: {e}")
     except ConnectionError as e:
@@ -74,13 +104,53 @@ def update_job_status(
         )
     except Exception as e:
         logger.error(f"Job {job_id}: Unexpected error updating Redis status: {e}")
+    return None
 
 
-def build_ffmpeg_command(input_path, output_path, output_format):
-    """Constructs the FFmpeg command line."""
+def heartbeat_job(job_id):
+    """Marks a PROCESSING job alive, so the janitor does not fail a long encode."""
+    try:
+        job_store.heartbeat(get_redis_connection(), job_id)
+    except (redis.RedisError, ConnectionError) as e:
+        logger.warning(f"Job {job_id}: Could not record heartbeat: {e}")
+
+
+def run_ffmpeg(job_id, command, preexec_fn=None):
+    """
+    Runs FFmpeg like `subprocess.run(capture_output=True, text=True)`, recording
+    a job heartbeat every JOB_HEARTBEAT_SECONDS while it runs.
+
+    Returns:
+        subprocess.CompletedProcess: The finished run.
+    """
+    heartbeat_job(job_id)
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        preexec_fn=preexec_fn,
+    )
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=JOB_HEARTBEAT_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                heartbeat_job(job_id)
+    except BaseException:
+        # E.g. a Celery time limit: don't leave FFmpeg running without a job
+        process.kill()
+        process.wait()
+        raise
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def build_ffmpeg_command(input_path, output_path, output_format, threads=None):
+    """Constructs the FFmpeg command line. `threads` caps encoder threads (see scheduler)."""
     # Basic command, can be expanded with more options/presets
     command = [
-        "ffmpeg",
+        FFMPEG_BINARY,
         "-i",
         input_path,  # Input file
         "-y",  # Overwrite output file if exists
@@ -120,12 +190,8 @@ def build_ffmpeg_command(input_path, output_path, output_format):
                 "128k",
             ]
         )
-    elif output_format == "mp3":
-        command.extend(
-            ["-vn", "-c:a", "libmp3lame", "-q:a", "2"]
-        )  # VBR quality setting 2
-    elif output_format == "aac":
-        command.extend(["-vn", "-c:a", "aac", "-b:a", "128k"])
+    elif output_format in audio.ENCODE_ARGS:
+        command.extend(["-vn"] + audio.ENCODE_ARGS[output_format])
     # Add more format handling...
     else:
         # Default: let FFmpeg try to figure it out based on extension
@@ -134,12 +200,13 @@ def build_ffmpeg_command(input_path, output_path, output_format):
         )
         pass
 
+    if threads:
+        command.extend(["-threads", str(threads)])
     command.append(output_path)  # Output file
     return command
 
 
-# --- Celery Task ---
-# @shared_task(bind=True, max_retries=2, default_retry_delay=30, acks_late=True)
+# --- Celery Tasks ---
 @shared_task(
     bind=True,
     name="transcoding.tasks.transcode_media",
@@ -149,9 +216,92 @@ def build_ffmpeg_command(input_path, output_path, output_format):
 )
 def transcode_media(self, payload):
     """
-    Celery task to download, transcode, upload media, and update status.
+    Celery task to transcode one specific job (payload carried in the message).
+
+    Used when the gateway cannot reach the fair queue; normally jobs arrive
+    through `transcode_next`.
+    """
+    return run_transcode(self, payload)
+
+
+@shared_task(
+    bind=True,
+    name="transcoding.tasks.transcode_next",
+    max_retries=2,
+    default_retry_delay=30,
+    acks_late=True,
+)
+def transcode_next(self, payload=None):
+    """
+    Ticket task: pulls the next job from the per-user fair queue and transcodes it.
+
+    The message itself carries no job; which job runs is decided by
+    common.fair_queue at execution time. Retries carry the dequeued payload so
+    they re-run the same job. If this worker dies mid-job, the redelivered
+    ticket (same task ID) gets the same job back from the in-flight hash.
+    """
+    return run_ticket(self, TRANSCODING_POOL, payload)
+
+
+@shared_task(
+    bind=True,
+    name=audio.AUDIO_TICKET_TASK,
+    max_retries=2,
+    default_retry_delay=30,
+    acks_late=True,
+)
+def audio_next(self, payload=None):
+    """
+    Ticket task for audio-only outputs: like `transcode_next`, but pulls from
+    the audio pool, which the lightweight audio workers consume (see audio.py).
+    """
+    return run_ticket(self, audio.AUDIO_POOL, payload)
+
+
+def run_ticket(task, pool, payload=None):
+    """Dequeues the next unfinished job of a fair-queue pool (unless retrying one) and runs it."""
+    r = get_redis_connection()
+    ticket_id = task.request.id
+    try:
+        while payload is None:
+            payload = fair_queue.dequeue(r, pool, ticket_id)
+            if payload is None:
+                logger.info(f"Ticket {ticket_id}: Fair queue is empty, nothing to do.")
+                return {"status": "skipped", "reason": "Fair queue empty"}
+            if job_store.get_status(r, payload.get("job_id")) in job_store.TERMINAL_STATUSES:
+                # E.g. failed by the janitor while it waited; drop it and take the next one
+                logger.info(f"Ticket {ticket_id}: Job {payload.get('job_id')} already finished, skipping.")
+                fair_queue.ack(r, pool, ticket_id)
+                payload = None
+        return run_transcode(task, payload)
+    finally:
+        fair_queue.ack(r, pool, ticket_id)
+
+
+def run_transcode(task, payload):
+    """
+    Runs one job, recording unexpected crashes in the job store.
+
+    Without a result backend a task that raises leaves no trace anywhere, so
+    any exception other than a retry marks the job FAILED before propagating.
+    """
+    try:
+        return _transcode_job(task, payload)
+    except Retry:
+        raise
+    except Exception as e:
+        job_id = payload.get("job_id")
+        logger.exception(f"Job {job_id}: Transcoding task crashed: {e}")
+        update_job_status(job_id, "FAILED", error_message=f"Unexpected worker error: {e}")
+        raise
+
+
+def _transcode_job(task, payload):
+    """
+    Downloads, transcodes and uploads media for one job, updating its status.
 
     Args:
+        task: The bound Celery task running this job (used for retries).
         payload (dict): A dictionary containing job details:
             - job_id (str)
             - input_s3_key (str)
@@ -177,18 +327,67 @@ def transcode_media(self, payload):
     logger.info(
         f"Job {job_id}: Starting transcoding task for {input_s3_key} -> {output_format}"
     )
-    update_job_status(job_id, "PROCESSING")
+    if update_job_status(job_id, "PROCESSING") is False:
+        # Finished meanwhile (e.g. failed by the janitor); never run it again
+        logger.warning(f"Job {job_id}: Job already finished, not transcoding it again.")
+        return {"status": "skipped", "reason": "Job already finished"}
+
+    local_output_filename = (
+        f"{job_id}.{output_format}"  # Use job_id for unique output name
+    )
+    output_s3_key = f"{S3_PROCESSED_PREFIX.strip('/')}/{local_output_filename}"  # Construct output S3 key
+    # Stored with the output: lineage for anyone looking at the bucket, and
+    # tags that lifecycle rules and cost reports can select on
+    output_args = storage.object_args(
+        ContentType=passthrough.content_type(output_format),
+        Metadata={"job-id": job_id, "source-key": input_s3_key},
+        Tags={"job-id": job_id, "kind": "output"},
+    )
+
+    # 0. Input already in the requested format: copy it inside S3 instead
+    try:
+        same_format = passthrough.can_copy(
+            input_s3_key,
+            payload.get("input_container") or "",
+            output_format,
+            lambda: storage.create_presigned_url(
+                input_s3_key, expiration=passthrough.PROBE_TIMEOUT_SECONDS * 3
+            ),
+        )
+    except storage.S3Error as e:
+        logger.warning(f"Job {job_id}: Could not check for a same-format copy: {e}")
+        same_format = False
+    if same_format:
+        try:
+            start_time = time.time()
+            storage.copy_object(input_s3_key, output_s3_key, ExtraArgs=output_args)
+            logger.info(
+                f"Job {job_id}: Input already is {output_format}; copied in S3 in {time.time() - start_time:.2f}s."
+            )
+            return _finish_job(
+                job_id, output_s3_key, output_format, notification_email, original_filename
+            )
+        except storage.S3Error as e:
+            # Fall back to a regular transcode, which reports its own errors
+            logger.warning(f"Job {job_id}: Server-side copy failed, transcoding instead: {e}")
+
+    # 0b. Audio-only output: extract the audio stream straight from S3
+    if audio.AUDIO_FAST_PATH_ENABLED and formats.is_audio_only(output_format):
+        result = _extract_audio(job_id, input_s3_key, output_s3_key, output_format, output_args)
+        if result == "no_audio":
+            return {"status": "failed", "error": "Input has no audio stream"}
+        if result == "stored":
+            return _finish_job(
+                job_id, output_s3_key, output_format, notification_email, original_filename
+            )
+        # Otherwise fall back to downloading the input and transcoding it locally
 
     # Use a temporary directory for downloaded/processed files
     with tempfile.TemporaryDirectory() as temp_dir:
         local_input_path = os.path.join(
             temp_dir, os.path.basename(input_s3_key)
         )  # Use S3 key basename for temp file
-        local_output_filename = (
-            f"{job_id}.{output_format}"  # Use job_id for unique output name
-        )
         local_output_path = os.path.join(temp_dir, local_output_filename)
-        output_s3_key = f"{S3_PROCESSED_PREFIX.strip('/')}/{local_output_filename}"  # Construct output S3 key
 
         # 1. Download Input File from S3
         try:
@@ -211,16 +410,21 @@ def transcode_media(self, payload):
 
         # 2. Run FFmpeg
         try:
-            ffmpeg_command = build_ffmpeg_command(
-                local_input_path, local_output_path, output_format
-            )
-            logger.info(f"Job {job_id}: Executing FFmpeg: {' '.join(ffmpeg_command)}")
-            start_time = time.time()
-            # Use subprocess.run, capture stderr
-            result = subprocess.run(
-                ffmpeg_command, capture_output=True, text=True, check=False
-            )  # check=False allows us to inspect errors
-            ffmpeg_time = time.time() - start_time
+            # Claim this child's CPU slot so concurrent FFmpeg runs don't oversubscribe the node
+            with scheduler.allocate(local_input_path, output_format) as allocation:
+                ffmpeg_command = build_ffmpeg_command(
+                    local_input_path,
+                    local_output_path,
+                    output_format,
+                    threads=allocation.threads,
+                )
+                logger.info(f"Job {job_id}: Executing FFmpeg: {' '.join(ffmpeg_command)}")
+                start_time = time.time()
+                # Captures stderr; heartbeats keep the janitor off long encodes
+                result = run_ffmpeg(
+                    job_id, ffmpeg_command, preexec_fn=allocation.preexec_fn()
+                )
+                ffmpeg_time = time.time() - start_time
 
             if result.returncode != 0:
                 # FFmpeg failed
@@ -238,6 +442,13 @@ def transcode_media(self, payload):
                 logger.info(
                     f"Job {job_id}: FFmpeg completed successfully in {ffmpeg_time:.2f} seconds."
                 )
+                try:
+                    # Feeds the realtime factor the backlog exporter scales on
+                    backlog.record_encode(
+                        get_redis_connection(), job_id, output_format, ffmpeg_time, local_input_path
+                    )
+                except (redis.RedisError, ConnectionError) as e:
+                    logger.warning(f"Job {job_id}: Could not record realtime factor: {e}")
 
         except FileNotFoundError:
             logger.error(
@@ -274,23 +485,26 @@ def transcode_media(self, payload):
                 f"Job {job_id}: Uploading {local_output_path} to {output_s3_key}"
             )
             start_time = time.time()
-            storage.upload_file(local_output_path, output_s3_key)
+            storage.upload_file(local_output_path, output_s3_key, ExtraArgs=output_args)
             upload_time = time.time() - start_time
             logger.info(f"Job {job_id}: Upload complete in {upload_time:.2f} seconds.")
         except (ClientError, Exception) as e:
             logger.error(
                 f"Job {job_id}: Failed to upload processed file {output_s3_key}: {e}"
             )
-            update_job_status(
-                job_id, "FAILED", error_message=f"Failed to upload processed file: {e}"
-            )
-            # Retry might be appropriate here for temporary S3 issues
+            # Retry might be appropriate here for temporary S3 issues. The job
+            # stays PROCESSING meanwhile: a FAILED job is never picked up again.
             try:
-                raise self.retry(exc=e)
-            except self.MaxRetriesExceededError:
+                raise task.retry(exc=e, args=[payload])
+            except Retry:
+                raise
+            except task.MaxRetriesExceededError:
                 logger.error(
                     f"Job {job_id}: Max retries exceeded for S3 upload failure."
                 )
+                update_job_status(
+                    job_id, "FAILED", error_message=f"Failed to upload processed file: {e}"
+                )
                 return {
                     "status": "failed",
                     "error": f"Upload failed after retries: {e}",
@@ -299,57 +513,363 @@ def transcode_media(self, payload):
                 logger.error(
                     f"Job {job_id}: Error during retry mechanism for S3 upload: {retry_exc}"
                 )
+                update_job_status(
+                    job_id, "FAILED", error_message=f"Failed to upload processed file: {e}"
+                )
                 return {
                     "status": "failed",
                     "error": f"Error during retry mechanism for S3 upload: {retry_exc}",
                 }
 
-        # 4. Generate Download URL (Optional but good to store with job)
-        download_url = None
-        try:
-            download_url = storage.create_presigned_url(output_s3_key)
-            logger.info(f"Job {job_id}: Generated download URL for {output_s3_key}")
-        except (ClientError, Exception) as e:
-            logger.warning(
-                f"Job {job_id}: Failed to generate pre-signed URL for {output_s3_key}, proceeding without it: {e}"
-            )
-            # Don't fail the whole job, just log the warning. Notification will be sent without URL in metadata.
+        return _finish_job(
+            job_id, output_s3_key, output_format, notification_email, original_filename
+        )
+
+    # End of `with tempfile.TemporaryDirectory()` - cleanup happens automatically
+
+
+def _extract_audio(job_id, input_s3_key, output_s3_key, output_format, output_args):
+    """
+    Audio fast path: FFmpeg reads only the audio of the input through a
+    presigned URL, copying the stream when its codec already fits.
+
+    Returns:
+        str: "stored" once the output is in S3, "no_audio" if the input has
+             no audio stream (the job is marked FAILED), or None when the
+             regular download-and-transcode path should run instead.
+    """
+    try:
+        source_url = storage.create_presigned_url(
+            input_s3_key, expiration=audio.AUDIO_SOURCE_URL_SECONDS
+        )
+    except storage.S3Error as e:
+        logger.warning(f"Job {job_id}: No presigned URL for the audio fast path: {e}")
+        return None
 
-        # 5. Update Status to COMPLETED in Redis
+    audio_codecs = audio.probe_audio_codecs(source_url)
+    if audio_codecs is not None and not audio_codecs:
+        logger.error(f"Job {job_id}: Input has no audio stream, cannot produce {output_format}.")
         update_job_status(
-            job_id, "COMPLETED", output_key=output_s3_key, download_url=download_url
+            job_id, "FAILED", error_message="Input file has no audio stream"
         )
+        return "no_audio"
+    copy = audio.can_copy_audio(audio_codecs, output_format)
 
-        # 6. Trigger Notification Task
-        if notification_email and NOTIFICATION_TASK_NAME:
-            try:
-                notification_payload = {
-                    # ... payload details ...
-                    "job_id": job_id,
-                    "notification_email": notification_email,
-                    "original_filename": original_filename,
-                    "output_format": output_format,
-                    "output_s3_key": output_s3_key,
-                }
-                # --- MODIFIED: Specify the queue ---
-                current_app.send_task(
-                    NOTIFICATION_TASK_NAME,
-                    args=[notification_payload],
-                    queue="notification_queue",  # <--- ADD THIS
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_output_path = os.path.join(temp_dir, os.path.basename(output_s3_key))
+        try:
+            with scheduler.allocate(source_url, output_format) as allocation:
+                ffmpeg_command = audio.build_audio_command(
+                    source_url,
+                    local_output_path,
+                    output_format,
+                    copy=copy,
+                    threads=None if copy else allocation.threads,
                 )
-                # --- END MODIFICATION ---
+                # The presigned URL is a credential; keep it out of the logs
                 logger.info(
-                    f"Job {job_id}: Notification task sent for {notification_email} to 'notification_queue'"
+                    f"Job {job_id}: Extracting audio ({'copy' if copy else 'encode'}, "
+                    f"source codecs {sorted(audio_codecs or [])}) from {input_s3_key}"
+                )
+                start_time = time.time()
+                result = run_ffmpeg(
+                    job_id, ffmpeg_command, preexec_fn=allocation.preexec_fn()
                 )
-            except Exception as e:
-                # Log error but don't fail the transcoding task itself
-                logger.error(f"Job {job_id}: Failed to send notification task: {e}")
-        else:
+                ffmpeg_time = time.time() - start_time
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Job {job_id}: Audio fast path could not run FFmpeg: {e}")
+            return None
+        if (
+            result.returncode != 0
+            or not os.path.exists(local_output_path)
+            or os.path.getsize(local_output_path) == 0
+        ):
+            logger.warning(
+                f"Job {job_id}: Audio fast path failed (code {result.returncode}), "
+                f"transcoding the downloaded input instead: {(result.stderr or '')[:500]}"
+            )
+            return None
+        logger.info(f"Job {job_id}: Audio extracted in {ffmpeg_time:.2f} seconds.")
+        try:
+            backlog.record_encode(
+                get_redis_connection(), job_id, output_format, ffmpeg_time, source_url
+            )
+        except (redis.RedisError, ConnectionError) as e:
+            logger.warning(f"Job {job_id}: Could not record realtime factor: {e}")
+
+        try:
+            start_time = time.time()
+            storage.upload_file(local_output_path, output_s3_key, ExtraArgs=output_args)
+            logger.info(f"Job {job_id}: Upload complete in {time.time() - start_time:.2f} seconds.")
+        except storage.S3Error as e:
+            # The regular path uploads again, with retries
+            logger.warning(f"Job {job_id}: Uploading the extracted audio failed: {e}")
+            return None
+    return "stored"
+
+
+def _finish_job(job_id, output_s3_key, output_format, notification_email, original_filename):
+    """Marks a job whose output is stored as COMPLETED and queues its follow-up tasks."""
+    # 4. Update Status to COMPLETED in Redis
+    # The download URL is presigned on read by the API Gateway, so only the key is stored
+    if (
+        update_job_status(
+            job_id, "COMPLETED", output_key=output_s3_key, output_format=output_format
+        )
+        is False
+    ):
+        # Already FAILED (e.g. by the janitor): don't notify about a result users don't see
+        logger.warning(f"Job {job_id}: Job already finished; output stored but not announced.")
+        return {"status": "failed", "error": "Job already finished"}
+
+    # 5. Trigger Notification Task
+    if notification_email and NOTIFICATION_TASK_NAME:
+        try:
+            notification_payload = {
+                # ... payload details ...
+                "job_id": job_id,
+                "notification_email": notification_email,
+                "original_filename": original_filename,
+                "output_format": output_format,
+                "output_s3_key": output_s3_key,
+            }
+            # --- MODIFIED: Specify the queue ---
+            current_app.send_task(
+                NOTIFICATION_TASK_NAME,
+                args=[notification_payload],
+                queue="notification_queue",  # <--- ADD THIS
+            )
+            # --- END MODIFICATION ---
             logger.info(
-                f"Job {job_id}: Skipping notification task (no email or task name configured)."
+                f"Job {job_id}: Notification task sent for {notification_email} to 'notification_queue'"
             )
+        except Exception as e:
+            # Log error but don't fail the transcoding task itself
+            logger.error(f"Job {job_id}: Failed to send notification task: {e}")
+    else:
+        logger.info(
+            f"Job {job_id}: Skipping notification task (no email or task name configured)."
+        )
 
-        logger.info(f"Job {job_id}: Transcoding task finished successfully.")
-        return {"status": "success", "output_s3_key": output_s3_key}
+    # 6. Queue the preview (sprite sheet / waveform) on the low-priority queue
+    if PREVIEWS_ENABLED:
+        try:
+            current_app.send_task(
+                PREVIEW_TASK,
+                args=[
+                    {
+                        "job_id": job_id,
+                        "output_s3_key": output_s3_key,
+                        "output_format": output_format,
+                    }
+                ],
+                queue=PREVIEW_QUEUE,
+            )
+        except Exception as e:
+            # Previews are optional; never fail the job over them
+            logger.error(f"Job {job_id}: Failed to queue preview task: {e}")
 
-    # End of `with tempfile.TemporaryDirectory()` - cleanup happens automatically
+    logger.info(f"Job {job_id}: Transcoding task finished successfully.")
+    return {"status": "success", "output_s3_key": output_s3_key}
+
+
+@shared_task(
+    bind=True,
+    name="transcoding.tasks.generate_preview",
+    max_retries=1,
+    default_retry_delay=60,
+    ignore_result=True,
+)
+def generate_preview(self, payload):
+    """
+    Renders a preview image of a completed job's output and records its key.
+
+    FFmpeg reads the output through a presigned URL, so only the parts it
+    needs are fetched. Failures are logged and never touch the job status.
+
+    Args:
+        payload (dict): job_id, output_s3_key and output_format of the job.
+    """
+    job_id = payload.get("job_id")
+    output_s3_key = payload.get("output_s3_key")
+    if not job_id or not output_s3_key:
+        logger.error(f"Preview task received with missing payload data: {payload}")
+        return
+
+    kind = previews.preview_kind(payload.get("output_format"))
+    preview_s3_key = previews.preview_key(job_id, kind)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_path = os.path.join(temp_dir, os.path.basename(preview_s3_key))
+        try:
+            source_url = storage.create_presigned_url(
+                output_s3_key, expiration=previews.PREVIEW_TIMEOUT_SECONDS * 3
+            )
+            start_time = time.time()
+            previews.render(source_url, local_path, kind)
+            storage.upload_file(
+                local_path,
+                preview_s3_key,
+                ExtraArgs=storage.object_args(
+                    ContentType=previews.CONTENT_TYPES[kind],
+                    Metadata={"job-id": job_id, "source-key": output_s3_key},
+                    Tags={"job-id": job_id, "kind": "preview"},
+                    CacheControl="private, max-age=86400",
+                ),
+            )
+        except previews.PreviewError as e:
+            logger.warning(f"Job {job_id}: Could not render {kind} preview: {e}")
+            return
+        except storage.S3Error as e:
+            logger.warning(f"Job {job_id}: S3 error while generating preview: {e}")
+            try:
+                raise self.retry(exc=e)
+            except self.MaxRetriesExceededError:
+                return
+
+    logger.info(f"Job {job_id}: {kind} preview generated in {time.time() - start_time:.2f}s.")
+    try:
+        job_store.set_preview(get_redis_connection(), job_id, preview_s3_key)
+    except (redis.RedisError, ConnectionError) as e:
+        logger.error(f"Job {job_id}: Could not record preview key: {e}")
+
+
+def top_up_tickets(r):
+    """
+    Re-issues tickets when fair-queued jobs outnumber waiting Celery tickets
+    (e.g. a ticket message was lost). Surplus tickets are harmless: a ticket
+    that finds the fair queue empty just exits.
+    """
+    pools = [
+        (TRANSCODING_POOL, TRANSCODING_QUEUE, TRANSCODE_TICKET_TASK),
+        (audio.AUDIO_POOL, audio.AUDIO_QUEUE, audio.AUDIO_TICKET_TASK),
+    ]
+    for pool, queue, ticket_task in pools:
+        queued = sum(fair_queue.depth(r, pool).values())
+        # The Redis broker keeps each Celery queue as a list named after the queue
+        waiting_tickets = r.llen(queue)
+        missing = queued - waiting_tickets
+        for _ in range(max(0, missing)):
+            current_app.send_task(ticket_task, queue=queue)
+        if missing > 0:
+            logger.warning(f"Re-issued {missing} {pool} ticket(s) for fair-queued jobs.")
+
+
+# --- Maintenance Tasks (scheduled by celery beat, see celery_app.beat_schedule) ---
+@shared_task(name="transcoding.tasks.reconcile_jobs", ignore_result=True)
+def reconcile_jobs():
+    """
+    Background repair pass: brings active job hashes in line with the Celery
+    result backend. This replaces the per-request backend read the gateway
+    used to do on every /status poll.
+
+    With task results ignored there is no backend to compare against; the job
+    hashes are then the only state, and jobs orphaned by a dead worker are
+    failed by the janitor (sweep_jobs) instead.
+    """
+    try:
+        r = get_redis_connection()
+        repaired = 0
+        if not current_app.conf.task_ignore_result:
+            repaired = job_store.reconcile_active_jobs(r, batch_size=RECONCILE_BATCH_SIZE)
+            if repaired:
+                logger.info(f"Reconciler repaired {repaired} job(s) from the Celery backend.")
+        top_up_tickets(r)
+        return repaired
+    except (redis.RedisError, ConnectionError) as e:
+        logger.error(f"Reconciler could not reach Redis: {e}")
+        return 0
+
+
+@shared_task(name="transcoding.tasks.sweep_jobs", ignore_result=True)
+def sweep_jobs():
+    """
+    Janitor pass over all job hashes (SCAN in batches), keeping Redis and S3 bounded:
+      - applies the retention TTL to finished jobs that have none,
+      - bulk-deletes raw inputs of finished jobs older than RAW_RETENTION_SECONDS,
+      - marks jobs stuck in PENDING, or in PROCESSING without a heartbeat, as FAILED,
+      - aborts resumable uploads abandoned longer than their session lifetime.
+    """
+    now = int(time.time())
+    stats = {"ttl_applied": 0, "raw_deleted": 0, "stuck_failed": 0, "uploads_aborted": 0}
+    try:
+        r = get_redis_connection()
+        for batch in job_store.scan_jobs(r, batch_size=JANITOR_BATCH_SIZE):
+            needs_ttl = []
+            raw_keys = {}  # s3_key -> job_id
+            for job_id, metadata, ttl in batch:
+                status = metadata.get("status")
+                submitted_at = int(metadata.get("timestamp") or 0)
+                last_updated = int(metadata.get("last_updated") or submitted_at)
+                # Running encodes heartbeat (see run_ffmpeg); only silence means a dead worker
+                last_seen = max(last_updated, int(metadata.get("heartbeat") or 0))
+
+                if status == "PENDING" and now - submitted_at > STUCK_PENDING_SECONDS:
+                    update_job_status(
+                        job_id, "FAILED", error_message="Job was never picked up by a worker."
+                    )
+                    stats["stuck_failed"] += 1
+                    continue
+                if status == "PROCESSING" and now - last_seen > STUCK_PROCESSING_SECONDS:
+                    update_job_status(
+                        job_id, "FAILED", error_message="Job timed out while processing."
+                    )
+                    stats["stuck_failed"] += 1
+                    continue
+                if status in job_store.ACTIVE_STATUSES:
+                    continue
+
+                # Finished (or partial/unknown) records: bound their lifetime
+                if ttl == -1:
+                    needs_ttl.append(job_id)
+                input_s3_key = metadata.get("input_s3_key")
+                if (
+                    status in job_store.TERMINAL_STATUSES
+                    and input_s3_key
+                    and not metadata.get("input_deleted")
+                    and now - last_updated >= RAW_RETENTION_SECONDS
+                ):
+                    raw_keys[input_s3_key] = job_id
+
+            if needs_ttl:
+                job_store.apply_ttl(r, needs_ttl)
+                stats["ttl_applied"] += len(needs_ttl)
+            if raw_keys:
+                try:
+                    failed_keys = set(storage.delete_objects(list(raw_keys)))
+                except storage.S3Error as e:
+                    logger.error(f"Janitor: bulk delete of raw inputs failed: {e}")
+                    continue
+                deleted_job_ids = [
+                    job_id for key, job_id in raw_keys.items() if key not in failed_keys
+                ]
+                job_store.mark_inputs_deleted(r, deleted_job_ids)
+                stats["raw_deleted"] += len(deleted_job_ids)
+    except (redis.RedisError, ConnectionError) as e:
+        logger.error(f"Janitor could not reach Redis: {e}")
+
+    stats["uploads_aborted"] = abort_stale_uploads(now)
+
+    logger.info(
+        f"Janitor pass done: {stats['ttl_applied']} TTL(s) applied, "
+        f"{stats['raw_deleted']} raw input(s) deleted, {stats['stuck_failed']} stuck job(s) failed, "
+        f"{stats['uploads_aborted']} abandoned upload(s) aborted."
+    )
+    return stats
+
+
+def abort_stale_uploads(now):
+    """
+    Aborts S3 multipart uploads under the raw prefix whose upload session has
+    certainly expired, so their stored parts stop costing storage.
+
+    Returns:
+        int: Number of uploads aborted.
+    """
+    cutoff = now - upload_sessions.UPLOAD_SESSION_TTL_SECONDS
+    try:
+        uploads = storage.list_multipart_uploads(Prefix=S3_RAW_PREFIX)
+    except storage.S3Error as e:
+        logger.error(f"Janitor: listing multipart uploads failed: {e}")
+        return 0
+    stale = [upload for upload in uploads if upload["Initiated"].timestamp() < cutoff]
+    return storage.abort_multipart_uploads(stale) if stale else 0
@@ -1,21 +1,23 @@
 # ./services/upload-service/app.py
 import logging
 import os
+import threading
 import uuid
 
-from botocore.exceptions import ClientError
 # from dotenv import dotenv_values
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from werkzeug.utils import secure_filename
 
 # Important: Ensure 'common' is accessible in PYTHONPATH
 try:
-    from common import storage
+    from common import media_sniff, storage, upload_sessions
 except ImportError:
     import sys
 
     sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-    from common import storage
+    from common import media_sniff, storage, upload_sessions
+
+import streaming
 
 # --- Configuration ---
 # Load .env file from project root
@@ -34,6 +36,29 @@ logger = logging.getLogger(__name__)
 
 # Configuration from environment
 S3_RAW_PREFIX = config.get("S3_RAW_PREFIX", "raw/")
+# Uploads one process streams at once; more get 503 + Retry-After right away
+# (see gunicorn.conf.py, which sizes the thread pool from this)
+UPLOAD_MAX_CONCURRENT = int(config.get("UPLOAD_MAX_CONCURRENT", 16))
+UPLOAD_RETRY_AFTER_SECONDS = int(config.get("UPLOAD_RETRY_AFTER_SECONDS", 5))
+UPLOAD_MAX_SIZE = upload_sessions.UPLOAD_MAX_SIZE  # Same limit as resumable uploads
+
+# --- In-flight Uploads ---
+# Memory per process stays around UPLOAD_MAX_CONCURRENT x
+# storage.S3_MAX_BUFFERED_PARTS x storage.S3_MULTIPART_CHUNKSIZE, however
+# large the files are.
+_upload_slots = threading.BoundedSemaphore(UPLOAD_MAX_CONCURRENT)
+_metrics_lock = threading.Lock()
+_active_uploads = {}  # s3_key -> MultipartFileReader
+_upload_results = {"stored": 0, "rejected": 0, "failed": 0, "busy": 0}
+_bytes_stored_total = 0
+
+
+def _count_result(result, reader=None):
+    global _bytes_stored_total
+    with _metrics_lock:
+        _upload_results[result] += 1
+        if reader is not None and result == "stored":
+            _bytes_stored_total += reader.bytes_read
 
 # --- Routes ---
 
@@ -62,28 +87,100 @@ def health_check():
         return jsonify({"status": "unhealthy", "reason": str(e)}), 500
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """In-flight and completed uploads of this process, in Prometheus text format."""
+    with _metrics_lock:
+        in_flight = len(_active_uploads)
+        in_flight_bytes = sum(reader.bytes_read for reader in _active_uploads.values())
+        results = dict(_upload_results)
+        bytes_stored = _bytes_stored_total
+    lines = [
+        "# HELP upload_service_uploads_in_flight Uploads currently streaming to S3.",
+        "# TYPE upload_service_uploads_in_flight gauge",
+        f"upload_service_uploads_in_flight {in_flight}",
+        "# HELP upload_service_upload_slots Uploads this process accepts at once.",
+        "# TYPE upload_service_upload_slots gauge",
+        f"upload_service_upload_slots {UPLOAD_MAX_CONCURRENT}",
+        "# HELP upload_service_in_flight_bytes File bytes received so far by uploads in flight.",
+        "# TYPE upload_service_in_flight_bytes gauge",
+        f"upload_service_in_flight_bytes {in_flight_bytes}",
+        "# HELP upload_service_uploads_total Finished upload requests by result.",
+        "# TYPE upload_service_uploads_total counter",
+    ]
+    lines += [f'upload_service_uploads_total{{result="{k}"}} {v}' for k, v in results.items()]
+    lines += [
+        "# HELP upload_service_stored_bytes_total File bytes stored in S3.",
+        "# TYPE upload_service_stored_bytes_total counter",
+        f"upload_service_stored_bytes_total {bytes_stored}",
+    ]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/upload", methods=["POST"])
 def handle_upload():
     """
     Handles the file upload, saves it to S3 raw prefix, returns the S3 key.
     Expects 'media_file' in the multipart/form-data.
+
+    The body is parsed as it arrives and streamed to S3 part by part, so
+    memory use does not depend on the file size. When all upload slots are
+    taken the request is refused with 503 before its body is read.
     """
     logger.info("Received request on /upload endpoint.")
 
-    if "media_file" not in request.files:
+    boundary = streaming.get_boundary(request.content_type)
+    if not boundary:
+        logger.warning("Upload request is not multipart/form-data.")
+        return jsonify({"error": "Expected a multipart/form-data body"}), 400
+    if request.content_length and request.content_length > UPLOAD_MAX_SIZE + streaming.MAX_FIELD_BYTES:
+        logger.warning(f"Rejected upload of {request.content_length} bytes (too large).")
+        response = jsonify({"error": f"File exceeds the {UPLOAD_MAX_SIZE} byte limit"})
+        response.status_code = 413
+        response.headers["Connection"] = "close"
+        return response
+
+    if not _upload_slots.acquire(blocking=False):
+        logger.warning(f"All {UPLOAD_MAX_CONCURRENT} upload slots busy; refusing upload.")
+        _count_result("busy")
+        response = jsonify({"error": "Upload service is busy, retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(UPLOAD_RETRY_AFTER_SECONDS)
+        response.headers["Connection"] = "close"  # Don't drain the unread body
+        return response
+    try:
+        response = app.make_response(_stream_upload(boundary))
+    finally:
+        _upload_slots.release()
+    if response.status_code >= 400:
+        response.headers["Connection"] = "close"  # The body may be partly unread
+    return response
+
+
+def _stream_upload(boundary):
+    reader = streaming.MultipartFileReader(
+        request.stream, boundary, "media_file", max_size=UPLOAD_MAX_SIZE
+    )
+    try:
+        found = reader.open()
+    except streaming.MultipartError as e:
+        logger.warning(f"Malformed upload request: {e}")
+        _count_result("rejected")
+        return jsonify({"error": str(e)}), 400
+    if not found:
         logger.warning("Upload request missing 'media_file' part.")
+        _count_result("rejected")
         return jsonify({"error": "No file part in the request"}), 400
 
-    file = request.files["media_file"]
-
-    if file.filename == "":
+    if not reader.filename:
         logger.warning(
             "Upload request received with no selected file (empty filename)."
         )
+        _count_result("rejected")
         return jsonify({"error": "No selected file"}), 400
 
     # Sanitize filename just in case, although we use UUID for S3 key
-    original_filename = secure_filename(file.filename)
+    original_filename = secure_filename(reader.filename)
     logger.info(f"Processing file: {original_filename}")
 
     # Generate a unique S3 key using UUID to avoid collisions
@@ -101,46 +198,61 @@ def handle_upload():
 
     logger.info(f"Generated S3 key: {s3_key}")
 
+    # Validate magic bytes / container header from the first few KB only.
+    # The reader then replays that header and streams the rest to S3, so junk
+    # is rejected before anything is written and the file is never buffered whole.
+    media_stream = media_sniff.SniffingReader(reader)
     try:
-        # Use the common storage utility function, passing the file stream directly
-        # common.storage.upload_file expects a file path, so we need a function
-        # that accepts a file stream or we save temporarily (less ideal).
-        # Let's modify the expectation or add a function to common.storage
-
-        # --- Assuming common.storage.upload_fileobj exists ---
-        # Example: storage.upload_fileobj(file.stream, s3_key, file.content_type)
-        # OR adapt storage.upload_file to handle streams
-
-        # -- Modification: Let's assume common.storage.upload_file can handle a stream --
-        # This requires adapting the common.storage.upload_file function.
-        # If common.storage.upload_file MUST take a path, we'd have to save temporarily:
-        # temp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}_{original_filename}")
-        # file.save(temp_path)
-        # storage.upload_file(temp_path, s3_key)
-        # os.remove(temp_path)
-        # But streaming directly is much better:
+        container = media_stream.validate()
+    except (media_sniff.MediaValidationError, streaming.MultipartError) as e:
+        logger.warning(f"Rejected upload '{original_filename}': {e}")
+        _count_result("rejected")
+        status = 415 if isinstance(e, media_sniff.MediaValidationError) else 400
+        return jsonify({"error": str(e)}), status  # 415: Unsupported Media Type
+    logger.info(f"Detected container '{container}' for {original_filename}")
 
+    with _metrics_lock:
+        _active_uploads[s3_key] = reader
+    try:
         logger.info(f"Uploading file stream to S3 key: {s3_key}")
         storage.upload_fileobj(
-            file, s3_key, ContentType=file.mimetype
-        )  # Pass file object directly
-        logger.info(f"Successfully uploaded file to {s3_key}")
-
-        # Return the generated S3 key
-        return jsonify(
-            {"s3_key": s3_key, "message": "File uploaded successfully"}
-        ), 201  # Created
-
-    except (
-        ClientError,
-        storage.S3UploadError,
-        Exception,
-    ) as e:  # Catch specific S3 error if defined in common
+            media_stream, s3_key, ContentType=reader.content_type
+        )  # Header already sniffed, rest streams straight through
+    except storage.S3UploadError as e:
+        cause = e.__cause__
+        if isinstance(cause, streaming.UploadTooLarge):
+            logger.warning(f"Rejected upload '{original_filename}': {cause}")
+            _count_result("rejected")
+            return jsonify({"error": str(cause)}), 413
+        if isinstance(cause, streaming.MultipartError):
+            logger.warning(f"Upload '{original_filename}' broke off: {cause}")
+            _count_result("rejected")
+            return jsonify({"error": str(cause)}), 400
+        logger.error(f"Failed to upload file to S3 ({s3_key}): {e}")
+        _count_result("failed")
+        return jsonify({"error": f"Failed to store uploaded file: {e}"}), 500
+    except Exception as e:  # e.g. S3ConfigError
         logger.error(f"Failed to upload file to S3 ({s3_key}): {e}")
+        _count_result("failed")
         return jsonify({"error": f"Failed to store uploaded file: {e}"}), 500
+    finally:
+        with _metrics_lock:
+            _active_uploads.pop(s3_key, None)
+
+    logger.info(f"Successfully uploaded {reader.bytes_read} bytes to {s3_key}")
+    _count_result("stored", reader)
+    # Return the generated S3 key
+    return jsonify(
+        {
+            "s3_key": s3_key,
+            "container": container,
+            "message": "File uploaded successfully",
+        }
+    ), 201  # Created
 
 
 if __name__ == "__main__":
+    # Development only; containers serve the app with gunicorn.conf.py
     # Use 0.0.0.0 to be accessible within Docker network
     # Port 5003 as per docker-compose example
     app.run(host="0.0.0.0", port=5003, debug=config.get("FLASK_ENV") == "development")
@@ -0,0 +1,21 @@
+# ./services/upload-service/gunicorn.conf.py
+"""
+Gunicorn settings for the upload-service.
+
+An upload is a long, I/O-bound request: one thread copies the body from the
+socket to S3 for as long as the client keeps sending. Threads (gthread) make
+that cheap, and a single worker process per container keeps the upload slot
+limit and /metrics exact for the whole container; scale out with replicas.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5003)}"
+workers = int(os.environ.get("UPLOAD_WORKERS", 1))
+worker_class = "gthread"
+# One thread per upload slot, plus spares that answer /health, /metrics and
+# the 503s for uploads over the limit while every slot is busy
+threads = int(os.environ.get("UPLOAD_MAX_CONCURRENT", 16)) + 4
+# With gthread this is the worker heartbeat, not a per-request limit, so
+# uploads running for hours are fine
+timeout = 120
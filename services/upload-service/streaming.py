@@ -0,0 +1,149 @@
+# ./services/upload-service/streaming.py
+"""
+Streaming multipart/form-data parsing for uploads.
+
+Flask's `request.files` parses the whole body before the view runs, spooling
+each file to a temporary file. For multi-GB uploads that means a full extra
+copy on local disk and no chance to push back on the sender. Instead,
+`MultipartFileReader` pulls the body off the socket in small chunks (using
+Werkzeug's sans-IO decoder) and hands out the bytes of one file field as
+they arrive.
+
+S3's multipart transfer reads the file part by part and holds only a bounded
+number of parts in memory (see storage.S3_MAX_BUFFERED_PARTS). While those
+buffers are full it stops reading, which stops reading the socket too, so
+TCP flow control slows the sender to the speed S3 accepts data.
+"""
+
+import io
+import logging
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+READ_CHUNK_SIZE = 64 * 1024  # Bytes read from the socket at a time
+MAX_FIELD_BYTES = 64 * 1024  # Limit for the (ignored) parts before the file field
+
+
+class MultipartError(Exception):
+    """The request body is not valid multipart/form-data, or it ended early."""
+
+    pass
+
+
+class UploadTooLarge(Exception):
+    """The file is larger than the configured maximum."""
+
+    pass
+
+
+def get_boundary(content_type):
+    """Returns the multipart boundary (bytes) of a Content-Type header, or None."""
+    mimetype, options = parse_options_header(content_type or "")
+    if mimetype != "multipart/form-data" or not options.get("boundary"):
+        return None
+    return options["boundary"].encode("latin-1")
+
+
+class MultipartFileReader(io.RawIOBase):
+    """
+    Read-only stream over one file field of a multipart/form-data body.
+
+    `read(size)` returns exactly `size` bytes until the file ends (like a
+    buffered file), which S3's transfer manager expects of non-seekable streams.
+
+    Usage:
+        reader = MultipartFileReader(request.stream, boundary, "media_file")
+        if reader.open():                    # skips to the file field
+            storage.upload_fileobj(reader, key)
+    """
+
+    def __init__(self, stream, boundary, field_name, max_size=None, chunk_size=READ_CHUNK_SIZE):
+        super().__init__()
+        self._stream = stream
+        # Werkzeug applies this limit to its whole buffer, file data included,
+        # and keeps a possible partial boundary from the previous chunk there.
+        # It only has to stop part headers (or a preamble) without a boundary
+        # from growing forever; field sizes are checked in open().
+        self._decoder = MultipartDecoder(
+            boundary, max_form_memory_size=MAX_FIELD_BYTES + 2 * chunk_size
+        )
+        self._field_name = field_name
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._eof = False
+        self._file_done = False
+        self.filename = None
+        self.content_type = None
+        self.bytes_read = 0  # File bytes received so far
+
+    def _next_event(self):
+        while True:
+            try:
+                event = self._decoder.next_event()
+            except ValueError as e:
+                raise MultipartError(f"Malformed multipart body: {e}") from e
+            if not isinstance(event, NeedData):
+                return event
+            if self._eof:
+                raise MultipartError("Request body ended before the multipart data did")
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self._eof = True
+            try:
+                self._decoder.receive_data(chunk or None)
+            except RequestEntityTooLarge as e:
+                raise MultipartError("Multipart part headers are too large") from e
+
+    def open(self):
+        """Skips to the file field. Returns False if the body has no such field."""
+        skipped = 0  # Bytes of the other parts, which are read and dropped
+        while True:
+            event = self._next_event()
+            if isinstance(event, File) and event.name == self._field_name:
+                self.filename = event.filename
+                self.content_type = event.headers.get("Content-Type")
+                return True
+            if isinstance(event, Data):
+                skipped += len(event.data)
+                if skipped > MAX_FIELD_BYTES:
+                    raise MultipartError(
+                        f"Form fields before '{self._field_name}' exceed {MAX_FIELD_BYTES} bytes"
+                    )
+            if isinstance(event, Epilogue):
+                return False
+
+    def _fill(self, size):
+        while not self._file_done and (size < 0 or len(self._buffer) < size):
+            event = self._next_event()
+            if not isinstance(event, Data):
+                raise MultipartError(f"Unexpected {type(event).__name__} inside the file field")
+            self._buffer += event.data
+            self.bytes_read += len(event.data)
+            if self._max_size is not None and self.bytes_read > self._max_size:
+                raise UploadTooLarge(f"File exceeds the {self._max_size} byte limit")
+            if not event.more_data:
+                self._file_done = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        self._fill(size)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data